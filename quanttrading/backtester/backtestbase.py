@@ -8,15 +8,16 @@ it will be called by the BacktesterEngine to:
         c. calculate_result, calculate_statistics
 
 """
-from collections import defaultdict
 from datetime import date, datetime, timedelta
-from typing import Callable, List, Dict, Optional, Type
-from functools import lru_cache, partial
+from typing import Callable, Iterator, List, Dict, Optional, Tuple, Type, Union
+from functools import partial
+from multiprocessing.shared_memory import SharedMemory
 import traceback
+import inspect
+import hashlib
 
 import numpy as np
-from pandas import DataFrame, Series
-from pandas.core.window import ExponentialMovingWindow
+from pandas import DataFrame
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 from ordermanagement import BaseManagement as BaseEngine
@@ -27,14 +28,16 @@ from constant import (
     Interval,
     Status
 )
-from database import get_database, BaseDatabase
+from historycache import get_history_cache
 from datatypes import OrderData, TradeData, BarData, TickData, OrderType
-from utility import round_to, extract_vt_symbol
+from utility import round_to, extract_vt_symbol, get_file_path
+from performance import CURVE_COLUMNS, calculate_curve_statistics, get_drawdown_duration
 from optimize import (
     OptimizationSetting,
     check_optimization_setting,
     run_bf_optimization,
-    run_ga_optimization
+    run_ga_optimization,
+    run_sh_optimization
 )
 from event import Event
 from .base import (
@@ -42,13 +45,26 @@ from .base import (
     EngineType,
     STOPORDER_PREFIX,
     StopOrder,
+    StopOrderBook,
     StopOrderStatus,
     INTERVAL_DELTA_MAP
 )
 from .template import Testable
+from .columnar import (
+    ColumnarData,
+    BarArray,
+    TickArray,
+    SharedHistory,
+    attach_shared_history
+)
+from .pnl import PNL_FIELDS, calculate_pnl_arrays, get_trade_arrays
+from .stream import HistoryPrefetcher
 from .locale import _
 
 
+GA_CACHE_FILENAME: str = "ga_fitness_cache.db"
+
+
 class BacktestEngine(BaseEngine):
     """ 
     Backtesting Engine 
@@ -87,6 +103,9 @@ class BacktestEngine(BaseEngine):
         self.annual_days: int = 240
         self.half_life: int = 120
         self.mode: BacktestingMode = BacktestingMode.BAR
+        self.columnar: bool = False
+        self.streaming: bool = False
+        self.prefetch_slices: int = 2
 
         self.strategy_class: Type[Testable] = None
         self.strategy: Testable = None
@@ -101,7 +120,8 @@ class BacktestEngine(BaseEngine):
 
         self.stop_order_count: int = 0
         self.stop_orders: Dict[str, StopOrder] = {}
-        self.active_stop_orders: Dict[str, StopOrder] = {}
+        self.stop_order_book: StopOrderBook = StopOrderBook()
+        self.active_stop_orders: Dict[str, StopOrder] = self.stop_order_book.orders
 
         self.limit_order_count: int = 0
         self.limit_orders: Dict[str, OrderData] = {}
@@ -129,7 +149,7 @@ class BacktestEngine(BaseEngine):
 
         self.stop_order_count = 0
         self.stop_orders.clear()
-        self.active_stop_orders.clear()
+        self.stop_order_book.clear()
 
         self.limit_order_count = 0
         self.limit_orders.clear()
@@ -155,9 +175,17 @@ class BacktestEngine(BaseEngine):
         mode: BacktestingMode = BacktestingMode.BAR,
         risk_free: float = 0,
         annual_days: int = 240,
-        half_life: int = 120
+        half_life: int = 120,
+        columnar: bool = False,
+        streaming: bool = False
     ) -> None:
-        """"""
+        """
+        columnar: hold history as numpy arrays (BarArray/TickArray)
+        instead of a list of data objects. Bar history is replayed with
+        the columnar loop.
+        streaming: do not hold the whole history, slices are loaded in
+        the background during replay and dropped once replayed.
+        """
         self.mode = mode
         self.vt_symbol = vt_symbol
         self.interval = Interval(interval)
@@ -180,6 +208,8 @@ class BacktestEngine(BaseEngine):
         self.risk_free = risk_free
         self.annual_days = annual_days
         self.half_life = half_life
+        self.columnar = columnar
+        self.streaming = streaming
 
     def add_strategy(self, strategy_class: Type[Testable], setting: dict) -> None:
         """"""
@@ -199,9 +229,32 @@ class BacktestEngine(BaseEngine):
             self.output(_("起始日期必须小于结束日期"))
             return
 
-        self.history_data.clear()       # Clear previously loaded history data
+        self.history_data = []          # Clear previously loaded history data
+
+        # History is loaded slice by slice during replay
+        if self.streaming:
+            self.output(_("流式回放模式，历史数据将在回放时加载"))
+            return
+
+        chunks: List[ColumnarData] = []
+
+        for data in self.load_history_slices():
+            if isinstance(data, ColumnarData):
+                chunks.append(data)
+            else:
+                self.history_data.extend(data)
+
+        if self.columnar:
+            self.history_data = self.get_columnar_class().concat(chunks)
 
-        # Load 30 days of data each time and allow for progress update
+        self.output(_("历史数据加载完成，数据量：{}").format(len(self.history_data)))
+
+    def load_history_slices(self) -> Iterator:
+        """
+        Load history in slices of 1/10 of the days, with progress update.
+        Slices are columnar blocks in columnar mode, lists of data
+        objects otherwise.
+        """
         total_days: int = (self.end - self.start).days
         progress_days: int = max(int(total_days / 10), 1)
         progress_delta: timedelta = timedelta(days=progress_days)
@@ -217,7 +270,14 @@ class BacktestEngine(BaseEngine):
 
             end: datetime = min(end, self.end)  # Make sure end time stays within set range
 
-            if self.mode == BacktestingMode.BAR:
+            if self.mode == BacktestingMode.BAR and self.columnar:
+                data: BarArray = BarArray.from_records(
+                    load_bar_array(self.symbol, self.exchange, self.interval, start, end),
+                    self.symbol,
+                    self.exchange,
+                    self.interval
+                )
+            elif self.mode == BacktestingMode.BAR:
                 data: List[BarData] = load_bar_data(
                     self.symbol,
                     self.exchange,
@@ -225,6 +285,12 @@ class BacktestEngine(BaseEngine):
                     start,
                     end
                 )
+            elif self.columnar:
+                data: TickArray = TickArray.from_records(
+                    load_tick_array(self.symbol, self.exchange, start, end),
+                    self.symbol,
+                    self.exchange
+                )
             else:
                 data: List[TickData] = load_tick_data(
                     self.symbol,
@@ -233,7 +299,10 @@ class BacktestEngine(BaseEngine):
                     end
                 )
 
-            self.history_data.extend(data)
+            if self.columnar and not isinstance(data, ColumnarData):
+                data = self.get_columnar_class().from_data(data)
+
+            yield data
 
             progress += progress_days / total_days
             progress = min(progress, 1)
@@ -241,10 +310,22 @@ class BacktestEngine(BaseEngine):
             start = end + interval_delta
             end += progress_delta
 
-        self.output(_("历史数据加载完成，数据量：{}").format(len(self.history_data)))
-
-    def run_backtesting(self) -> None:
+    def get_columnar_class(self) -> type:
         """"""
+        if self.mode == BacktestingMode.BAR:
+            return BarArray
+        return TickArray
+
+    def run_backtesting(self, end_ratio: float = 1) -> None:
+        """
+        end_ratio: only replay this fraction of the history, the results
+        and statistics are then the interim ones at that point. Used by
+        the successive halving optimization. Not supported by streaming
+        replay, which does not know the size of the history in advance.
+        """
+        if self.streaming and not self.history_data and end_ratio < 1:
+            raise ValueError(_("流式回放模式不支持end_ratio，请先加载全部历史数据"))
+
         if self.mode == BacktestingMode.BAR:
             func = self.new_bar
         else:
@@ -258,11 +339,20 @@ class BacktestEngine(BaseEngine):
         self.strategy.trading = True
         self.output(_("开始回放历史数据"))
 
-        total_size: int = len(self.history_data)
+        if self.streaming and not self.history_data:
+            self.replay_streaming(func)
+            return
+
+        total_size: int = self.get_replay_size(end_ratio)
+
+        if isinstance(self.history_data, BarArray):
+            self.replay_columnar(total_size)
+            return
+
         batch_size: int = max(int(total_size / 10), 1)
 
         for ix, i in enumerate(range(0, total_size, batch_size)):
-            batch_data: list = self.history_data[i: i + batch_size]
+            batch_data: list = self.history_data[i: min(i + batch_size, total_size)]
             for data in batch_data:
                 try:
                     func(data)
@@ -278,6 +368,133 @@ class BacktestEngine(BaseEngine):
         self.strategy.on_stop()
         self.output(_("历史数据回放结束"))
 
+    def get_replay_size(self, end_ratio: float = 1) -> int:
+        """
+        Number of history data to replay for the given ratio.
+        """
+        size: int = len(self.history_data)
+        if end_ratio >= 1:
+            return size
+        return min(max(int(size * end_ratio), 1), size)
+
+    def replay_columnar(self, total_size: int = None) -> None:
+        """
+        Replay the columnar bar history.
+        Same call sequence as new_bar (timer, limit order crossing,
+        stop order crossing, on_bar, daily close) but order crossing
+        and the timer are checked against the arrays, and daily close
+        prices are written per day in one pass.
+        """
+        history: BarArray = self.history_data
+
+        if total_size is None:
+            total_size = len(history)
+        batch_size: int = max(int(total_size / 10), 1)
+
+        for ix, i in enumerate(range(0, total_size, batch_size)):
+            if not self.replay_bar_array(history, i, min(i + batch_size, total_size)):
+                return
+
+            progress = min(ix / 10, 1)
+            progress_bar: str = "=" * (ix + 1)
+            self.output(_("回放进度：{} [{:.0%}]").format(progress_bar, progress))
+
+        self.update_daily_closes(history, 0, total_size)
+
+        self.strategy.on_stop()
+        self.output(_("历史数据回放结束"))
+
+    def replay_bar_array(self, history: BarArray, start: int, end: int) -> bool:
+        """
+        Replay bars in [start, end) of a columnar history, return False
+        when the backtesting is stopped by an exception.
+        """
+        # The timer is triggered whenever the second changes.
+        seconds: np.ndarray = history.seconds(start, end)
+        pre_seconds: np.ndarray = np.roll(seconds, 1)
+        if end > start:
+            pre_seconds[0] = self.last_second
+        timers: list = (seconds != pre_seconds).tolist()
+
+        dts: list = history.get_datetimes(start, end)
+        opens: list = history.open_price[start:end].tolist()
+        highs: list = history.high_price[start:end].tolist()
+        lows: list = history.low_price[start:end].tolist()
+
+        for k in range(end - start):
+            try:
+                self.bar = history[start + k]
+                self.datetime = dts[k]
+
+                if timers[k]:
+                    self.last_second = int(seconds[k])
+                    self.strategy.on_timer()
+
+                if self.active_limit_orders:
+                    self.cross_limit_order_price(lows[k], highs[k], opens[k], opens[k])
+                if self.active_stop_orders:
+                    self.cross_stop_order_price(highs[k], lows[k], opens[k], opens[k])
+
+                self.strategy.on_bar(self.bar)
+            except Exception:
+                self.update_daily_closes(history, 0, start + k)
+                self.output(_("触发异常，回测终止"))
+                self.output(traceback.format_exc())
+                return False
+
+        return True
+
+    def replay_streaming(self, func: Callable) -> None:
+        """
+        Replay history slices while the next ones are loaded in the
+        background. Slices are replayed in loading order with the same
+        calls as the in-memory replay, so the results are identical.
+        """
+        prefetcher: HistoryPrefetcher = HistoryPrefetcher(self.load_history_slices(), self.prefetch_slices)
+        count: int = 0
+
+        try:
+            for ix, data in enumerate(prefetcher):
+                count += len(data)
+
+                if isinstance(data, BarArray):
+                    if not self.replay_bar_array(data, 0, len(data)):
+                        return
+                    self.update_daily_closes(data, 0, len(data))
+                else:
+                    for d in data:
+                        try:
+                            func(d)
+                        except Exception:
+                            self.output(_("触发异常，回测终止"))
+                            self.output(traceback.format_exc())
+                            return
+
+                progress = min(ix / 10, 1)
+                progress_bar: str = "=" * (ix + 1)
+                self.output(_("回放进度：{} [{:.0%}]").format(progress_bar, progress))
+        finally:
+            prefetcher.stop()
+
+        self.output(_("历史数据加载完成，数据量：{}").format(count))
+
+        self.strategy.on_stop()
+        self.output(_("历史数据回放结束"))
+
+    def update_daily_closes(self, history: BarArray, start: int, end: int) -> None:
+        """
+        Columnar version of update_daily_close for bars in [start, end).
+        """
+        for ix in history.day_ends(start, end).tolist():
+            d: date = history.get_datetimes(ix, ix + 1)[0].date()
+            price: float = float(history.close_price[ix])
+
+            daily_result: Optional[DailyResult] = self.daily_results.get(d, None)
+            if daily_result:
+                daily_result.close_price = price
+            else:
+                self.daily_results[d] = DailyResult(d, price)
+
     def calculate_result(self) -> DataFrame:
         """"""
         self.output(_("开始计算逐日盯市盈亏"))
@@ -285,41 +502,101 @@ class BacktestEngine(BaseEngine):
         if not self.trades:
             self.output(_("回测成交记录为空"))
 
-        # Add trade data into daily reuslt.
+        dates: List[date] = list(self.daily_results.keys())
+        day_index: Dict[date, int] = {d: i for i, d in enumerate(dates)}
+
+        # Group trades by date, keeping the order of trades within a day.
+        day_trades: List[List[TradeData]] = [[] for _ in dates]
         for trade in self.trades.values():
-            d: date = trade.datetime.date()
-            daily_result: DailyResult = self.daily_results[d]
-            daily_result.add_trade(trade)
-
-        # Calculate daily result by iteration.
-        pre_close = 0
-        start_pos = 0
-
-        for daily_result in self.daily_results.values():
-            daily_result.calculate_pnl(
-                pre_close,
-                start_pos,
-                self.size,
-                self.rate,
-                self.slippage
-            )
+            day_trades[day_index[trade.datetime.date()]].append(trade)
 
-            pre_close = daily_result.close_price
-            start_pos = daily_result.end_pos
+        trades: List[TradeData] = [trade for trades in day_trades for trade in trades]
+        trade_ix: np.ndarray = np.repeat(np.arange(len(dates)), [len(trades) for trades in day_trades])
+        pos_change, volume, price = get_trade_arrays(trades)
+
+        close_price: np.ndarray = np.fromiter(
+            (daily_result.close_price for daily_result in self.daily_results.values()),
+            dtype=np.float64,
+            count=len(dates)
+        )
+
+        # Calculate daily result on arrays.
+        result: dict = calculate_pnl_arrays(
+            close_price,
+            trade_ix,
+            pos_change,
+            volume,
+            price,
+            self.size,
+            self.rate,
+            self.slippage
+        )
 
         # Generate dataframe
-        results: defaultdict = defaultdict(list)
+        data: dict = {
+            "date": dates,
+            "close_price": result["close_price"],
+            "pre_close": result["pre_close"],
+            "trades": day_trades
+        }
+        for name in PNL_FIELDS[2:]:
+            data[name] = result[name]
 
-        for daily_result in self.daily_results.values():
-            for key, value in daily_result.__dict__.items():
-                results[key].append(value)
+        self.daily_df = DataFrame(data).set_index("date")
 
-        self.daily_df = DataFrame.from_dict(results).set_index("date")
-        # print(f"{self.daily_df=}")
+        # Keep daily result objects up to date for the UI.
+        columns: list = [result[name].tolist() for name in PNL_FIELDS]
+        for daily_result, daily_trades, values in zip(self.daily_results.values(), day_trades, zip(*columns)):
+            daily_result.__dict__.update(zip(PNL_FIELDS, values))
+            daily_result.trades = daily_trades
 
         self.output(_("逐日盯市盈亏计算完成"))
         return self.daily_df
 
+    def calculate_bar_result(self) -> DataFrame:
+        """
+        Mark-to-market pnl of every bar (or tick) of the history replayed,
+        calculated the same way as the daily result.
+        """
+        history: ColumnarData = self.history_data
+        if not len(history):
+            # Streaming replay does not keep the history
+            self.output(_("历史数据未保存在内存中，无法计算逐K线盈亏"))
+            return DataFrame()
+
+        if not isinstance(history, ColumnarData):
+            history = self.get_columnar_class().from_data(history)
+
+        if self.mode == BacktestingMode.BAR:
+            close_price: np.ndarray = history.close_price
+        else:
+            close_price = history.last_price
+
+        trades: List[TradeData] = list(self.trades.values())
+        trade_dt64: np.ndarray = np.array(
+            [trade.datetime.replace(tzinfo=None) for trade in trades],
+            dtype="datetime64[us]"
+        )
+        trade_ix: np.ndarray = np.searchsorted(history.dt64, trade_dt64, side="right") - 1
+        pos_change, volume, price = get_trade_arrays(trades)
+
+        result: dict = calculate_pnl_arrays(
+            close_price,
+            trade_ix,
+            pos_change,
+            volume,
+            price,
+            self.size,
+            self.rate,
+            self.slippage
+        )
+
+        data: dict = {"datetime": history.get_datetimes()}
+        for name in PNL_FIELDS:
+            data[name] = result[name]
+
+        return DataFrame(data).set_index("datetime")
+
     def calculate_statistics(self, df: DataFrame = None, output=True) -> dict:
         """"""
         self.output(_("开始计算策略统计指标"))
@@ -361,21 +638,18 @@ class BacktestEngine(BaseEngine):
 
         if df is not None:
             # Calculate balance related time series data
-            df["balance"] = df["net_pnl"].cumsum() + self.capital
-
-            # When balance falls below 0, set daily return to 0
-            pre_balance: Series = df["balance"].shift(1)
-            pre_balance.iloc[0] = self.capital
-            x = df["balance"] / pre_balance
-            x[x <= 0] = np.nan
-            df["return"] = np.log(x).fillna(0)
-
-            df["highlevel"] = df["balance"].rolling(min_periods=1, window=len(df), center=False).max()
-            df["drawdown"] = df["balance"] - df["highlevel"]
-            df["ddpercent"] = df["drawdown"] / df["highlevel"] * 100
+            result: dict = calculate_curve_statistics(
+                df["net_pnl"].to_numpy(dtype=np.float64),
+                self.capital,
+                self.annual_days,
+                self.risk_free,
+                self.half_life
+            )
+            for name in CURVE_COLUMNS:
+                df[name] = result[name]
 
             # All balance value needs to be positive
-            positive_balance = (df["balance"] > 0).all()
+            positive_balance = result["positive_balance"]
             if not positive_balance:
                 self.output(_("回测中出现爆仓（资金小于等于0），无法计算策略统计指标"))
 
@@ -385,22 +659,18 @@ class BacktestEngine(BaseEngine):
             start_date = df.index[0]
             end_date = df.index[-1]
 
-            total_days: int = len(df)
-            profit_days: int = len(df[df["net_pnl"] > 0])
-            loss_days: int = len(df[df["net_pnl"] < 0])
-
-            end_balance = df["balance"].iloc[-1]
-            max_drawdown = df["drawdown"].min()
-            max_ddpercent = df["ddpercent"].min()
-            max_drawdown_end = df["drawdown"].idxmin()
+            total_days: int = result["total_days"]
+            profit_days: int = result["profit_days"]
+            loss_days: int = result["loss_days"]
 
-            if isinstance(max_drawdown_end, date):
-                max_drawdown_start = df["balance"][:max_drawdown_end].idxmax()
-                max_drawdown_duration: int = (max_drawdown_end - max_drawdown_start).days
-            else:
-                max_drawdown_duration: int = 0
+            end_balance = result["end_balance"]
+            max_drawdown = result["max_drawdown"]
+            max_ddpercent = result["max_ddpercent"]
+            max_drawdown_duration: int = get_drawdown_duration(
+                df.index, result["max_drawdown_start"], result["max_drawdown_end"]
+            )
 
-            total_net_pnl: float = df["net_pnl"].sum()
+            total_net_pnl: float = result["total_net_pnl"]
             daily_net_pnl: float = total_net_pnl / total_days
 
             total_commission: float = df["commission"].sum()
@@ -415,28 +685,13 @@ class BacktestEngine(BaseEngine):
             total_trade_count: int = df["trade_count"].sum()
             daily_trade_count: int = total_trade_count / total_days
 
-            total_return: float = (end_balance / self.capital - 1) * 100
-            annual_return: float = total_return / total_days * self.annual_days
-            daily_return: float = df["return"].mean() * 100
-            return_std: float = df["return"].std() * 100
-
-            if return_std:
-                daily_risk_free: float = self.risk_free / np.sqrt(self.annual_days)
-                sharpe_ratio: float = (daily_return - daily_risk_free) / return_std * np.sqrt(self.annual_days)
-
-                ewm_window: ExponentialMovingWindow = df["return"].ewm(halflife=self.half_life)
-                ewm_mean: Series = ewm_window.mean() * 100
-                ewm_std: Series = ewm_window.std() * 100
-                # ewm_sharpe: float = ((ewm_mean - daily_risk_free) / ewm_std)[-1] * np.sqrt(self.annual_days)
-                ewm_sharpe: float = ((ewm_mean - daily_risk_free) / ewm_std).iloc[-1] * np.sqrt(self.annual_days)
-            else:
-                sharpe_ratio: float = 0
-                ewm_sharpe: float = 0
-
-            if max_ddpercent:
-                return_drawdown_ratio: float = -total_return / max_ddpercent
-            else:
-                return_drawdown_ratio = 0
+            total_return: float = result["total_return"]
+            annual_return: float = result["annual_return"]
+            daily_return: float = result["daily_return"]
+            return_std: float = result["return_std"]
+            sharpe_ratio: float = result["sharpe_ratio"]
+            ewm_sharpe: float = result["ewm_sharpe"]
+            return_drawdown_ratio: float = result["return_drawdown_ratio"]
 
         # Output
         if output:
@@ -563,19 +818,34 @@ class BacktestEngine(BaseEngine):
         optimization_setting: OptimizationSetting,
         output: bool = True,
         max_workers: int = None,
+        top_n: int = None,
+        checkpoint_path: str = None,
     ) -> list:
-        """"""
+        """
+        top_n: only keep the best top_n results.
+        checkpoint_path: file to save finished results to, so that an
+        interrupted sweep could be resumed.
+        """
         if not check_optimization_setting(optimization_setting):
             return
 
-        evaluate_func: callable = wrap_evaluate(self, optimization_setting.target_name)
-        results: list = run_bf_optimization(
-            evaluate_func,
-            optimization_setting,
-            get_target_value,
-            max_workers=max_workers,
-            output=self.output
-        )
+        shm, history = self.share_history()
+        evaluate_func: callable = wrap_evaluate(self, optimization_setting.target_name, history)
+        try:
+            results: list = run_bf_optimization(
+                evaluate_func,
+                optimization_setting,
+                get_target_value,
+                max_workers=max_workers,
+                output=self.output,
+                top_n=top_n,
+                checkpoint_path=checkpoint_path,
+                checkpoint_context=self.get_optimization_context(
+                    optimization_setting.target_name, history
+                )
+            )
+        finally:
+            release_shared_history(shm)
 
         if output:
             for result in results:
@@ -593,20 +863,72 @@ class BacktestEngine(BaseEngine):
         max_workers: int = None,
         ngen_size: int = 30,
         general_settings:dict = None,
+        cache_path: str = None,
     ) -> list:
-        """"""
+        """
+        cache_path: sqlite file of the persistent fitness cache, default
+        ga_fitness_cache.db in the trader folder.
+        """
         if not check_optimization_setting(optimization_setting):
             return
 
-        evaluate_func: callable = wrap_evaluate(self, optimization_setting.target_name)
-        results: list = run_ga_optimization(
-            evaluate_func,
-            optimization_setting,
-            get_target_value,
-            max_workers=max_workers,
-            ngen_size=ngen_size,
-            output=self.output
-        )
+        if not cache_path:
+            cache_path = str(get_file_path(GA_CACHE_FILENAME))
+
+        shm, history = self.share_history()
+        evaluate_func: callable = wrap_evaluate(self, optimization_setting.target_name, history)
+        try:
+            results: list = run_ga_optimization(
+                evaluate_func,
+                optimization_setting,
+                get_target_value,
+                max_workers=max_workers,
+                ngen_size=ngen_size,
+                output=self.output,
+                cache_path=cache_path,
+                cache_context=self.get_optimization_context(
+                    optimization_setting.target_name, history
+                )
+            )
+        finally:
+            release_shared_history(shm)
+
+        if output:
+            for result in results:
+                msg: str = _("参数：{}, 目标：{}").format(result[0], result[1])
+                self.output(msg)
+
+        return results
+
+    def run_sh_optimization(
+        self,
+        optimization_setting: OptimizationSetting,
+        output: bool = True,
+        max_workers: int = None,
+        min_ratio: float = 0.1,
+        eta: int = 3,
+    ) -> list:
+        """
+        min_ratio: fraction of the history used in the first round.
+        eta: only the best 1/eta settings move on to the next round.
+        """
+        if not check_optimization_setting(optimization_setting):
+            return
+
+        shm, history = self.share_history()
+        evaluate_func: callable = wrap_evaluate(self, optimization_setting.target_name, history)
+        try:
+            results: list = run_sh_optimization(
+                evaluate_func,
+                optimization_setting,
+                get_target_value,
+                max_workers=max_workers,
+                output=self.output,
+                min_ratio=min_ratio,
+                eta=eta
+            )
+        finally:
+            release_shared_history(shm)
 
         if output:
             for result in results:
@@ -615,6 +937,79 @@ class BacktestEngine(BaseEngine):
 
         return results
 
+    def get_optimization_context(
+        self,
+        target_name: str,
+        history: Optional[SharedHistory]
+    ) -> tuple:
+        """
+        Everything besides the setting which decides an optimization
+        result: strategy code, backtest window and parameters, the
+        fingerprint of the history data, and the database overview of
+        the data, which changes when data is saved or removed.
+        """
+        try:
+            source: str = inspect.getsource(self.strategy_class)
+        except (OSError, TypeError):
+            source: str = ""
+
+        if self.mode == BacktestingMode.BAR:
+            overview: Optional[tuple] = get_history_cache().get_overview((self.symbol, self.exchange, self.interval))
+        else:
+            overview = get_history_cache().get_overview((self.symbol, self.exchange))
+
+        return (
+            self.strategy_class.__module__,
+            self.strategy_class.__name__,
+            hashlib.sha1(source.encode()).hexdigest(),
+            self.vt_symbol,
+            self.interval,
+            self.start,
+            self.end,
+            self.rate,
+            self.slippage,
+            self.size,
+            self.pricetick,
+            self.capital,
+            self.mode,
+            target_name,
+            history.fingerprint if history else "",
+            overview,
+        )
+
+    def share_history(self) -> Tuple[Optional[SharedMemory], Optional[SharedHistory]]:
+        """
+        Publish the history window in columnar form into shared memory,
+        so optimization workers attach to it instead of each querying
+        the database and rebuilding the data objects.
+        History already loaded is published as it is, otherwise the
+        window is loaded once for the optimization only.
+        """
+        history: Union[list, ColumnarData] = self.history_data
+
+        if not len(history):
+            # Workers replay the whole window anyway, one shared copy is
+            # less than one per worker.
+            if self.streaming:
+                self.output(_("流式回放模式：优化前一次性加载历史数据到共享内存"))
+
+            columnar, streaming = self.columnar, self.streaming
+            self.columnar, self.streaming = True, False
+            try:
+                self.load_data()
+            finally:
+                self.columnar, self.streaming = columnar, streaming
+
+            history = self.history_data
+            self.history_data = []
+        elif not isinstance(history, ColumnarData):
+            history = self.get_columnar_class().from_data(history)
+
+        if not isinstance(history, ColumnarData) or not len(history):
+            return None, None
+
+        return history.to_shared()
+
     def update_daily_close(self, price: float) -> None:
         """"""
         d: date = self.datetime.date()
@@ -682,7 +1077,23 @@ class BacktestEngine(BaseEngine):
             long_best_price = long_cross_price
             short_best_price = short_cross_price
 
-        # print(f"{self.mode=} and {long_cross_price=} {short_cross_price=}")
+        self.cross_limit_order_price(
+            long_cross_price,
+            short_cross_price,
+            long_best_price,
+            short_best_price
+        )
+
+    def cross_limit_order_price(
+        self,
+        long_cross_price: float,
+        short_cross_price: float,
+        long_best_price: float,
+        short_best_price: float
+    ) -> None:
+        """
+        Cross limit orders with the given market prices.
+        """
         for order in list(self.active_limit_orders.values()):
             # Push order update with status "not traded" (pending).
             if order.status == Status.SUBMITTING:
@@ -758,7 +1169,28 @@ class BacktestEngine(BaseEngine):
             long_best_price = long_cross_price
             short_best_price = short_cross_price
 
-        for stop_order in list(self.active_stop_orders.values()):
+        self.cross_stop_order_price(
+            long_cross_price,
+            short_cross_price,
+            long_best_price,
+            short_best_price
+        )
+
+    def cross_stop_order_price(
+        self,
+        long_cross_price: float,
+        short_cross_price: float,
+        long_best_price: float,
+        short_best_price: float
+    ) -> None:
+        """
+        Cross stop orders with the given market prices.
+        """
+        crossed: List[StopOrder] = self.stop_order_book.get_crossed(
+            self.vt_symbol, long_cross_price, short_cross_price
+        )
+
+        for stop_order in crossed:
             # Check whether stop order can be triggered.
             long_cross: bool = (
                 stop_order.direction == Direction.LONG
@@ -822,8 +1254,7 @@ class BacktestEngine(BaseEngine):
             stop_order.vt_orderids.append(order.vt_orderid)
             stop_order.status = StopOrderStatus.TRIGGERED
 
-            if stop_order.stop_orderid in self.active_stop_orders:
-                self.active_stop_orders.pop(stop_order.stop_orderid)
+            self.stop_order_book.remove(stop_order.stop_orderid)
 
             # Push update to strategy.
             self.strategy.on_stop_order(stop_order)
@@ -919,7 +1350,7 @@ class BacktestEngine(BaseEngine):
             strategy_name=self.strategy.strategy_name,
         )
 
-        self.active_stop_orders[stop_order.stop_orderid] = stop_order
+        self.stop_order_book.add(stop_order)
         self.stop_orders[stop_order.stop_orderid] = stop_order
 
         return stop_order.stop_orderid
@@ -965,7 +1396,7 @@ class BacktestEngine(BaseEngine):
         """"""
         if vt_orderid not in self.active_stop_orders:
             return
-        stop_order: StopOrder = self.active_stop_orders.pop(vt_orderid)
+        stop_order: StopOrder = self.stop_order_book.remove(vt_orderid)
 
         stop_order.status = StopOrderStatus.CANCELLED
         self.strategy.on_stop_order(stop_order)
@@ -1141,7 +1572,6 @@ class DailyResult:
         self.net_pnl = self.total_pnl - self.commission - self.slippage
 
 
-@lru_cache(maxsize=999)
 def load_bar_data(
     symbol: str,
     exchange: Exchange,
@@ -1150,14 +1580,26 @@ def load_bar_data(
     end: datetime
 ) -> List[BarData]:
     """"""
-    database: BaseDatabase = get_database()
+    return get_history_cache().load_bar_data(
+        symbol, exchange, interval, start, end
+    )
 
-    return database.load_bar_data(
+
+def load_bar_array(
+    symbol: str,
+    exchange: Exchange,
+    interval: Interval,
+    start: datetime,
+    end: datetime
+) -> np.ndarray:
+    """
+    Load bars as a structured array, without BarData objects.
+    """
+    return get_history_cache().load_bar_array(
         symbol, exchange, interval, start, end
     )
 
 
-@lru_cache(maxsize=999)
 def load_tick_data(
     symbol: str,
     exchange: Exchange,
@@ -1165,9 +1607,21 @@ def load_tick_data(
     end: datetime
 ) -> List[TickData]:
     """"""
-    database: BaseDatabase = get_database()
+    return get_history_cache().load_tick_data(
+        symbol, exchange, start, end
+    )
+
 
-    return database.load_tick_data(
+def load_tick_array(
+    symbol: str,
+    exchange: Exchange,
+    start: datetime,
+    end: datetime
+) -> np.ndarray:
+    """
+    Bulk load ticks as a structured array, without TickData objects.
+    """
+    return get_history_cache().load_tick_array(
         symbol, exchange, start, end
     )
 
@@ -1185,10 +1639,15 @@ def evaluate(
     capital: int,
     end: datetime,
     mode: BacktestingMode,
-    setting: dict
+    history: Optional[SharedHistory],
+    setting: dict,
+    end_ratio: float = 1
 ) -> tuple:
     """
     Function for running in multiprocessing.pool
+    history: shared memory block published by the parent process. When
+    given, the history is attached instead of loaded from the database.
+    end_ratio: only backtest this fraction of the history.
     """
     engine: BacktestEngine = BacktestEngine()
 
@@ -1214,13 +1673,17 @@ def evaluate(
     engine.add_strategy(strategy_class, setting)
     print(f"=========evaluate settings: {setting}")
 
-    engine.load_data()
+    if history:
+        engine.history_data = attach_shared_history(history)
+    else:
+        engine.load_data()
+
     if not engine.history_data:
             engine.write_log(_("optimization: 策略回测失败，历史数据为空"))
             return
     
     try:
-        engine.run_backtesting()
+        engine.run_backtesting(end_ratio)
     except Exception:
             msg: str = _("optimization: 策略回测失败，触发异常：\n{}").format(traceback.format_exc())
             engine.write_log(msg)
@@ -1236,7 +1699,11 @@ def evaluate(
         # self.result_df = engine.calculate_result()
         # self.result_statistics = engine.calculate_statistics(output=False)
 
-def wrap_evaluate(engine: BacktestEngine, target_name: str) -> callable:
+def wrap_evaluate(
+    engine: BacktestEngine,
+    target_name: str,
+    history: Optional[SharedHistory] = None
+) -> callable:
     """
     Wrap evaluate function with given setting from backtesting engine.
     """
@@ -1253,11 +1720,21 @@ def wrap_evaluate(engine: BacktestEngine, target_name: str) -> callable:
         engine.pricetick,
         engine.capital,
         engine.end,
-        engine.mode
+        engine.mode,
+        history
     )
     return func
 
 
+def release_shared_history(shm: Optional[SharedMemory]) -> None:
+    """
+    Free the shared memory block once the optimization is finished.
+    """
+    if shm:
+        shm.close()
+        shm.unlink()
+
+
 def get_target_value(result: list) -> float:
     """
     Get target value for sorting optimization results.
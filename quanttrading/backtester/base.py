@@ -8,6 +8,7 @@ from datetime import datetime, timedelta
 from typing import Dict
 
 from constant import Direction, Offset, Interval
+from stoporderbook import StopOrderBook
 from .locale import _
 
 APP_NAME = "CtaStrategy"
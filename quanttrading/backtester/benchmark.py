@@ -0,0 +1,187 @@
+"""
+Benchmark of the bar replay in BacktestEngine.
+
+Replays the same synthetic minute bars through the list based replay
+and the columnar (BarArray) replay, checks that trades and statistics
+are identical and prints bars/sec of both.
+
+run from the quanttrading folder:
+    python -m backtester.benchmark 500000
+"""
+import sys
+from datetime import datetime, timedelta
+from time import perf_counter
+from typing import List, Tuple
+
+import numpy as np
+
+from constant import Direction, Exchange, Interval, Offset
+from datatypes import BarData, TickData, TradeData, OrderData
+
+from .backtestbase import BacktestEngine
+from .base import BacktestingMode, StopOrder
+from .columnar import BarArray
+from .template import Testable
+
+
+class BenchmarkStrategy(Testable):
+    """
+    Moving average crossover without talib, so the benchmark measures
+    the engine rather than the indicators.
+    """
+
+    default_setting: dict = {"window": 20}
+
+    def __init__(self, engine, strategy_name, vt_symbol, setting) -> None:
+        """"""
+        self.engine = engine
+        self.window: int = 20
+        super().__init__(strategy_name, vt_symbol, setting)
+
+        self.closes: List[float] = []
+        self.total: float = 0
+
+    def on_init(self) -> None:
+        """"""
+        pass
+
+    def on_start(self) -> None:
+        """"""
+        pass
+
+    def on_stop(self) -> None:
+        """"""
+        pass
+
+    def on_tick(self, tick: TickData) -> None:
+        """"""
+        pass
+
+    def on_bar(self, bar: BarData) -> None:
+        """"""
+        self.closes.append(bar.close_price)
+        self.total += bar.close_price
+        if len(self.closes) > self.window:
+            self.total -= self.closes.pop(0)
+        else:
+            return
+
+        self.engine.cancel_all(self)
+
+        ma: float = self.total / self.window
+        if bar.close_price > ma and self.pos <= 0:
+            self.engine.send_order(self, Direction.LONG, Offset.OPEN, bar.close_price, 1 - self.pos)
+        elif bar.close_price < ma and self.pos >= 0:
+            self.engine.send_order(
+                self, Direction.SHORT, Offset.OPEN, bar.close_price * 0.999, 1 + self.pos, stop=True
+            )
+
+    def on_trade(self, trade: TradeData) -> None:
+        """"""
+        pass
+
+    def on_order(self, order: OrderData) -> None:
+        """"""
+        pass
+
+    def on_stop_order(self, stop_order: StopOrder) -> None:
+        """"""
+        pass
+
+    def on_timer(self) -> None:
+        """"""
+        pass
+
+    def on_signal(self) -> None:
+        """"""
+        pass
+
+
+def generate_bars(count: int, seed: int = 0) -> List[BarData]:
+    """
+    Random walk minute bars.
+    """
+    rng: np.random.Generator = np.random.default_rng(seed)
+    closes: np.ndarray = 100 + np.cumsum(rng.normal(0, 0.1, count))
+    opens: np.ndarray = np.roll(closes, 1)
+    opens[0] = closes[0]
+    spread: np.ndarray = np.abs(rng.normal(0, 0.05, count))
+    start: datetime = datetime(2020, 1, 1)
+
+    bars: List[BarData] = []
+    for i in range(count):
+        bars.append(BarData(
+            gateway_name=BacktestEngine.gateway_name,
+            symbol="BENCH",
+            exchange=Exchange.SMART,
+            datetime=start + timedelta(minutes=i),
+            interval=Interval.MINUTE,
+            volume=100.0,
+            open_price=float(opens[i]),
+            high_price=float(max(opens[i], closes[i]) + spread[i]),
+            low_price=float(min(opens[i], closes[i]) - spread[i]),
+            close_price=float(closes[i]),
+        ))
+    return bars
+
+
+def run_engine(history: list, columnar: bool) -> Tuple[BacktestEngine, float]:
+    """
+    Replay history and return the engine with the replay time cost.
+    """
+    engine: BacktestEngine = BacktestEngine()
+    engine.output = lambda msg: None
+    engine.set_parameters(
+        vt_symbol="BENCH.SMART",
+        interval=Interval.MINUTE,
+        start=datetime(2020, 1, 1),
+        end=datetime(2030, 1, 1),
+        rate=0.0001,
+        slippage=0.01,
+        size=1,
+        pricetick=0.01,
+        capital=1_000_000,
+        mode=BacktestingMode.BAR,
+        columnar=columnar
+    )
+    engine.add_strategy(BenchmarkStrategy, {"window": 20})
+
+    if columnar:
+        engine.history_data = BarArray.from_data(history)
+    else:
+        engine.history_data = history
+
+    start: float = perf_counter()
+    engine.run_backtesting()
+    cost: float = perf_counter() - start
+
+    engine.calculate_result()
+    return engine, cost
+
+
+def run_benchmark(count: int = 100_000) -> None:
+    """"""
+    bars: List[BarData] = generate_bars(count)
+
+    list_engine, list_cost = run_engine(bars, False)
+    array_engine, array_cost = run_engine(bars, True)
+
+    list_trades: list = [
+        (t.datetime, t.direction, t.price, t.volume) for t in list_engine.get_all_trades()
+    ]
+    array_trades: list = [
+        (t.datetime, t.direction, t.price, t.volume) for t in array_engine.get_all_trades()
+    ]
+    assert list_trades == array_trades, "trades mismatch"
+
+    list_statistics: dict = list_engine.calculate_statistics(output=False)
+    array_statistics: dict = array_engine.calculate_statistics(output=False)
+    assert list_statistics == array_statistics, "statistics mismatch"
+
+    print(f"bars: {count}, trades: {len(list_trades)}")
+    print(f"list replay:     {count / list_cost:,.0f} bars/sec")
+    print(f"columnar replay: {count / array_cost:,.0f} bars/sec")
+
+
+if __name__ == "__main__":
+    run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
@@ -0,0 +1,363 @@
+"""
+Columnar history containers used by the BacktestEngine.
+
+History is held as NumPy arrays (one array per field) instead of a
+python list of BarData/TickData dataclasses. Data objects are only built
+on demand (by index or slice), so the replay loop can check order
+crossing and daily close directly against the arrays.
+
+A columnar block can also be published into shared memory once by the
+parent process, and attached zero-copy by optimization workers.
+"""
+from dataclasses import dataclass
+import hashlib
+from datetime import datetime, tzinfo
+from multiprocessing.shared_memory import SharedMemory
+from typing import Dict, Iterator, List, Optional, Tuple, Type, Union
+
+import numpy as np
+
+from constant import Exchange, Interval
+from datatypes import BarData, TickData
+from database import TICK_ARRAY_FIELDS, DB_TZ
+
+
+BAR_FIELDS: tuple = (
+    "open_price",
+    "high_price",
+    "low_price",
+    "close_price",
+    "volume",
+    "turnover",
+    "open_interest",
+)
+
+TICK_FIELDS: tuple = TICK_ARRAY_FIELDS
+
+
+@dataclass
+class SharedHistory:
+    """
+    Picklable description of a columnar block living in shared memory.
+    Sent to optimization workers instead of the data itself.
+    """
+    shm_name: str
+    kind: str
+    size: int
+    symbol: str
+    exchange: Exchange
+    interval: Interval
+    gateway_name: str
+    tz: Optional[tzinfo]
+    fingerprint: str = ""
+
+
+class ColumnarData:
+    """
+    Columnar history of one symbol.
+
+    Columns:
+        * datetime: object array of the original datetime objects. None
+        when attached from shared memory, the datetime is then rebuilt
+        from dt64 and tz.
+        * dt64: wall-clock datetime64[us] used for vectorized date/second
+        calculation.
+        * one float64 array per name in fields.
+    """
+
+    kind: str = ""
+    data_class: type = None
+    fields: tuple = ()
+
+    def __init__(
+        self,
+        symbol: str = "",
+        exchange: Exchange = None,
+        interval: Interval = None,
+        gateway_name: str = "",
+        size: int = 0
+    ) -> None:
+        """"""
+        self.symbol: str = symbol
+        self.exchange: Exchange = exchange
+        self.interval: Interval = interval
+        self.gateway_name: str = gateway_name
+        self.tz: Optional[tzinfo] = None
+
+        self.datetime: Optional[np.ndarray] = np.empty(size, dtype=object)
+        self.dt64: np.ndarray = np.empty(size, dtype="datetime64[us]")
+
+        for name in self.fields:
+            setattr(self, name, np.zeros(size, dtype=np.float64))
+
+        # Keep shared memory referenced while the arrays are used.
+        self.shm: Optional[SharedMemory] = None
+
+    @classmethod
+    def from_data(cls, data: list) -> "ColumnarData":
+        """
+        Create a columnar block from a list of BarData/TickData.
+        """
+        if not data:
+            return cls()
+
+        first = data[0]
+        array: ColumnarData = cls(
+            first.symbol,
+            first.exchange,
+            getattr(first, "interval", None),
+            first.gateway_name,
+            len(data)
+        )
+        array.tz = first.datetime.tzinfo
+
+        dts: list = [d.datetime for d in data]
+        array.datetime[:] = dts
+        array.dt64[:] = [dt.replace(tzinfo=None) for dt in dts]
+
+        for name in cls.fields:
+            getattr(array, name)[:] = [getattr(d, name) for d in data]
+
+        return array
+
+    @classmethod
+    def from_records(
+        cls,
+        records: np.ndarray,
+        symbol: str,
+        exchange: Exchange,
+        interval: Interval = None,
+        gateway_name: str = "DB",
+        tz: Optional[tzinfo] = DB_TZ
+    ) -> "ColumnarData":
+        """
+        Create a columnar block from a structured array loaded by the
+        database (datetime column is the wall clock of tz).
+        """
+        array: ColumnarData = cls(symbol, exchange, interval, gateway_name)
+        array.tz = tz
+        array.datetime = None
+        array.dt64 = np.ascontiguousarray(records["datetime"])
+
+        for name in cls.fields:
+            setattr(array, name, np.ascontiguousarray(records[name], dtype=np.float64))
+
+        return array
+
+    @classmethod
+    def concat(cls, arrays: List["ColumnarData"]) -> "ColumnarData":
+        """
+        Join several columnar blocks (e.g. loaded slices) into one.
+        """
+        arrays = [array for array in arrays if len(array)]
+        if not arrays:
+            return cls()
+
+        first: ColumnarData = arrays[0]
+        result: ColumnarData = cls(
+            first.symbol,
+            first.exchange,
+            first.interval,
+            first.gateway_name
+        )
+        result.tz = first.tz
+
+        if all(a.datetime is not None for a in arrays):
+            result.datetime = np.concatenate([a.datetime for a in arrays])
+        else:
+            result.datetime = None
+        result.dt64 = np.concatenate([a.dt64 for a in arrays])
+
+        for name in cls.fields:
+            setattr(result, name, np.concatenate([getattr(a, name) for a in arrays]))
+
+        return result
+
+    def __len__(self) -> int:
+        """"""
+        return len(self.dt64)
+
+    def __getitem__(self, ix: Union[int, slice]) -> Union[BarData, TickData, list]:
+        """
+        Build the data object at index ix, or a list of them for a slice.
+        """
+        if isinstance(ix, slice):
+            start, end, step = ix.indices(len(self))
+            dts: list = self.get_datetimes(start, end)
+            return [self.create_data(i, dts[i - start]) for i in range(start, end, step)]
+
+        if ix < 0:
+            ix += len(self)
+        return self.create_data(ix, self.get_datetimes(ix, ix + 1)[0])
+
+    def __iter__(self) -> Iterator[Union[BarData, TickData]]:
+        """"""
+        for ix in range(len(self)):
+            yield self[ix]
+
+    def create_data(self, ix: int, dt: datetime) -> Union[BarData, TickData]:
+        """"""
+        data = self.data_class(
+            gateway_name=self.gateway_name,
+            symbol=self.symbol,
+            exchange=self.exchange,
+            datetime=dt
+        )
+        for name in self.fields:
+            setattr(data, name, float(getattr(self, name)[ix]))
+        return data
+
+    def get_datetimes(self, start: int = 0, end: int = None) -> List[datetime]:
+        """
+        Datetime objects of data in [start, end).
+        """
+        if self.datetime is not None:
+            return self.datetime[start:end].tolist()
+
+        return [dt.replace(tzinfo=self.tz) for dt in self.dt64[start:end].tolist()]
+
+    def seconds(self, start: int = 0, end: int = None) -> np.ndarray:
+        """
+        Second-of-minute of rows in [start, end), used to simulate the timer.
+        """
+        dt64: np.ndarray = self.dt64[start:end]
+        return (
+            dt64.astype("datetime64[s]") - dt64.astype("datetime64[m]")
+        ).astype(np.int64)
+
+    def day_ends(self, start: int = 0, end: int = None) -> np.ndarray:
+        """
+        Index of the last row of every run of rows sharing the same date
+        within [start, end).
+        """
+        if end is None:
+            end = len(self)
+
+        if end <= start:
+            return np.empty(0, dtype=np.int64)
+
+        dates: np.ndarray = self.dt64[start:end].astype("datetime64[D]")
+        ends: np.ndarray = np.flatnonzero(dates[1:] != dates[:-1])
+        return np.append(ends, len(dates) - 1) + start
+
+    def fingerprint(self) -> str:
+        """
+        Hash of the data content, used to tell whether two loads of a
+        history window hold the same data.
+        """
+        sha1 = hashlib.sha1()
+        sha1.update(f"{self.kind}.{self.symbol}.{self.exchange}.{self.interval}".encode())
+        sha1.update(np.ascontiguousarray(self.dt64).view(np.int64).tobytes())
+        for name in self.fields:
+            sha1.update(np.ascontiguousarray(getattr(self, name)).tobytes())
+        return sha1.hexdigest()
+
+    def to_shared(self) -> Tuple[SharedMemory, SharedHistory]:
+        """
+        Copy the block into one shared memory segment.
+        The caller owns the returned SharedMemory and must unlink it
+        once the workers are done.
+        """
+        size: int = len(self)
+        shm: SharedMemory = SharedMemory(create=True, size=max(size, 1) * 8 * (len(self.fields) + 1))
+
+        block: np.ndarray = np.ndarray((len(self.fields) + 1, size), dtype=np.int64, buffer=shm.buf)
+        block[0] = self.dt64.view(np.int64)
+        values: np.ndarray = block[1:].view(np.float64)
+        for i, name in enumerate(self.fields):
+            values[i] = getattr(self, name)
+
+        handle: SharedHistory = SharedHistory(
+            shm_name=shm.name,
+            kind=self.kind,
+            size=size,
+            symbol=self.symbol,
+            exchange=self.exchange,
+            interval=self.interval,
+            gateway_name=self.gateway_name,
+            tz=self.tz,
+            fingerprint=self.fingerprint()
+        )
+        return shm, handle
+
+    @classmethod
+    def from_shared(cls, handle: SharedHistory) -> "ColumnarData":
+        """
+        Attach to a shared memory block without copying.
+        """
+        shm: SharedMemory = SharedMemory(name=handle.shm_name)
+
+        array: ColumnarData = cls(
+            handle.symbol,
+            handle.exchange,
+            handle.interval,
+            handle.gateway_name
+        )
+        array.tz = handle.tz
+        array.shm = shm
+
+        block: np.ndarray = np.ndarray((len(cls.fields) + 1, handle.size), dtype=np.int64, buffer=shm.buf)
+        array.datetime = None
+        array.dt64 = block[0].view("datetime64[us]")
+        values: np.ndarray = block[1:].view(np.float64)
+        for i, name in enumerate(cls.fields):
+            setattr(array, name, values[i])
+
+        return array
+
+
+class BarArray(ColumnarData):
+    """
+    Columnar bar history of one symbol and one interval.
+    """
+
+    kind: str = "bar"
+    data_class: type = BarData
+    fields: tuple = BAR_FIELDS
+
+    def create_data(self, ix: int, dt: datetime) -> BarData:
+        """"""
+        return BarData(
+            gateway_name=self.gateway_name,
+            symbol=self.symbol,
+            exchange=self.exchange,
+            datetime=dt,
+            interval=self.interval,
+            volume=float(self.volume[ix]),
+            turnover=float(self.turnover[ix]),
+            open_interest=float(self.open_interest[ix]),
+            open_price=float(self.open_price[ix]),
+            high_price=float(self.high_price[ix]),
+            low_price=float(self.low_price[ix]),
+            close_price=float(self.close_price[ix]),
+        )
+
+
+class TickArray(ColumnarData):
+    """
+    Columnar tick history of one symbol.
+    """
+
+    kind: str = "tick"
+    data_class: type = TickData
+    fields: tuple = TICK_FIELDS
+
+
+COLUMNAR_CLASSES: Dict[str, Type[ColumnarData]] = {
+    BarArray.kind: BarArray,
+    TickArray.kind: TickArray,
+}
+
+# Blocks already attached by this (worker) process.
+attached_histories: Dict[str, ColumnarData] = {}
+
+
+def attach_shared_history(handle: SharedHistory) -> ColumnarData:
+    """
+    Attach to a shared history block, once per process.
+    """
+    array: Optional[ColumnarData] = attached_histories.get(handle.shm_name, None)
+    if array is None:
+        array = COLUMNAR_CLASSES[handle.kind].from_shared(handle)
+        attached_histories[handle.shm_name] = array
+    return array
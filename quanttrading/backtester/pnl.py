@@ -0,0 +1,119 @@
+"""
+Mark-to-market pnl of backtesting trades computed on arrays.
+
+Trades are grouped into periods (trading days, or bars for an intraday
+curve) by a period index. Sums within a period use np.add.at and the
+position uses np.cumsum, both of which add in order, so the results are
+exactly the same as adding trade by trade in DailyResult.calculate_pnl.
+"""
+from typing import List
+
+import numpy as np
+
+from constant import Direction
+from datatypes import TradeData
+
+
+# Columns of the pnl result, in the order of DailyResult attributes.
+PNL_FIELDS: tuple = (
+    "close_price",
+    "pre_close",
+    "trade_count",
+    "start_pos",
+    "end_pos",
+    "turnover",
+    "commission",
+    "slippage",
+    "trading_pnl",
+    "holding_pnl",
+    "total_pnl",
+    "net_pnl",
+)
+
+
+def get_trade_arrays(trades: List[TradeData]) -> tuple:
+    """
+    Signed volume, volume and price arrays of trades.
+    """
+    count: int = len(trades)
+
+    volume: np.ndarray = np.fromiter((trade.volume for trade in trades), dtype=np.float64, count=count)
+    price: np.ndarray = np.fromiter((trade.price for trade in trades), dtype=np.float64, count=count)
+
+    is_long: np.ndarray = np.fromiter(
+        (trade.direction == Direction.LONG for trade in trades), dtype=bool, count=count
+    )
+    pos_change: np.ndarray = np.where(is_long, volume, -volume)
+
+    return pos_change, volume, price
+
+
+def calculate_pnl_arrays(
+    close_price: np.ndarray,
+    trade_ix: np.ndarray,
+    pos_change: np.ndarray,
+    volume: np.ndarray,
+    price: np.ndarray,
+    size: float,
+    rate: float,
+    slippage: float
+) -> dict:
+    """
+    Calculate pnl of every period.
+
+    close_price: close price of every period.
+    trade_ix: period index of every trade, trades must be ordered by it.
+    pos_change, volume, price: signed volume, volume and price of trades.
+    """
+    periods: int = len(close_price)
+    close_price = np.asarray(close_price, dtype=np.float64)
+
+    # Use value 1 as pre close of the first period to avoid zero division
+    pre_close: np.ndarray = np.ones(periods)
+    pre_close[1:] = close_price[:-1]
+    pre_close[pre_close == 0] = 1
+
+    # Position at end of every period
+    trade_count: np.ndarray = np.bincount(trade_ix, minlength=periods)
+    pos: np.ndarray = np.concatenate(([0.0], np.cumsum(pos_change)))
+    end_pos: np.ndarray = pos[np.cumsum(trade_count)]
+
+    start_pos: np.ndarray = np.zeros(periods)
+    start_pos[1:] = end_pos[:-1]
+
+    # Holding pnl is the pnl from holding position at period start
+    holding_pnl: np.ndarray = start_pos * (close_price - pre_close) * size
+
+    # Trading pnl is the pnl from new trades during the period
+    trade_turnover: np.ndarray = volume * size * price
+
+    trading_pnl: np.ndarray = np.zeros(periods)
+    np.add.at(trading_pnl, trade_ix, pos_change * (close_price[trade_ix] - price) * size)
+
+    turnover: np.ndarray = np.zeros(periods)
+    np.add.at(turnover, trade_ix, trade_turnover)
+
+    commission: np.ndarray = np.zeros(periods)
+    np.add.at(commission, trade_ix, trade_turnover * rate)
+
+    slippage_cost: np.ndarray = np.zeros(periods)
+    np.add.at(slippage_cost, trade_ix, volume * size * slippage)
+
+    # Net pnl takes account of commission and slippage cost
+    total_pnl: np.ndarray = trading_pnl + holding_pnl
+    net_pnl: np.ndarray = total_pnl - commission - slippage_cost
+
+    return {
+        "close_price": close_price,
+        "pre_close": pre_close,
+        "trade_count": trade_count,
+        "start_pos": start_pos,
+        "end_pos": end_pos,
+        "turnover": turnover,
+        "commission": commission,
+        "slippage": slippage_cost,
+        "trading_pnl": trading_pnl,
+        "holding_pnl": holding_pnl,
+        "total_pnl": total_pnl,
+        "net_pnl": net_pnl,
+    }
@@ -0,0 +1,87 @@
+"""
+Background prefetch of history slices for streaming replay.
+
+History is loaded slice by slice in a thread while the engine replays
+the previous slices, the bounded queue keeps at most maxsize slices in
+memory at the same time.
+"""
+from queue import Empty, Full, Queue
+from threading import Event, Thread
+from typing import Any, Iterable, Iterator, Optional
+
+
+# Seconds to wait on the queue before checking for stop.
+QUEUE_TIMEOUT: float = 0.1
+
+
+class HistoryPrefetcher:
+    """
+    Iterate slices produced by a loader iterable in a background thread.
+    """
+
+    def __init__(self, loader: Iterable, maxsize: int = 2) -> None:
+        """"""
+        self.loader: Iterable = loader
+        self.queue: Queue = Queue(maxsize=max(maxsize, 1))
+        self.stopped: Event = Event()
+        self.thread: Optional[Thread] = None
+
+    def start(self) -> None:
+        """"""
+        self.thread = Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        """
+        Stop loading, slices not replayed yet are dropped.
+        """
+        self.stopped.set()
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+
+    def run(self) -> None:
+        """"""
+        try:
+            for data in self.loader:
+                if not self.put((True, data)):
+                    return
+        except Exception as e:
+            self.put((False, e))
+            return
+
+        self.put((True, None))
+
+    def put(self, item: tuple) -> bool:
+        """"""
+        while not self.stopped.is_set():
+            try:
+                self.queue.put(item, timeout=QUEUE_TIMEOUT)
+                return True
+            except Full:
+                continue
+        return False
+
+    def __iter__(self) -> Iterator[Any]:
+        """
+        Slices in loading order, exception of the loader is raised here.
+        """
+        if not self.thread:
+            self.start()
+
+        try:
+            while True:
+                try:
+                    ok, data = self.queue.get(timeout=QUEUE_TIMEOUT)
+                except Empty:
+                    if self.thread and not self.thread.is_alive() and self.queue.empty():
+                        return
+                    continue
+
+                if not ok:
+                    raise data
+                if data is None:
+                    return
+                yield data
+        finally:
+            self.stop()
@@ -0,0 +1,210 @@
+"""
+Conversion between bar DataFrames and BarData.
+
+The chart and the yfinance feed work with DataFrames (Date, Open, High,
+Low, Close, Volume ...), gateways and strategies with list[BarData].
+BarBatch holds the bars of one symbol column-wise, so either side can be
+built in a single pass without going through one DataFrame per bar.
+"""
+from datetime import tzinfo
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+from tzlocal import get_localzone_name
+
+from datatypes import BarData
+from constant import Exchange, Interval
+
+try:
+    from zoneinfo import ZoneInfo
+except ImportError:
+    from backports.zoneinfo import ZoneInfo
+
+
+LOCAL_TZ = ZoneInfo(get_localzone_name())
+
+# DataFrame column: BarData field
+PRICE_COLUMNS: dict = {
+    "Open": "open_price",
+    "High": "high_price",
+    "Low": "low_price",
+    "Close": "close_price",
+    "Volume": "volume",
+}
+
+# Columns of the bar DataFrame used by the chart.
+FRAME_COLUMNS: list = [
+    "Date", "Open", "High", "Low", "Close", "Volume",
+    "Symbol", "Gateway", "vt_symbol", "Interval"
+]
+
+
+class BarBatch:
+    """
+    Bars of one symbol held as columns: an object array of datetimes and
+    one float array per price/volume field.
+    """
+
+    def __init__(
+        self,
+        symbol: str = "",
+        exchange: Exchange = Exchange.SMART,
+        interval: Interval = None,
+        gateway_name: str = "",
+        size: int = 0
+    ) -> None:
+        """"""
+        self.symbol: str = symbol
+        self.exchange: Exchange = exchange
+        self.interval: Interval = interval
+        self.gateway_name: str = gateway_name
+
+        self.datetime: np.ndarray = np.empty(size, dtype=object)
+        self.open_price: np.ndarray = np.zeros(size)
+        self.high_price: np.ndarray = np.zeros(size)
+        self.low_price: np.ndarray = np.zeros(size)
+        self.close_price: np.ndarray = np.zeros(size)
+        self.volume: np.ndarray = np.zeros(size)
+
+    def __len__(self) -> int:
+        """"""
+        return len(self.datetime)
+
+    @property
+    def vt_symbol(self) -> str:
+        """"""
+        return f"{self.symbol}.{self.exchange.value}"
+
+    @classmethod
+    def from_bars(cls, bars: List[BarData]) -> "BarBatch":
+        """
+        Create a batch from a list of BarData of the same symbol.
+        """
+        if not bars:
+            return cls()
+
+        first: BarData = bars[0]
+        batch: BarBatch = cls(first.symbol, first.exchange, first.interval, first.gateway_name, len(bars))
+        batch.datetime[:] = [bar.datetime for bar in bars]
+
+        for name in PRICE_COLUMNS.values():
+            getattr(batch, name)[:] = [getattr(bar, name) for bar in bars]
+
+        return batch
+
+    @classmethod
+    def from_dataframe(
+        cls,
+        df: DataFrame,
+        gateway_name: str = "",
+        symbol: str = "",
+        interval: Interval = None,
+        exchange: Exchange = Exchange.SMART,
+        tz: Optional[tzinfo] = LOCAL_TZ
+    ) -> "BarBatch":
+        """
+        Create a batch from a bar DataFrame (yfinance download after
+        reset_index, or the chart DataFrame).
+
+        Timezone aware datetimes are converted to tz and made naive, to
+        the second, in one vectorized step.
+        """
+        if df is None or df.empty:
+            return cls(symbol, exchange, interval, gateway_name)
+
+        batch: BarBatch = cls(symbol, exchange, interval, gateway_name)
+
+        date_column: str = "Datetime" if "Datetime" in df.columns else "Date"
+        dates: pd.DatetimeIndex = pd.DatetimeIndex(df[date_column])
+        if dates.tz is not None:
+            dates = dates.tz_convert(tz).tz_localize(None)
+        dates = dates.floor("s")
+        batch.datetime = dates.to_pydatetime()
+
+        for column, name in PRICE_COLUMNS.items():
+            setattr(batch, name, df[column].to_numpy(dtype=np.float64))
+
+        return batch
+
+    def to_bars(self) -> List[BarData]:
+        """
+        Create BarData of every row.
+        """
+        return [
+            BarData(
+                gateway_name=self.gateway_name,
+                symbol=self.symbol,
+                exchange=self.exchange,
+                datetime=dt,
+                interval=self.interval,
+                volume=volume,
+                open_price=open_price,
+                high_price=high_price,
+                low_price=low_price,
+                close_price=close_price,
+            )
+            for dt, open_price, high_price, low_price, close_price, volume in zip(
+                self.datetime.tolist(),
+                self.open_price.tolist(),
+                self.high_price.tolist(),
+                self.low_price.tolist(),
+                self.close_price.tolist(),
+                self.volume.tolist(),
+            )
+        ]
+
+    def to_dataframe(self) -> DataFrame:
+        """
+        Create the chart DataFrame in one allocation.
+        """
+        if not len(self):
+            return DataFrame()
+
+        return DataFrame({
+            "Date": self.datetime,
+            "Open": self.open_price,
+            "High": self.high_price,
+            "Low": self.low_price,
+            "Close": self.close_price,
+            "Volume": self.volume,
+            "Symbol": self.symbol,
+            "Gateway": self.gateway_name,
+            "vt_symbol": self.vt_symbol,
+            "Interval": self.interval,
+        })
+
+
+def bars_to_dataframe(bars: List[BarData]) -> DataFrame:
+    """
+    Create the chart DataFrame of a list of BarData, one row per bar.
+    """
+    if not bars:
+        return DataFrame()
+
+    return DataFrame({
+        "Date": [bar.datetime for bar in bars],
+        "Open": [bar.open_price for bar in bars],
+        "High": [bar.high_price for bar in bars],
+        "Low": [bar.low_price for bar in bars],
+        "Close": [bar.close_price for bar in bars],
+        "Volume": [bar.volume for bar in bars],
+        "Symbol": [bar.symbol for bar in bars],
+        "Gateway": [bar.gateway_name for bar in bars],
+        "vt_symbol": [bar.vt_symbol for bar in bars],
+        "Interval": [bar.interval for bar in bars],
+    }, columns=FRAME_COLUMNS)
+
+
+def dataframe_to_bars(
+    df: DataFrame,
+    gateway_name: str = "",
+    symbol: str = "",
+    interval: Interval = None,
+    exchange: Exchange = Exchange.SMART
+) -> List[BarData]:
+    """
+    Create BarData of every row of a bar DataFrame.
+    """
+    return BarBatch.from_dataframe(df, gateway_name, symbol, interval, exchange).to_bars()
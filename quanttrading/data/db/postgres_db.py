@@ -1,6 +1,8 @@
 from datetime import datetime, timedelta
 from typing import List
 import logging
+import csv
+import io
 
 from peewee import (
     AutoField,
@@ -23,11 +25,15 @@ from database import (
     BarOverview,
     DB_TZ,
     TickOverview,
+    TICK_ARRAY_FIELDS,
     convert_tz
 )
 
 logger = logging.getLogger(__name__)
 
+# NULL marker of COPY, so that empty strings are kept as they are
+COPY_NULL: str = "\\N"
+
 db = PostgresqlDatabase("quant", user="quant88", password="080802", host="192.168.1.127", port=5432)
 
 class BaseModel(Model):
@@ -239,95 +245,142 @@ class PostgreDatabase(BaseDatabase):
         return True
 
     def save_tick_data(self, ticks: List[TickData], stream: bool = False) -> bool:
-        """save TICK related data. ask, bid, volume, last etc"""
-        # 读取主键参数
-        tick: TickData = ticks[0]
-        symbol: str = tick.symbol
-        exchange: Exchange = tick.exchange
+        """
+        save TICK related data. ask, bid, volume, last etc.
+        Saved with the bulk COPY path, the overview is updated with the
+        number of new rows instead of recounting the table.
+        """
+        if not ticks:
+            return False
 
-        # 将TickData数据转换为字典，并调整时区
-        data: list = []
-        # print(f"====================={tick=}")
+        self.save_tick_data_bulk(ticks)
+        return True
 
-        for tick in ticks:
-            tick.datetime = convert_tz(tick.datetime)
 
-            d: dict = tick.__dict__
-            d["exchange"] = d["exchange"].value
-            d.pop("gateway_name")
-            d.pop("vt_symbol")
-            if d.get("extra", None) is not None:
-                d.pop("extra")
-            data.append(d)
+    def save_one_tick_data(self, ticks: List[TickData], stream: bool = False) -> bool:
+        """
+        save one TICK data, only last price and last volume.
+        ticks could be of any number of symbols, they are loaded with
+        one COPY.
+        """
+        
+        if not ticks or len(ticks) < 1:
+            logger.info(f"invalid ticks data: {ticks}")
+            return False    
 
-        # 使用upsert操作将数据更新到数据库中
+        columns: list = ["symbol", "exchange", "datetime", "name", "last_price", "last_volume"]
+        rows: list = [
+            (
+                tick.symbol,
+                tick.exchange.value,
+                convert_tz(tick.datetime),
+                tick.name,
+                tick.last_price,
+                tick.last_volume
+            )
+            for tick in ticks
+        ]
+
+        # update data to the database.
         with self.db.atomic():
-            for c in chunked(data, 10):
-                # print(f"{c=} ")
-                query = DbTickData.insert_many(c).on_conflict_ignore().execute()
+            self.copy_rows(DbOneTickData, columns, rows)
 
-        # 更新Tick汇总数据
-        overview: DbTickOverview = DbTickOverview.get_or_none(
-            DbTickOverview.symbol == symbol,
-            DbTickOverview.exchange == exchange.value,
-        )
+        return True
 
-        if not overview:
-            overview: DbTickOverview = DbTickOverview()
-            overview.symbol = symbol
-            overview.exchange = exchange.value
-            overview.start = ticks[0].datetime
-            overview.end = ticks[-1].datetime
-            overview.count = len(ticks)
-        elif stream:
-            overview.end = ticks[-1].datetime
-            overview.count += len(ticks)
-        else:
-            overview.start = min(ticks[0].datetime, overview.start)
-            overview.end = max(ticks[-1].datetime, overview.end)
+    def save_tick_data_bulk(self, ticks: List[TickData]) -> int:
+        """
+        Bulk save TICK data of any number of symbols with COPY FROM.
+        Ticks already saved are kept, so the number of new rows is exact
+        and the overview is updated incrementally instead of recounted.
+        Return number of new ticks.
+        """
+        if not ticks:
+            return 0
 
-            s: ModelSelect = DbTickData.select().where(
-                (DbTickData.symbol == symbol)
-                & (DbTickData.exchange == exchange.value)
-            )
-            overview.count = s.count()
+        columns: list = ["symbol", "exchange", "datetime", "name"]
+        columns.extend(TICK_ARRAY_FIELDS)
+        columns.append("localtime")
 
-        overview.save()
+        groups: dict = {}
+        for tick in ticks:
+            dt: datetime = convert_tz(tick.datetime)
 
-        return True
+            row: list = [tick.symbol, tick.exchange.value, dt, tick.name]
+            row.extend(getattr(tick, name) for name in TICK_ARRAY_FIELDS)
+            row.append(tick.localtime)
 
+            groups.setdefault((tick.symbol, tick.exchange.value), []).append(row)
 
-    def save_one_tick_data(self, ticks: List[TickData], stream: bool = False) -> bool:
-        """save one TICK data, only last price and last volume"""
-        
-        if not ticks or len(ticks) < 1:
-            logger.info(f"invalid ticks data: {ticks}")
-            return False    
+        total: int = 0
+        with self.db.atomic():
+            for (symbol, exchange), rows in groups.items():
+                count: int = self.copy_rows(DbTickData, columns, rows)
 
-        # convert the 
-        data: list = []
-        # print(f"====================={tick=}")
+                dts: list = [row[2] for row in rows]
+                self.update_tick_overview(symbol, exchange, min(dts), max(dts), count)
+                total += count
 
-        for tick in ticks:
-            tick.datetime = convert_tz(tick.datetime)
+        return total
 
-            d: dict = {}
-            d["exchange"] = tick.exchange.value
-            d["symbol"] = tick.symbol
-            d["name"] = tick.name
-            d["datetime"] = tick.datetime
-            d["last_price"] = tick.last_price
-            d["last_volume"] = tick.last_volume
+    def copy_rows(self, model: type, columns: list, rows: list) -> int:
+        """
+        Load rows with COPY FROM into a temporary table, then move them
+        into the model table ignoring the ones already there.
+        COPY itself could not skip conflicting rows.
+        Return number of rows inserted.
+        """
+        buf: io.StringIO = io.StringIO()
+        writer = csv.writer(buf)
+        for row in rows:
+            writer.writerow([COPY_NULL if v is None else v for v in row])
+        buf.seek(0)
+
+        table: str = model._meta.table_name
+        temp: str = f"tmp_{table}"
+        names: str = ", ".join(f'"{c}"' for c in columns)
+
+        cursor = self.db.cursor()
+        cursor.execute(
+            f"CREATE TEMP TABLE IF NOT EXISTS {temp} "
+            f"(LIKE {table} INCLUDING DEFAULTS) ON COMMIT DELETE ROWS"
+        )
+        cursor.copy_expert(f"COPY {temp} ({names}) FROM STDIN WITH (FORMAT csv, NULL '{COPY_NULL}')", buf)
+        cursor.execute(
+            f"INSERT INTO {table} ({names}) SELECT {names} FROM {temp} ON CONFLICT DO NOTHING"
+        )
+        count: int = cursor.rowcount
+        cursor.execute(f"TRUNCATE {temp}")
+        return count
 
-            data.append(d)
+    def update_tick_overview(
+        self,
+        symbol: str,
+        exchange: str,
+        start: datetime,
+        end: datetime,
+        count: int
+    ) -> None:
+        """
+        Update tick overview incrementally with count new ticks.
+        """
+        overview: DbTickOverview = DbTickOverview.get_or_none(
+            DbTickOverview.symbol == symbol,
+            DbTickOverview.exchange == exchange,
+        )
 
-        # update data to the database.
-        with self.db.atomic():
-            for c in chunked(data, 10):
-                # print(f"{c=} ")
-                query = DbOneTickData.insert_many(c).on_conflict_ignore().execute()
+        if not overview:
+            overview = DbTickOverview()
+            overview.symbol = symbol
+            overview.exchange = exchange
+            overview.start = start
+            overview.end = end
+            overview.count = count
+        else:
+            overview.start = min(start, overview.start)
+            overview.end = max(end, overview.end)
+            overview.count += count
 
-        return True
+        overview.save()
 
 
     def load_one_tick_data_byHours(
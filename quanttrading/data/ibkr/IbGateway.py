@@ -14,7 +14,8 @@ ConId is also supported for symbol.
 import re
 from copy import copy
 from datetime import datetime, timedelta
-from threading import Thread, Condition
+from concurrent.futures import Future
+from threading import Thread
 from typing import Optional
 from decimal import Decimal
 import shelve
@@ -63,6 +64,7 @@ from constant import (
     EVENT_TICK_BIDASK_DATA
 )
 from utility import get_file_path, ZoneInfo
+from barframe import bars_to_dataframe
 from event import EVENT_TIMER, Event
 
 # 委托状态映射
@@ -218,6 +220,15 @@ def intervalToIB(interval) -> str:
     
     return tobe
 from .aiorder import OrderSamples
+from .history import HistoryError, HistoryMultiplexer
+from .tick import (
+    TickBuffer,
+    TickCoalescer,
+    TICK_VALUE_INDEX,
+    BID_PRICE_INDEX,
+    ASK_PRICE_INDEX,
+    LAST_PRICE_INDEX,
+)
 # 其他常量
 LOCAL_TZ = ZoneInfo(get_localzone_name())
 JOIN_SYMBOL: str = "-"
@@ -234,7 +245,8 @@ class IbGateway(BaseGateway):
         "TWS地址": "127.0.0.1",
         "TWS端口": 7497,
         "客户号": 1,
-        "交易账户": ""
+        "交易账户": "",
+        "行情合并窗口(毫秒)": 0
     }
 
     exchanges: list[str] = list(EXCHANGE_VT2IB.keys())
@@ -252,8 +264,9 @@ class IbGateway(BaseGateway):
         port: int = setting["TWS端口"]
         clientid: int = setting["客户号"]
         account: str = setting["交易账户"]
+        tick_window: int = setting.get("行情合并窗口(毫秒)", 0)
 
-        self.api.connect(host, port, clientid, account)
+        self.api.connect(host, port, clientid, account, tick_window / 1000)
         self.alive = self.api.status
 
         self.event_engine.register(EVENT_TIMER, self.process_timer_event)
@@ -294,6 +307,10 @@ class IbGateway(BaseGateway):
         # event = Event(EVENT)
         # self.event_engine.put()
         return self.api.query_history(req)
+
+    def query_history_async(self, req: HistoryRequest) -> Future:
+        """不阻塞查询历史数据，返回Future"""
+        return self.api.query_history_async(req)
     
     def query_daily_pnl(self) -> None:
         self.api.query_daily_pnl()
@@ -325,10 +342,9 @@ class IbApi(EWrapper):
         self.reqid: int = 0
         self.orderid: int = 0
         self.clientid: int = 0
-        self.history_reqid: int = 0
         self.account: str = ""
 
-        self.ticks: dict[int, TickData] = {}
+        self.ticks: dict[int, TickBuffer] = {}
         self.orders: dict[str, OrderData] = {}
         self.accounts: dict[str, AccountData] = {}
         self.contracts: dict[str, ContractData] = {}
@@ -336,9 +352,17 @@ class IbApi(EWrapper):
         self.subscribed: dict[str, SubscribeRequest] = {}
         self.data_ready: bool = False
 
-        self.history_req: HistoryRequest = None
-        self.history_condition: Condition = Condition()
-        self.history_buf: list[BarData] = []
+        # 历史数据请求并发发送，按reqId区分
+        self.history_multiplexer: HistoryMultiplexer = HistoryMultiplexer(self.send_history_request)
+
+        # tick推送合并，窗口内的更新合并为一次推送
+        self.tick_coalescer: TickCoalescer = TickCoalescer(
+            0,
+            self.ticks.get,
+            self.gateway.on_tick,
+            self.gateway.on_tick_last,
+            EVENT_TICK_LAST_DATA
+        )
 
         self.reqid_symbol_map: dict[int, str] = {}              # reqid: subscribe tick symbol
         self.reqid_underlying_map: dict[int, Contract] = {}     # reqid: query option underlying
@@ -358,6 +382,8 @@ class IbApi(EWrapper):
 
         self.data_ready = False
 
+        self.tick_coalescer.start()
+
     def connectionClosed(self) -> None:
         """连接断开回报"""
         self.status = False
@@ -391,10 +417,8 @@ class IbApi(EWrapper):
         super().error(reqId, errorCode, errorString)
 
         # 2000-2999信息通知不属于报错信息
-        if reqId == self.history_reqid and errorCode not in range(2000, 3000):
-            self.history_condition.acquire()
-            self.history_condition.notify()
-            self.history_condition.release()
+        if errorCode not in range(2000, 3000):
+            self.history_multiplexer.on_error(reqId, errorCode, errorString)
 
         msg: str = f"信息通知，代码：{errorCode}，内容: {errorString}"
         self.gateway.write_log(msg)
@@ -433,33 +457,38 @@ class IbApi(EWrapper):
         if tickType not in TICKFIELD_IB2VT:
             return
 
-        tick: TickData = self.ticks.get(reqId, None)
+        ix: int = TICK_VALUE_INDEX.get(TICKFIELD_IB2VT[tickType], -1)
+        if ix < 0:
+            return
+
+        tick: TickBuffer = self.ticks.get(reqId, None)
         if not tick:
             self.gateway.write_log(f"tickPrice函数收到未订阅的推送，reqId：{reqId}")
             return
-        previous_last_price = tick.last_price
 
-        name: str = TICKFIELD_IB2VT[tickType]
-        setattr(tick, name, price)
-        # print(f"{name=}, {price=} {tick.datetime=}")
+        values: list = tick.values
+        previous_last_price: float = values[LAST_PRICE_INDEX]
+        values[ix] = price
         # add a time for the price received. check if needed.
         tick.datetime = datetime.now(LOCAL_TZ)
 
-        # 更新tick数据name字段
-        contract: ContractData = self.contracts.get(tick.vt_symbol, None)
-        if contract:
-            tick.name = contract.name
+        # 更新tick数据name字段，合约名称只需查询一次
+        if not tick.name:
+            contract: ContractData = self.contracts.get(tick.vt_symbol, None)
+            if contract:
+                tick.name = contract.name
 
         # 本地计算Forex of IDEALPRO和Spot Commodity的tick时间和最新价格
-        if tick.exchange == Exchange.IDEALPRO or "CMDTY" in tick.symbol:
-            if not tick.bid_price_1 or not tick.ask_price_1:
+        if tick.mid_price:
+            bid_price: float = values[BID_PRICE_INDEX]
+            ask_price: float = values[ASK_PRICE_INDEX]
+            if not bid_price or not ask_price:
                 return
-            tick.last_price = (tick.bid_price_1 + tick.ask_price_1) / 2
-            tick.datetime = datetime.now(LOCAL_TZ)
+            values[LAST_PRICE_INDEX] = (bid_price + ask_price) / 2
         # only last_price trigger the on_tick event now. Could be changed 
         # according to defiffrrent requirements.
-        if previous_last_price and previous_last_price != tick.last_price:
-            self.gateway.on_tick(copy(tick))
+        if previous_last_price and previous_last_price != values[LAST_PRICE_INDEX]:
+            self.tick_coalescer.publish_tick(reqId, tick)
 
     def tickSize(self, reqId: TickerId, tickType: TickType, size: Decimal) -> None:
         """
@@ -470,13 +499,16 @@ class IbApi(EWrapper):
         if tickType not in TICKFIELD_IB2VT:
             return
 
-        tick: TickData = self.ticks.get(reqId, None)
+        ix: int = TICK_VALUE_INDEX.get(TICKFIELD_IB2VT[tickType], -1)
+        if ix < 0:
+            return
+
+        tick: TickBuffer = self.ticks.get(reqId, None)
         if not tick:
             self.gateway.write_log(f"tickSize函数收到未订阅的推送，reqId：{reqId}")
             return
 
-        name: str = TICKFIELD_IB2VT[tickType]
-        setattr(tick, name, float(size))
+        tick.values[ix] = float(size)
         # print(f"{name=}: {tick.datetime=}")
         
         # never use this realtime size information. 
@@ -497,7 +529,7 @@ class IbApi(EWrapper):
         if tickType != TickTypeEnum.LAST_TIMESTAMP:
             return
 
-        tick: TickData = self.ticks.get(reqId, None)
+        tick: TickBuffer = self.ticks.get(reqId, None)
         if not tick:
             self.gateway.write_log(f"tickString函数收到未订阅的推送，reqId：{reqId}")
             return
@@ -538,7 +570,7 @@ class IbApi(EWrapper):
             undPrice,
         )
 
-        tick: TickData = self.ticks.get(reqId, None)
+        tick: TickBuffer = self.ticks.get(reqId, None)
         if not tick:
             self.gateway.write_log(f"tickOptionComputation函数收到未订阅的推送，reqId：{reqId}")
             return
@@ -566,7 +598,7 @@ class IbApi(EWrapper):
         """行情切片查询返回完毕"""
         super().tickSnapshotEnd(reqId)
 
-        tick: TickData = self.ticks.get(reqId, None)
+        tick: TickBuffer = self.ticks.get(reqId, None)
         if not tick:
             self.gateway.write_log(f"tickSnapshotEnd函数收到未订阅的推送，reqId：{reqId}")
             return
@@ -869,6 +901,10 @@ class IbApi(EWrapper):
 
     def historicalData(self, reqId: int, ib_bar: IbBarData) -> None:
         """历史数据更新回报"""
+        history_req: Optional[HistoryRequest] = self.history_multiplexer.get_request(reqId)
+        if not history_req:
+            return
+
         # 日级别数据和周级别日期数据的数据形式为%Y%m%d
         time_str: str = ib_bar.date
         time_split: list = time_str.split(" ")
@@ -897,10 +933,10 @@ class IbApi(EWrapper):
             dt: datetime = dt.astimezone(LOCAL_TZ)
 
         bar: BarData = BarData(
-            symbol=self.history_req.symbol,
-            exchange=self.history_req.exchange,
+            symbol=history_req.symbol,
+            exchange=history_req.exchange,
             datetime=dt,
-            interval=self.history_req.interval,
+            interval=history_req.interval,
             volume=float(ib_bar.volume),
             open_price=ib_bar.open,
             high_price=ib_bar.high,
@@ -911,13 +947,11 @@ class IbApi(EWrapper):
         if bar.volume < 0:
             bar.volume = 0
 
-        self.history_buf.append(bar)
+        self.history_multiplexer.on_bar(reqId, bar)
 
     def historicalDataEnd(self, reqId: int, start: str, end: str) -> None:
         """历史数据查询完毕回报"""
-        self.history_condition.acquire()
-        self.history_condition.notify()
-        self.history_condition.release()
+        self.history_multiplexer.on_end(reqId)
 
     def tickByTickAllLast(self, reqId: TickerId, tickType: TickerId, time: TickerId, price: float, size: Decimal, tickAttribLast: TickAttribLast, exchange: str, specialConditions: str):
         """
@@ -938,18 +972,20 @@ class IbApi(EWrapper):
         # message = f'tickByTickAllLast:: ReqId: {reqId}, Time: {datetime.fromtimestamp(time).strftime("%Y%m%d-%H:%M:%S")}, tickAttribLast: {tickAttribLast=}, {exchange=} {specialConditions=}'
         # message += f"\n tickType is : {tickType}, price is: {price=} and {size=}"
 
-        tick = self.ticks.get(reqId, None)
-        symbol = tick.symbol
-        if not symbol:
+        tick: TickBuffer = self.ticks.get(reqId, None)
+        if not tick:
             return
-        date = datetime.fromtimestamp(time)
-        date = date.astimezone(LOCAL_TZ)
-        
-        tickData = TickData(self.gateway, symbol, EXCHANGE_IB2VT.get(exchange, Exchange.SMART), date , name=EVENT_TICK_LAST_DATA, last_price=price, last_volume=size)
-        # TickData include time for the tick data. 
-        self.gateway.on_tick_last(tickData)
+        date: datetime = datetime.fromtimestamp(time, LOCAL_TZ)
 
-        return None
+        # 窗口内的逐笔成交合并推送，成交量累加
+        self.tick_coalescer.publish_last(
+            reqId,
+            tick,
+            date,
+            price,
+            float(size),
+            EXCHANGE_IB2VT.get(exchange, Exchange.SMART)
+        )
 
     def query_daily_pnl(self) -> None:
         """
@@ -1034,7 +1070,8 @@ class IbApi(EWrapper):
         host: str,
         port: int,
         clientid: int,
-        account: str
+        account: str,
+        tick_window: float = 0
     ) -> None:
         """连接TWS"""
         if self.status:
@@ -1044,6 +1081,7 @@ class IbApi(EWrapper):
         self.port = port
         self.clientid = clientid
         self.account = account
+        self.tick_coalescer.window = tick_window
 
         self.client.connect(host, port, clientid)
         self.thread = Thread(target=self.client.run)
@@ -1070,6 +1108,8 @@ class IbApi(EWrapper):
         self.save_contract_data()
 
         self.status = False
+        self.history_multiplexer.stop()
+        self.tick_coalescer.stop()
         self.client.disconnect()
 
     def query_option_portfolio(self, underlying: Contract) -> None:
@@ -1146,15 +1186,12 @@ class IbApi(EWrapper):
         self.client.reqMktData(self.reqid, ib_contract, "", False, False, [])
         # self.client.reqTickByTickData(self.reqid, ib_contract, req.tickType, 0, True)
 
-        tick: TickData = TickData(
-            symbol=req.symbol,
-            exchange=req.exchange,
-            datetime=datetime.now(LOCAL_TZ),
-            gateway_name=self.gateway_name
+        self.ticks[self.reqid] = TickBuffer(
+            req.symbol,
+            req.exchange,
+            self.gateway_name,
+            datetime.now(LOCAL_TZ)
         )
-        tick.extra = {}
-
-        self.ticks[self.reqid] = tick
 
     def unsubscribe(self, req: SubscribeRequest) -> None:
         """cancel the subscribed tick data"""
@@ -1233,36 +1270,50 @@ class IbApi(EWrapper):
 
     def query_history(self, req: HistoryRequest) -> list[BarData]:
         """查询历史数据"""
-        # print(f"=============== {req=} and {self.contracts=}")
         if not self.status:
             return
-        # contract: ContractData = self.contracts[req.vt_symbol]
-        # if not contract:
-        #     self.gateway.write_log(f"找不到合约：{req.vt_symbol}，请先订阅")
-        #     return []
-        
-        self.history_req = req
 
-        self.reqid += 1
+        future: Future = self.query_history_async(req)
+        try:
+            history: list[BarData] = future.result()       # 等待异步数据返回
+        except (HistoryError, TimeoutError) as e:
+            self.gateway.write_log(f"历史数据查询失败：{req.vt_symbol}，{e}")
+            history = []
+
+        data = self._wrapDataFramebyBar(history)
+
+        self.gateway.event_engine.put(Event(EVENT_HISDATA, data))
+        del history
+        return None
+
+    def query_history_async(self, req: HistoryRequest) -> Future:
+        """
+        Queue a history request without blocking. Requests are sent
+        concurrently with IB pacing, long ranges are split into chunks.
+        The future result is the list of bars.
+        """
+        future: Future = Future()
+        if not self.status:
+            future.set_result([])
+            return future
 
         ib_contract: Contract = generate_ib_contract(req.symbol, req.exchange)
+        if ib_contract.symbol not in self.contracts:
+            self.reqid += 1
+            self.client.reqContractDetails(self.reqid, ib_contract)
 
-        if req.end:
-            end: datetime = req.end
-        else:
-            end: datetime = datetime.now(LOCAL_TZ)
+        self.history_multiplexer.start()
+        return self.history_multiplexer.submit(req)
+
+    def send_history_request(self, reqid: int, req: HistoryRequest, end: datetime, duration: str) -> None:
+        """发送一个历史数据请求"""
+        ib_contract: Contract = generate_ib_contract(req.symbol, req.exchange)
 
         # 使用UTC结束时间戳
         utc_tz: ZoneInfo = ZoneInfo("utc")
         utc_end: datetime = end.astimezone(utc_tz)
         end_str: str = utc_end.strftime("%Y%m%d-%H:%M:%S")
 
-        delta: timedelta = end - req.start
-        days: int = delta.days
-        if days < 365:
-            duration: str = f"{days} D"
-        else:
-            duration: str = f"{delta.days/365:.0f} Y"
         bar_size: str = intervalToIB(req.interval)
         bar_type = "TRADES"
         # if contract.product in [Product.SPOT, Product.FOREX]:
@@ -1270,9 +1321,8 @@ class IbApi(EWrapper):
         # else:
         #     bar_type: str = "TRADES"
 
-        self.history_reqid = self.reqid
         self.client.reqHistoricalData(
-            self.reqid,
+            reqid,
             ib_contract,
             end_str,
             duration,
@@ -1283,24 +1333,6 @@ class IbApi(EWrapper):
             False,
             []
         )
-        if ib_contract.symbol not in self.contracts:
-           self.reqid += 1
-           
-           self.client.reqContractDetails(self.reqid, ib_contract)
-
-        self.history_condition.acquire()    # 等待异步数据返回
-        self.history_condition.wait(600)
-        self.history_condition.release()
-
-        history: list[BarData] = self.history_buf
-        self.history_buf: list[BarData] = []       # 创新新的缓冲列表
-        self.history_req: HistoryRequest = None
-
-        data = self._wrapDataFramebyBar(history)
-
-        self.gateway.event_engine.put(Event(EVENT_HISDATA, data))
-        del history
-        return None
 
     def add_contract(self, symbol:str, exchange:Exchange) -> None:
         if not self.status:
@@ -1318,17 +1350,7 @@ class IbApi(EWrapper):
     def _wrapDataFramebyBar(self, barList: list[BarData]) -> DataFrame:
         """
         """
-        # dates = bar.date.split()
-        df = DataFrame()
-        if barList is not None and isinstance(barList, list) and len(barList) > 0:
-            for bar in barList:
-                data = {'Date':bar.datetime, 'Open':bar.open_price, 'High':bar.high_price,
-                    'Low':bar.low_price, 'Close':bar.close_price, 'Volume':bar.volume, 
-                    'Symbol':bar.symbol, 'Gateway':bar.gateway_name, 'vt_symbol': bar.vt_symbol, 'Interval': bar.interval}
-                
-                dataFrame = DataFrame(data=data,index=[0])
-                df = pd.concat([df, dataFrame], ignore_index=True)
-        return df
+        return bars_to_dataframe(barList)
     
     def load_contract_data(self) -> None:
         """
@@ -1413,15 +1435,12 @@ class IbApi(EWrapper):
         self.reqid += 1
         self.client.reqMktData(self.reqid, ib_contract, "", True, False, [])
 
-        tick: TickData = TickData(
-            symbol=contract.symbol,
-            exchange=contract.exchange,
-            datetime=datetime.now(LOCAL_TZ),
-            gateway_name=self.gateway_name
+        self.ticks[self.reqid] = TickBuffer(
+            contract.symbol,
+            contract.exchange,
+            self.gateway_name,
+            datetime.now(LOCAL_TZ)
         )
-        tick.extra = {}
-
-        self.ticks[self.reqid] = tick
 
 
 def generate_ib_contract(symbol: str, exchange: Exchange) -> Optional[Contract]:
@@ -0,0 +1,355 @@
+"""
+Historical data request multiplexer of IbApi.
+
+Many reqHistoricalData requests are kept in flight at the same time,
+keyed by reqId. Requests are paced by a sliding window to respect the IB
+historical data limits, and long ranges are split into chunks whose
+bars are merged back into one result. Chunks hitting a pacing violation
+are sent again after a pause, other errors fail the request.
+"""
+
+from collections import deque
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from math import ceil
+from threading import Condition, Thread
+from time import monotonic
+from typing import Callable, Deque, Dict, List, Optional
+
+from datatypes import BarData, HistoryRequest
+from constant import Interval
+
+try:
+    from zoneinfo import ZoneInfo
+except ImportError:
+    from backports.zoneinfo import ZoneInfo
+
+
+# IB pacing: at most 60 historical data requests within 10 minutes,
+# and no more than 50 requests open at the same time.
+HISTORY_LIMIT: int = 60
+HISTORY_WINDOW: int = 600
+HISTORY_MAX_INFLIGHT: int = 50
+
+# Error code of historical data service errors, pacing violation is one
+# of them, "no data" is another which just ends the request.
+HISTORY_ERROR_CODE: int = 162
+
+# Seconds to pause sending after a pacing violation, and times a chunk
+# is sent again before its request fails.
+PACING_PAUSE: int = 60
+PACING_RETRIES: int = 3
+
+# Seconds to wait for the end of a request before failing it.
+HISTORY_TIMEOUT: int = 600
+
+# Request id range used by history requests, apart from other requests
+# of IbApi.
+HISTORY_REQID_START: int = 100_000_000
+
+# Days of data queried by one request of the interval.
+CHUNK_DAYS: Dict[Interval, int] = {
+    Interval.MINUTE: 7,
+    Interval.HOUR: 30,
+    Interval.DAILY: 365,
+    Interval.WEEKLY: 365 * 5,
+}
+
+
+class HistoryError(Exception):
+    """
+    Error returned by IB for a history request.
+    """
+
+    def __init__(self, code: int, message: str) -> None:
+        """"""
+        super().__init__(f"{code}: {message}")
+        self.code: int = code
+        self.message: str = message
+
+
+class SlidingWindowLimiter:
+    """
+    Allow at most limit requests within any window of seconds.
+    """
+
+    def __init__(self, limit: int, window: float) -> None:
+        """"""
+        self.limit: int = limit
+        self.window: float = window
+        self.times: Deque[float] = deque()
+
+    def try_acquire(self) -> float:
+        """
+        Record a request if allowed and return 0, otherwise return
+        seconds to wait until the oldest request leaves the window.
+        """
+        now: float = monotonic()
+        while self.times and now - self.times[0] >= self.window:
+            self.times.popleft()
+
+        if len(self.times) < self.limit:
+            self.times.append(now)
+            return 0
+        return self.times[0] + self.window - now
+
+
+@dataclass
+class HistoryTask:
+    """
+    One query_history request, split into chunks.
+    """
+
+    req: HistoryRequest
+    future: Future
+    remaining: int = 0
+    bars: List[BarData] = field(default_factory=list)
+
+
+@dataclass
+class HistoryChunk:
+    """
+    One reqHistoricalData request of a task.
+    """
+
+    task: HistoryTask
+    end: datetime
+    duration: str
+    sent_time: float = 0
+    retries: int = 0
+
+
+class HistoryMultiplexer:
+    """
+    Send history requests of many tasks concurrently.
+
+    send_func(reqid, req, end, duration) sends the actual request. IbApi
+    calls on_bar, on_end and on_error with the reqId of the callbacks,
+    which return False for reqIds not sent by the multiplexer.
+    """
+
+    def __init__(
+        self,
+        send_func: Callable,
+        limit: int = HISTORY_LIMIT,
+        window: float = HISTORY_WINDOW,
+        max_inflight: int = HISTORY_MAX_INFLIGHT,
+        timeout: int = HISTORY_TIMEOUT,
+        pacing_pause: float = PACING_PAUSE,
+        pacing_retries: int = PACING_RETRIES
+    ) -> None:
+        """"""
+        self.send_func: Callable = send_func
+        self.limiter: SlidingWindowLimiter = SlidingWindowLimiter(limit, window)
+        self.max_inflight: int = max_inflight
+        self.timeout: int = timeout
+        self.pacing_pause: float = pacing_pause
+        self.pacing_retries: int = pacing_retries
+        self.pause_until: float = 0
+
+        self.reqid: int = HISTORY_REQID_START
+        self.pending: Deque[HistoryChunk] = deque()
+        self.inflight: Dict[int, HistoryChunk] = {}
+
+        self.condition: Condition = Condition()
+        self.active: bool = False
+        self.thread: Optional[Thread] = None
+
+    def start(self) -> None:
+        """"""
+        if self.active:
+            return
+
+        self.active = True
+        self.thread = Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        """
+        Stop sending, unfinished tasks end with the bars received.
+        """
+        with self.condition:
+            self.active = False
+            self.condition.notify_all()
+
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+
+        chunks: List[HistoryChunk] = list(self.pending) + list(self.inflight.values())
+        self.pending.clear()
+        self.inflight.clear()
+        for chunk in chunks:
+            self.finish_chunk(chunk)
+
+    def submit(self, req: HistoryRequest) -> Future:
+        """
+        Queue a history request, the future result is the list of bars
+        sorted by datetime.
+        """
+        future: Future = Future()
+        task: HistoryTask = HistoryTask(req, future)
+
+        chunks: List[HistoryChunk] = [
+            HistoryChunk(task, end, duration) for end, duration in split_history_range(req)
+        ]
+        task.remaining = len(chunks)
+
+        if not chunks:
+            future.set_result([])
+            return future
+
+        with self.condition:
+            self.pending.extend(chunks)
+            self.condition.notify_all()
+
+        return future
+
+    def run(self) -> None:
+        """
+        Send pending chunks while the pacing window and request slots
+        allow.
+        """
+        while self.active:
+            with self.condition:
+                wait: float = self.check_timeout()
+                chunk: Optional[HistoryChunk] = None
+
+                pause: float = self.pause_until - monotonic()
+                if pause > 0:
+                    wait = min(wait, pause)
+                elif self.pending and len(self.inflight) < self.max_inflight:
+                    pacing_wait: float = self.limiter.try_acquire()
+                    if pacing_wait:
+                        wait = min(wait, pacing_wait)
+                    else:
+                        chunk = self.pending.popleft()
+                        chunk.sent_time = monotonic()
+                        self.reqid += 1
+                        reqid: int = self.reqid
+                        self.inflight[reqid] = chunk
+
+                if not chunk:
+                    self.condition.wait(wait)
+                    continue
+
+            self.send_func(reqid, chunk.task.req, chunk.end, chunk.duration)
+
+    def check_timeout(self) -> float:
+        """
+        Fail requests of chunks waiting longer than timeout, return
+        seconds until the next one times out.
+        """
+        now: float = monotonic()
+        wait: float = self.timeout
+
+        for reqid, chunk in list(self.inflight.items()):
+            left: float = chunk.sent_time + self.timeout - now
+            if left <= 0:
+                self.inflight.pop(reqid)
+                self.fail_task(chunk.task, TimeoutError(f"history request {reqid} timed out"))
+            else:
+                wait = min(wait, left)
+
+        return wait
+
+    def get_request(self, reqid: int) -> Optional[HistoryRequest]:
+        """"""
+        chunk: Optional[HistoryChunk] = self.inflight.get(reqid, None)
+        if chunk:
+            return chunk.task.req
+        return None
+
+    def on_bar(self, reqid: int, bar: BarData) -> bool:
+        """"""
+        chunk: Optional[HistoryChunk] = self.inflight.get(reqid, None)
+        if not chunk:
+            return False
+
+        chunk.task.bars.append(bar)
+        return True
+
+    def on_end(self, reqid: int) -> bool:
+        """"""
+        with self.condition:
+            chunk: Optional[HistoryChunk] = self.inflight.pop(reqid, None)
+            if not chunk:
+                return False
+
+            self.finish_chunk(chunk)
+            self.condition.notify_all()
+        return True
+
+    def on_error(self, reqid: int, code: int, message: str = "") -> bool:
+        """
+        A pacing violation sends the chunk again after a pause, "no data"
+        ends the chunk, any other error fails the whole request.
+        """
+        with self.condition:
+            chunk: Optional[HistoryChunk] = self.inflight.pop(reqid, None)
+            if not chunk:
+                return False
+
+            if code == HISTORY_ERROR_CODE and "pacing" in message.lower():
+                if chunk.retries < self.pacing_retries:
+                    chunk.retries += 1
+                    self.pending.appendleft(chunk)
+                    self.pause_until = monotonic() + self.pacing_pause
+                else:
+                    self.fail_task(chunk.task, HistoryError(code, message))
+            elif code == HISTORY_ERROR_CODE and "no data" in message.lower():
+                self.finish_chunk(chunk)
+            else:
+                self.fail_task(chunk.task, HistoryError(code, message))
+
+            self.condition.notify_all()
+        return True
+
+    def fail_task(self, task: HistoryTask, error: Exception) -> None:
+        """
+        Fail the request and drop its chunks not sent yet.
+        """
+        self.pending = deque(chunk for chunk in self.pending if chunk.task is not task)
+        if not task.future.done():
+            task.future.set_exception(error)
+
+    def finish_chunk(self, chunk: HistoryChunk) -> None:
+        """"""
+        task: HistoryTask = chunk.task
+        task.remaining -= 1
+        if task.remaining > 0 or task.future.done():
+            return
+
+        # Merge chunks, later chunk wins for overlapped bars
+        bars: Dict[datetime, BarData] = {bar.datetime: bar for bar in task.bars}
+        task.future.set_result([bars[dt] for dt in sorted(bars)])
+
+
+def split_history_range(req: HistoryRequest) -> List[tuple]:
+    """
+    Split the range of a history request into (end, duration) of IB
+    requests, from the latest to the earliest.
+    """
+    end: datetime = req.end or datetime.now(ZoneInfo("utc"))
+    start: datetime = req.start
+
+    if not start:
+        return [(end, req.duration or "1 D")]
+
+    chunk: timedelta = timedelta(days=CHUNK_DAYS.get(req.interval, 365))
+    ranges: List[tuple] = []
+
+    while end > start:
+        chunk_start: datetime = max(start, end - chunk)
+        days: int = max(ceil((end - chunk_start).total_seconds() / 86400), 1)
+
+        if days < 365:
+            duration: str = f"{days} D"
+        else:
+            duration = f"{days / 365:.0f} Y"
+
+        ranges.append((end, duration))
+        end = chunk_start
+
+    return ranges
@@ -172,6 +172,10 @@ class IbkrApp(AiWrapper, AiClient):
         # map symbol to historical Data
         self._hisData: dict[str, DataFrame] = {}
 
+        # rows of historical bars being received, map symbol to rows.
+        # the DataFrame is built once at historicalDataEnd.
+        self._hisRows: dict[str, list[dict]] = {}
+
         # list of symbols subscribed tick data. 
         # symbol to Subscribe request
         self.subscribed: dict[str, SubscribeRequest] = {}
@@ -317,25 +321,20 @@ class IbkrApp(AiWrapper, AiClient):
         self._processMessage(message)
 
         symbol = self.getSymbolByReqId(reqId)
-        data = self._wrapDataFramebyBar(bar, symbol)
-
-        df = self._hisData.get(symbol, None)
-        if df is None:
-            self._hisData[symbol] = data
-        else:
-            df = pandas.concat([df,data], ignore_index=True)            
-            self._hisData.update({symbol:df})
+        self._hisRows.setdefault(symbol, []).append(self._wrapRowbyBar(bar, symbol))
 
-    def _wrapDataFramebyBar(self, bar: BarData, symbol: str) -> DataFrame:
+    def _wrapRowbyBar(self, bar: BarData, symbol: str) -> dict:
         """
         """
         dates = bar.date.split()
-        data = {'Date':dates[0] + ' ' + dates[1], 'Open':bar.open, 'High':bar.high,
+        return {'Date':dates[0] + ' ' + dates[1], 'Open':bar.open, 'High':bar.high,
               'Low':bar.low, 'Close':bar.close, 'Volume':bar.volume, 'Wap':bar.wap,
               'Symbol':symbol, 'Gateway':self._gateway, 'Zone': dates[-1]}
-        
-        df = DataFrame(data=data,index=[0])
-        return df
+
+    def _wrapDataFramebyBar(self, bar: BarData, symbol: str) -> DataFrame:
+        """
+        """
+        return DataFrame([self._wrapRowbyBar(bar, symbol)])
 
     def _wrapCandlebyBar(self, bar: BarData, reqId: TickerId) -> CandleData:
         """
@@ -374,7 +373,16 @@ class IbkrApp(AiWrapper, AiClient):
         message = f"HistoricalDataEnd., {reqId=}, from : {start=} to: {end=}"
         self._processMessage(message)
 
-        self._processData(EVENT_HISDATA, self._hisData.get(self.getSymbolByReqId(reqId), None))
+        symbol = self.getSymbolByReqId(reqId)
+        rows = self._hisRows.pop(symbol, None)
+        if rows:
+            data = DataFrame(rows)
+            df = self._hisData.get(symbol, None)
+            if df is not None:
+                data = pandas.concat([df, data], ignore_index=True)
+            self._hisData[symbol] = data
+
+        self._processData(EVENT_HISDATA, self._hisData.get(symbol, None))
 
         return super().historicalDataEnd(reqId, start, end)
 
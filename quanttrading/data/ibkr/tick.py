@@ -0,0 +1,292 @@
+"""
+Market data buffers of IbApi.
+
+Field updates of tickPrice/tickSize are written into a flat list per
+reqId instead of a shared TickData. A new TickData is only built when a
+snapshot is published, from a prepared dict of the static fields, so no
+copy() of the shared object is needed and published ticks are never
+modified afterwards.
+
+With a coalescing window, updates of one reqId within the window are
+merged and published once at the end of the window.
+"""
+
+from datetime import datetime
+from threading import Lock, Thread
+from time import monotonic, sleep
+from typing import Callable, Dict, Optional, Set
+
+from constant import Exchange
+from datatypes import TickData
+
+
+# Fields of TickData updated by tickPrice/tickSize.
+TICK_VALUE_FIELDS: tuple = (
+    "bid_volume_1",
+    "bid_price_1",
+    "ask_price_1",
+    "ask_volume_1",
+    "last_price",
+    "last_volume",
+    "high_price",
+    "low_price",
+    "volume",
+    "pre_close",
+    "open_price",
+    "open_interest",
+)
+
+TICK_VALUE_INDEX: Dict[str, int] = {name: i for i, name in enumerate(TICK_VALUE_FIELDS)}
+
+BID_PRICE_INDEX: int = TICK_VALUE_INDEX["bid_price_1"]
+ASK_PRICE_INDEX: int = TICK_VALUE_INDEX["ask_price_1"]
+LAST_PRICE_INDEX: int = TICK_VALUE_INDEX["last_price"]
+
+
+def create_tick_base(tick: TickData) -> dict:
+    """
+    Attribute dict of a TickData, used as template of snapshots.
+    """
+    base: dict = dict(tick.__dict__)
+    base["extra"] = None
+    return base
+
+
+def create_tick(base: dict, values: Optional[dict] = None) -> TickData:
+    """
+    Build a TickData from a template dict without calling __init__.
+    """
+    tick: TickData = TickData.__new__(TickData)
+    tick.__dict__ = {**base, **values} if values else dict(base)
+    return tick
+
+
+class TickBuffer:
+    """
+    Latest market data of one reqMktData subscription.
+    """
+
+    __slots__ = (
+        "symbol",
+        "exchange",
+        "vt_symbol",
+        "name",
+        "datetime",
+        "values",
+        "extra",
+        "base",
+        "mid_price",
+        "last_time",
+        "last_price",
+        "last_volume",
+        "last_exchange",
+        "last_bases",
+        "publish_time",
+        "last_publish_time",
+    )
+
+    def __init__(self, symbol: str, exchange: Exchange, gateway_name: str, dt: datetime) -> None:
+        """"""
+        self.symbol: str = symbol
+        self.exchange: Exchange = exchange
+        self.vt_symbol: str = f"{symbol}.{exchange.value}"
+        self.name: str = ""
+        self.datetime: datetime = dt
+        self.values: list = [0.0] * len(TICK_VALUE_FIELDS)
+        self.extra: dict = {}
+
+        self.base: dict = create_tick_base(
+            TickData(gateway_name=gateway_name, symbol=symbol, exchange=exchange, datetime=dt)
+        )
+
+        # Forex of IDEALPRO and spot commodity use mid price as last price
+        self.mid_price: bool = exchange == Exchange.IDEALPRO or "CMDTY" in symbol
+
+        # Tick-by-tick prints merged within the window
+        self.last_time: Optional[datetime] = None
+        self.last_price: float = 0
+        self.last_volume: float = 0
+        self.last_exchange: Exchange = exchange
+        self.last_bases: Dict[Exchange, dict] = {}
+
+        self.publish_time: float = 0
+        self.last_publish_time: float = 0
+
+    def snapshot(self) -> TickData:
+        """
+        Build a new TickData of the latest values.
+        """
+        tick: TickData = create_tick(self.base, dict(zip(TICK_VALUE_FIELDS, self.values)))
+        tick.datetime = self.datetime
+        tick.name = self.name
+        # Own copy, the buffer keeps updating extra (option greeks)
+        tick.extra = dict(self.extra) if self.extra else {}
+        return tick
+
+    def add_last(self, dt: datetime, price: float, volume: float, exchange: Exchange) -> None:
+        """
+        Merge a tick-by-tick print, volume is accumulated until published.
+        """
+        self.last_time = dt
+        self.last_price = price
+        self.last_volume += volume
+        self.last_exchange = exchange
+
+    def pop_last(self, name: str) -> Optional[TickData]:
+        """
+        Build the TickData of the merged prints and reset them.
+        """
+        if self.last_time is None:
+            return None
+
+        base: Optional[dict] = self.last_bases.get(self.last_exchange, None)
+        if base is None:
+            base = dict(self.base)
+            base["exchange"] = self.last_exchange
+            base["vt_symbol"] = f"{self.symbol}.{self.last_exchange.value}"
+            base["name"] = name
+            self.last_bases[self.last_exchange] = base
+
+        tick: TickData = create_tick(base, {
+            "datetime": self.last_time,
+            "last_price": self.last_price,
+            "last_volume": self.last_volume
+        })
+
+        self.last_time = None
+        self.last_volume = 0
+        return tick
+
+
+class TickCoalescer:
+    """
+    Publish ticks of a reqId at most once per window.
+
+    The first change after a quiet window is published at once, changes
+    arriving within the window are marked pending and flushed by a
+    background thread at the end of the window.
+    """
+
+    def __init__(
+        self,
+        window: float,
+        get_buffer: Callable[[int], Optional[TickBuffer]],
+        on_tick: Callable[[TickData], None],
+        on_tick_last: Callable[[TickData], None],
+        last_name: str
+    ) -> None:
+        """"""
+        self.window: float = window
+        self.get_buffer: Callable = get_buffer
+        self.on_tick: Callable = on_tick
+        self.on_tick_last: Callable = on_tick_last
+        self.last_name: str = last_name
+
+        self.lock: Lock = Lock()
+        self.pending_ticks: Set[int] = set()
+        self.pending_lasts: Set[int] = set()
+
+        self.active: bool = False
+        self.thread: Optional[Thread] = None
+
+    def start(self) -> None:
+        """"""
+        if self.active or self.window <= 0:
+            return
+
+        self.active = True
+        self.thread = Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        """"""
+        self.active = False
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+
+        self.flush()
+
+    def run(self) -> None:
+        """"""
+        while self.active:
+            sleep(self.window)
+            self.flush()
+
+    def publish_tick(self, reqid: int, buffer: TickBuffer) -> None:
+        """"""
+        if not self.active:
+            self.on_tick(buffer.snapshot())
+            return
+
+        now: float = monotonic()
+        with self.lock:
+            if now - buffer.publish_time < self.window:
+                self.pending_ticks.add(reqid)
+                return
+            buffer.publish_time = now
+
+        self.on_tick(buffer.snapshot())
+
+    def publish_last(
+        self,
+        reqid: int,
+        buffer: TickBuffer,
+        dt: datetime,
+        price: float,
+        volume: float,
+        exchange: Exchange
+    ) -> None:
+        """"""
+        if not self.active:
+            buffer.add_last(dt, price, volume, exchange)
+            tick: Optional[TickData] = buffer.pop_last(self.last_name)
+            if tick:
+                self.on_tick_last(tick)
+            return
+
+        now: float = monotonic()
+        with self.lock:
+            buffer.add_last(dt, price, volume, exchange)
+            if now - buffer.last_publish_time < self.window:
+                self.pending_lasts.add(reqid)
+                return
+            buffer.last_publish_time = now
+            tick = buffer.pop_last(self.last_name)
+
+        if tick:
+            self.on_tick_last(tick)
+
+    def flush(self) -> None:
+        """
+        Publish all pending ticks.
+        """
+        now: float = monotonic()
+
+        with self.lock:
+            pending_ticks: Set[int] = self.pending_ticks
+            pending_lasts: Set[int] = self.pending_lasts
+            self.pending_ticks = set()
+            self.pending_lasts = set()
+
+            ticks: list = []
+            for reqid in pending_ticks:
+                buffer: Optional[TickBuffer] = self.get_buffer(reqid)
+                if buffer:
+                    buffer.publish_time = now
+                    ticks.append(buffer.snapshot())
+
+            lasts: list = []
+            for reqid in pending_lasts:
+                buffer = self.get_buffer(reqid)
+                if buffer:
+                    buffer.last_publish_time = now
+                    tick: Optional[TickData] = buffer.pop_last(self.last_name)
+                    if tick:
+                        lasts.append(tick)
+
+        for tick in ticks:
+            self.on_tick(tick)
+
+        for tick in lasts:
+            self.on_tick_last(tick)
@@ -1,10 +1,12 @@
 from abc import ABC, abstractmethod
-from datetime import datetime
+from datetime import datetime, tzinfo
 from types import ModuleType
 from typing import List
 from dataclasses import dataclass
 from importlib import import_module
 
+import numpy as np
+
 from constant import Interval, Exchange, _
 from datatypes import BarData, TickData
 from setting import SETTINGS
@@ -22,6 +24,147 @@ def convert_tz(dt: datetime) -> datetime:
     return dt.replace(tzinfo=None)
 
 
+# Float fields of TickData held in a tick array.
+TICK_ARRAY_FIELDS: tuple = (
+    "volume",
+    "turnover",
+    "open_interest",
+    "last_price",
+    "last_volume",
+    "limit_up",
+    "limit_down",
+    "open_price",
+    "high_price",
+    "low_price",
+    "pre_close",
+    "bid_price_1",
+    "bid_price_2",
+    "bid_price_3",
+    "bid_price_4",
+    "bid_price_5",
+    "ask_price_1",
+    "ask_price_2",
+    "ask_price_3",
+    "ask_price_4",
+    "ask_price_5",
+    "bid_volume_1",
+    "bid_volume_2",
+    "bid_volume_3",
+    "bid_volume_4",
+    "bid_volume_5",
+    "ask_volume_1",
+    "ask_volume_2",
+    "ask_volume_3",
+    "ask_volume_4",
+    "ask_volume_5",
+)
+
+# Structured numpy dtype of tick arrays. datetime is the DB_TZ wall clock.
+TICK_DTYPE: np.dtype = np.dtype(
+    [("datetime", "datetime64[us]")] + [(name, np.float64) for name in TICK_ARRAY_FIELDS]
+)
+
+
+def ticks_to_array(ticks: List[TickData]) -> np.ndarray:
+    """
+    Convert TickData list into a tick array of TICK_DTYPE.
+    """
+    array: np.ndarray = np.empty(len(ticks), dtype=TICK_DTYPE)
+    if not ticks:
+        return array
+
+    array["datetime"] = [convert_tz(tick.datetime) for tick in ticks]
+    for name in TICK_ARRAY_FIELDS:
+        array[name] = [getattr(tick, name) or 0 for tick in ticks]
+    return array
+
+
+def array_to_ticks(
+    array: np.ndarray,
+    symbol: str,
+    exchange: Exchange,
+    gateway_name: str = "DB"
+) -> List[TickData]:
+    """
+    Build TickData objects from a tick array, only when they are needed.
+    """
+    columns: list = [array[name].tolist() for name in TICK_ARRAY_FIELDS]
+    dts: list = array["datetime"].tolist()
+
+    ticks: List[TickData] = []
+    for i, dt in enumerate(dts):
+        tick: TickData = TickData(
+            symbol=symbol,
+            exchange=exchange,
+            datetime=dt.replace(tzinfo=DB_TZ),
+            gateway_name=gateway_name
+        )
+        for name, column in zip(TICK_ARRAY_FIELDS, columns):
+            setattr(tick, name, column[i])
+        ticks.append(tick)
+    return ticks
+
+
+# Float fields of BarData held in a bar array.
+BAR_ARRAY_FIELDS: tuple = (
+    "open_price",
+    "high_price",
+    "low_price",
+    "close_price",
+    "volume",
+    "turnover",
+    "open_interest",
+)
+
+# Structured numpy dtype of bar arrays. datetime is the DB_TZ wall clock.
+BAR_DTYPE: np.dtype = np.dtype(
+    [("datetime", "datetime64[us]")] + [(name, np.float64) for name in BAR_ARRAY_FIELDS]
+)
+
+
+def bars_to_array(bars: List[BarData], tz: tzinfo = DB_TZ) -> np.ndarray:
+    """
+    Convert BarData list into a bar array of BAR_DTYPE.
+    """
+    array: np.ndarray = np.empty(len(bars), dtype=BAR_DTYPE)
+    if not bars:
+        return array
+
+    array["datetime"] = [bar.datetime.astimezone(tz).replace(tzinfo=None) for bar in bars]
+    for name in BAR_ARRAY_FIELDS:
+        array[name] = [getattr(bar, name) or 0 for bar in bars]
+    return array
+
+
+def array_to_bars(
+    array: np.ndarray,
+    symbol: str,
+    exchange: Exchange,
+    interval: Interval,
+    gateway_name: str = "DB",
+    tz: tzinfo = DB_TZ
+) -> List[BarData]:
+    """
+    Build BarData objects from a bar array.
+    """
+    columns: list = [array[name].tolist() for name in BAR_ARRAY_FIELDS]
+    dts: list = array["datetime"].tolist()
+
+    bars: List[BarData] = []
+    for i, dt in enumerate(dts):
+        bar: BarData = BarData(
+            symbol=symbol,
+            exchange=exchange,
+            datetime=dt.replace(tzinfo=tz),
+            interval=interval,
+            gateway_name=gateway_name
+        )
+        for name, column in zip(BAR_ARRAY_FIELDS, columns):
+            setattr(bar, name, column[i])
+        bars.append(bar)
+    return bars
+
+
 @dataclass
 class BarOverview:
     """
@@ -69,6 +212,21 @@ class BaseDatabase(ABC):
         pass
 
 
+    def save_tick_data_bulk(self, ticks: List[TickData]) -> int:
+        """
+        Save ticks of any number of symbols in one go, for high rate
+        ingestion (data recorder). Ticks already in database are kept.
+        Overview is updated incrementally. Return number of new ticks.
+        Database could override it with a faster bulk insert.
+        """
+        groups: dict = {}
+        for tick in ticks:
+            groups.setdefault((tick.symbol, tick.exchange), []).append(tick)
+
+        for group in groups.values():
+            self.save_tick_data(group, stream=True)
+        return len(ticks)
+
     def save_one_tick_data(self, ticks: List[TickData], stream: bool = False) -> bool:
         """save one TICK data, only last price and last volume"""
         pass
@@ -117,6 +275,26 @@ class BaseDatabase(ABC):
         """
         pass
 
+    def load_tick_array(
+        self,
+        symbol: str,
+        exchange: Exchange,
+        start: datetime = None,
+        end: datetime = None
+    ) -> np.ndarray:
+        """
+        Load tick data as a numpy structured array of TICK_DTYPE.
+        All ticks of the symbol when start and end are not given.
+        Database could override it with a faster bulk query.
+        """
+        if start is None:
+            start = datetime(1970, 1, 2)
+        if end is None:
+            end = datetime(2200, 1, 1)
+
+        ticks: List[TickData] = self.load_tick_data(symbol, exchange, start, end)
+        return ticks_to_array(ticks)
+
     def load_tick_data_byHours(
         self,
         symbol: str,
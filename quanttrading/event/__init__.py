@@ -1 +1,2 @@
-from .engine import Event, EventEngine, EVENT_TIMER
+from .engine import Event, EventEngine, EventLane, EVENT_TIMER, EVENT_STATS, MAIN_LANE, UI_LANE, LOG_LANE
+from .stats import EventStats, LatencyHistogram
@@ -3,15 +3,26 @@ Event-driven framework.
 """
 
 from collections import defaultdict
-from queue import Empty, Queue
-from threading import Thread
+from queue import Empty, SimpleQueue
+from threading import Lock, Thread
 import logging
-from time import sleep
-from typing import Any, Callable, List
+from time import perf_counter, sleep
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from constant import EVENT_TICK
+
+from .stats import EventStats
 
 EVENT_TIMER = "eTimer"
+# Periodic snapshot of EventEngine statistics, data is a dict.
+EVENT_STATS = "eEventStats"
 logger = logging.getLogger(__name__)
 
+# Dispatch lanes, each one is served by its own thread.
+MAIN_LANE = ""
+UI_LANE = "ui"
+LOG_LANE = "log"
+
 class Event:
     """
     Event object consists of a type string which is used
@@ -24,6 +35,9 @@ class Event:
         self.type: str = type
         self.data: Any = data
 
+        # Set by EventEngine.put when statistics are enabled.
+        self.put_time: float = 0
+
 
 # Defines handler function to be used in event engine.
 # signifies a function that takes a single parameter of 
@@ -33,45 +47,79 @@ class Event:
 HandlerType: callable = Callable[[Event], None]
 
 
-class EventEngine:
+class EventLane:
     """
-    Event engine distributes event object based on its type
-    to those handlers registered.
+    Queue and dispatch thread of a group of handlers.
 
-    It also generates timer event by every interval seconds,
-    which can be used for timing purpose.
+    Events are drained from the queue in batches. When coalesce is
+    enabled, tick events of the same type and vt_symbol still waiting
+    in the queue are replaced by the latest one (latest wins), so a
+    burst of ticks does not delay the other events behind it.
     """
 
-    def __init__(self, interval: int = 1) -> None:
-        """
-        Timer event is generated every 1 second by default, if
-        interval not specified.
-        could be optimized to async instead of seperate thread.
-        """
-        self._interval: int = interval
-        self._queue: Queue = Queue()
+    def __init__(self, name: str, coalesce: bool = True, batch_size: int = 256) -> None:
+        """"""
+        self.name: str = name
+        self.coalesce: bool = coalesce
+        self.batch_size: int = batch_size
+
+        self._queue: SimpleQueue = SimpleQueue()
         self._active: bool = False
-        self._thread: Thread = Thread(target=self._run)
-        self._timer: Thread = Thread(target=self._run_timer)
+        self._thread: Thread = Thread(target=self._run, name=f"EventLane-{name or 'main'}")
         self._handlers: defaultdict = defaultdict(list)
         self._general_handlers: List = []
 
+        # Latest tick event waiting in the queue, by (type, vt_symbol).
+        self._latest: Dict[Tuple[str, str], Event] = {}
+        self._lock: Lock = Lock()
+
+        self.stats: Optional[EventStats] = None
+
+    def accepts(self, type: str) -> bool:
+        """
+        Whether any handler of this lane listens to the event type.
+        """
+        return type in self._handlers or bool(self._general_handlers)
+
+    def put(self, event: Event) -> None:
+        """"""
+        if self.coalesce and event.type.startswith(EVENT_TICK):
+            key: Tuple[str, str] = (event.type, event.data.vt_symbol)
+            with self._lock:
+                waiting: bool = key in self._latest
+                self._latest[key] = event
+
+            # Only one entry per key is kept in the queue.
+            if not waiting:
+                self._queue.put(key)
+        else:
+            self._queue.put(event)
+
     def _run(self) -> None:
         """
-        Get event from queue and then process it.
+        Get events from queue in batches and then process them.
         """
-        logger.info(f"engine _run ...self.active{self._active=} {'££££££' * 10} ")
         while self._active:
             try:
-                logger.debug(f"enter get_queue ... {'££££££' * 10} ")
-                event: Event = self._queue.get(block=True, timeout=1)
-                logger.debug(f"event is {event} _run ... {'££££££' * 10} ")
+                batch: list = [self._queue.get(block=True, timeout=1)]
+            except Empty:
+                continue
 
-                self._process(event)
+            try:
+                while len(batch) < self.batch_size:
+                    batch.append(self._queue.get_nowait())
             except Empty:
-                logger.debug(f"event is empty _run ... {'££££££' * 20} ")
                 pass
 
+            if self.stats:
+                self.stats.add_batch(len(batch))
+
+            for item in batch:
+                if isinstance(item, tuple):
+                    with self._lock:
+                        item = self._latest.pop(item)
+                self._process(item)
+
     def _process(self, event: Event) -> None:
         """
         First distribute event to those handlers registered listening
@@ -80,16 +128,85 @@ class EventEngine:
         Then distribute event to those general handlers which listens
         to all types.
         """
-        logger.debug(f"EventEngine._process:: {'******' * 5} ")
-        logger.debug(f"_handlers are {self._handlers} and {event.type=}")
-        if event.type in self._handlers:
-            [handler(event) for handler in self._handlers[event.type]]
-        
-        if self._general_handlers:
-            [handler(event) for handler in self._general_handlers]
-        
-        # Indicate that a formerly enqueued task is complete.
-        self._queue.task_done()
+        handlers: list = self._handlers.get(event.type, None)
+
+        if self.stats:
+            self._process_stats(event, handlers)
+            return
+
+        if handlers:
+            for handler in handlers:
+                handler(event)
+
+        for handler in self._general_handlers:
+            handler(event)
+
+    def _process_stats(self, event: Event, handlers: Optional[list]) -> None:
+        """
+        Process event and record latency and handler time.
+        """
+        stats: EventStats = self.stats
+        start: float = perf_counter()
+        if event.put_time:
+            stats.add_event(event.type, start - event.put_time)
+
+        for handler in (handlers or []) + self._general_handlers:
+            handler(event)
+            end: float = perf_counter()
+            stats.add_handler(handler, end - start)
+            start = end
+
+    def queue_size(self) -> int:
+        """"""
+        return self._queue.qsize()
+
+    def start(self) -> None:
+        """"""
+        self._active = True
+        self._thread.start()
+
+    def stop(self) -> None:
+        """"""
+        self._active = False
+        if self._thread.is_alive():
+            self._thread.join()
+
+
+class EventEngine:
+    """
+    Event engine distributes event object based on its type
+    to those handlers registered.
+
+    Handlers are registered on a dispatch lane (main lane by default).
+    Every lane has its own queue and thread, so slow consumers such as
+    UI, data recorder or logs can be put on separate lanes and will not
+    delay order and trade events of the main lane. Events are processed
+    in order within a lane, but not across lanes.
+
+    It also generates timer event by every interval seconds,
+    which can be used for timing purpose.
+    """
+
+    def __init__(self, interval: int = 1) -> None:
+        """
+        Timer event is generated every 1 second by default, if
+        interval not specified.
+        could be optimized to async instead of seperate thread.
+        """
+        self._interval: int = interval
+        self._active: bool = False
+        self._timer: Thread = Thread(target=self._run_timer)
+
+        self._lanes: Dict[str, EventLane] = {}
+        # Snapshot of lanes iterated by put, replaced when a lane is added.
+        self._lane_list: Tuple[EventLane, ...] = ()
+        self._lanes_lock: Lock = Lock()
+
+        # Timer count between two EVENT_STATS, 0 when stats disabled.
+        self._stats_interval: int = 0
+        self._stats_count: int = 0
+
+        self.add_lane(MAIN_LANE)
 
     def _run_timer(self) -> None:
         """
@@ -100,13 +217,20 @@ class EventEngine:
             event: Event = Event(EVENT_TIMER)
             self.put(event)
 
+            if self._stats_interval:
+                self._stats_count += 1
+                if self._stats_count >= self._stats_interval:
+                    self._stats_count = 0
+                    self.put(Event(EVENT_STATS, self.get_stats()))
+
     def start(self) -> None:
         """
         Start event engine to process events and generate timer events.
         """
-        logger.info(f"engine started ... {"******" * 20} ")
+        logger.info("engine started")
         self._active = True
-        self._thread.start()
+        for lane in self._lane_list:
+            lane.start()
         self._timer.start()
 
     def stop(self) -> None:
@@ -115,50 +239,111 @@ class EventEngine:
         """
         self._active = False
         self._timer.join()
-        self._thread.join()
+        for lane in self._lane_list:
+            lane.stop()
 
     def put(self, event: Event) -> None:
         """
-        Put an event object into event queue.
+        Put an event object into the queue of every lane listening to it.
+        """
+        if self._stats_interval:
+            event.put_time = perf_counter()
+
+        for lane in self._lane_list:
+            if lane.accepts(event.type):
+                lane.put(event)
+
+    def add_lane(self, name: str, coalesce: bool = True, batch_size: int = 256) -> EventLane:
+        """
+        Add a dispatch lane, or return the existing one with the name.
+        Lanes handling every tick (e.g. recording) should disable coalesce.
         """
-        self._queue.put(event)
+        with self._lanes_lock:
+            lane: EventLane = self._lanes.get(name, None)
+            if lane:
+                return lane
 
-    def register(self, type: str, handler: Callable) -> None:
+            lane = EventLane(name, coalesce, batch_size)
+            if self._stats_interval:
+                lane.stats = EventStats()
+            self._lanes[name] = lane
+            self._lane_list = tuple(self._lanes.values())
+
+        if self._active:
+            lane.start()
+        return lane
+
+    def enable_stats(self, interval: int = 60) -> None:
+        """
+        Start recording statistics of every lane, and put an EVENT_STATS
+        snapshot every interval timer events.
+        """
+        for lane in self._lane_list:
+            if not lane.stats:
+                lane.stats = EventStats()
+        self._stats_count = 0
+        self._stats_interval = max(interval, 1)
+
+    def disable_stats(self) -> None:
+        """"""
+        self._stats_interval = 0
+        for lane in self._lane_list:
+            lane.stats = None
+
+    def get_stats(self) -> Dict[str, dict]:
+        """
+        Snapshot of statistics by lane name: queue size, largest batch,
+        and per event type rate/latency and per handler time.
+        Durations are in milliseconds.
+        """
+        result: Dict[str, dict] = {}
+        for lane in self._lane_list:
+            stats: Optional[EventStats] = lane.stats
+            data: dict = stats.snapshot() if stats else {}
+            data["queue_size"] = lane.queue_size()
+            result[lane.name or "main"] = data
+        return result
+
+    def register(self, type: str, handler: Callable, lane: str = MAIN_LANE) -> None:
         """
         Register a new handler function for a specific event type. Every
         function can only be registered once for each event type.
         """
-        logger.info(f"registering now ...........................")
-        logger.info(f"{handler=}")
-        handler_list: list = self._handlers[type]
+        handler_list: list = self.add_lane(lane)._handlers[type]
         if handler not in handler_list:
             handler_list.append(handler)
 
-    def unregister(self, type: str, handler: Callable) -> None:
+    def unregister(self, type: str, handler: Callable, lane: str = MAIN_LANE) -> None:
         """
         Unregister an existing handler function from event engine.
         """
-        handler_list: list = self._handlers[type]
+        event_lane: EventLane = self._lanes.get(lane, None)
+        if not event_lane:
+            return
+
+        handler_list: list = event_lane._handlers[type]
 
         if handler in handler_list:
             handler_list.remove(handler)
 
         if not handler_list:
-            self._handlers.pop(type)
+            event_lane._handlers.pop(type)
 
-    def register_general(self, handler: Callable) -> None:
+    def register_general(self, handler: Callable, lane: str = MAIN_LANE) -> None:
         """
         Register a new handler function for all event types.
         only one general handler is required to handle all 
         unhandled data in the queue.
         so the queue will not be blocked. 
         """
-        if handler not in self._general_handlers:
-            self._general_handlers.append(handler)
+        general_handlers: list = self.add_lane(lane)._general_handlers
+        if handler not in general_handlers:
+            general_handlers.append(handler)
 
-    def unregister_general(self, handler: Callable) -> None:
+    def unregister_general(self, handler: Callable, lane: str = MAIN_LANE) -> None:
         """
         Unregister an existing general handler function.
         """
-        if handler in self._general_handlers:
-            self._general_handlers.remove(handler)
+        event_lane: EventLane = self._lanes.get(lane, None)
+        if event_lane and handler in event_lane._general_handlers:
+            event_lane._general_handlers.remove(handler)
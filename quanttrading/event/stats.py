@@ -0,0 +1,138 @@
+"""
+Runtime statistics of the event engine.
+"""
+
+from collections import defaultdict
+from time import perf_counter
+from typing import Callable, Dict, List
+
+
+class LatencyHistogram:
+    """
+    Histogram of durations with log2 buckets in microseconds:
+    bucket i counts values in [2 ** (i - 1), 2 ** i) us, bucket 0 counts
+    values below 1us.
+    """
+
+    size: int = 32
+
+    def __init__(self) -> None:
+        """"""
+        self.buckets: List[int] = [0] * self.size
+        self.count: int = 0
+        self.total: float = 0
+        self.max: float = 0
+
+    def add(self, seconds: float) -> None:
+        """"""
+        self.buckets[min(int(seconds * 1_000_000).bit_length(), self.size - 1)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, q: float) -> float:
+        """
+        Upper bound (seconds) of the bucket holding the q-th percentile.
+        """
+        if not self.count:
+            return 0
+
+        target: float = self.count * q / 100
+        cumulative: int = 0
+        for i, n in enumerate(self.buckets):
+            cumulative += n
+            if cumulative >= target:
+                return min((1 << i) / 1_000_000, self.max)
+        return self.max
+
+    def summary(self) -> dict:
+        """
+        Count and durations in milliseconds.
+        """
+        return {
+            "count": self.count,
+            "mean": self.total / self.count * 1000 if self.count else 0,
+            "p50": self.percentile(50) * 1000,
+            "p99": self.percentile(99) * 1000,
+            "max": self.max * 1000,
+        }
+
+
+def get_handler_name(handler: Callable) -> str:
+    """"""
+    name: str = getattr(handler, "__qualname__", "")
+    if not name:
+        return repr(handler)
+
+    module: str = getattr(handler, "__module__", "")
+    return f"{module}.{name}" if module else name
+
+
+class EventStats:
+    """
+    Counters of one dispatch lane, updated by the lane thread only.
+
+    Records per event type the count and enqueue-to-dispatch latency,
+    and per handler the count and wall time of every call.
+    """
+
+    def __init__(self) -> None:
+        """"""
+        self.event_counts: Dict[str, int] = defaultdict(int)
+        self.latencies: Dict[str, LatencyHistogram] = defaultdict(LatencyHistogram)
+        self.handler_times: Dict[Callable, LatencyHistogram] = defaultdict(LatencyHistogram)
+        self.max_batch: int = 0
+
+        # Counts of the last snapshot, used to calculate rates.
+        self.last_time: float = perf_counter()
+        self.last_counts: Dict[str, int] = {}
+
+    def add_event(self, type: str, latency: float) -> None:
+        """"""
+        self.event_counts[type] += 1
+        self.latencies[type].add(latency)
+
+    def add_handler(self, handler: Callable, cost: float) -> None:
+        """"""
+        self.handler_times[handler].add(cost)
+
+    def add_batch(self, size: int) -> None:
+        """"""
+        if size > self.max_batch:
+            self.max_batch = size
+
+    def snapshot(self) -> dict:
+        """
+        Snapshot of the counters, rate is events per second since the
+        last snapshot.
+        """
+        now: float = perf_counter()
+        elapsed: float = max(now - self.last_time, 1e-9)
+
+        counts: Dict[str, int] = dict(self.event_counts)
+        latencies: Dict[str, LatencyHistogram] = dict(self.latencies)
+        handler_times: Dict[Callable, LatencyHistogram] = dict(self.handler_times)
+
+        events: dict = {}
+        for type, count in counts.items():
+            events[type] = {
+                "rate": (count - self.last_counts.get(type, 0)) / elapsed,
+                "latency": latencies.get(type, LatencyHistogram()).summary()
+            }
+
+        handlers: dict = {}
+        for handler, histogram in handler_times.items():
+            name: str = get_handler_name(handler)
+            if name in handlers:
+                name = f"{name}#{id(handler):x}"
+            handlers[name] = histogram.summary()
+
+        self.last_time = now
+        self.last_counts = counts
+
+        return {
+            "max_batch": self.max_batch,
+            "events": events,
+            "handlers": handlers
+        }
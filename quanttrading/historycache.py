@@ -0,0 +1,425 @@
+"""
+Disk cache of history data loaded from the database for backtesting.
+
+Bars and ticks are saved column-wise as one .npy file of BAR_DTYPE or
+TICK_DTYPE per symbol (and interval) and period: a day for ticks and
+minute bars, a month for hour bars and a year for daily and weekly bars,
+so that coarse data is not spread over thousands of tiny files. A query
+of any range is served from the partitions of its periods, so
+overlapping windows reuse the same files and only the periods not cached
+yet are loaded from the database. Files are memory-mapped when read.
+
+Cached days are only valid as long as the data in the database does not
+change. The overview start/end of the database is saved with the
+partitions, and partitions from the previous end are dropped when the
+end changes (all of them when the start changes).
+
+The total size of the cache is kept within a budget by removing the
+least recently used partitions. The size is counted once by scanning
+the folder and then kept up to date as partitions are written.
+"""
+import json
+import os
+from datetime import date, datetime, timedelta, tzinfo
+from pathlib import Path
+from threading import Lock
+from time import monotonic
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from constant import Exchange, Interval
+from database import (
+    BAR_DTYPE,
+    DB_TZ,
+    TICK_DTYPE,
+    BaseDatabase,
+    array_to_bars,
+    array_to_ticks,
+    bars_to_array,
+    get_database
+)
+from datatypes import BarData, TickData
+from setting import SETTINGS
+from utility import get_folder_path
+
+
+HISTORY_CACHE_FOLDER: str = "history_cache"
+OVERVIEW_FILENAME: str = "overview.json"
+
+# Seconds to reuse the database overview before querying it again.
+OVERVIEW_TTL: int = 60
+
+# Remove partitions down to this share of the budget when it is exceeded.
+EVICT_RATIO: float = 0.8
+
+# Partition period of bar intervals (by value), day for the others.
+PARTITION_PERIODS: Dict[str, str] = {
+    Interval.HOUR.value: "month",
+    Interval.DAILY.value: "year",
+    Interval.WEEKLY.value: "year",
+}
+
+# File name format of partitions of every period.
+PARTITION_FORMATS: Dict[str, str] = {
+    "day": "%Y%m%d",
+    "month": "%Y%m",
+    "year": "%Y",
+}
+
+
+class HistoryCache:
+    """
+    Partitioned disk cache in front of a database.
+    """
+
+    def __init__(
+        self,
+        database: BaseDatabase = None,
+        folder: Path = None,
+        size: int = None,
+        tz: tzinfo = DB_TZ
+    ) -> None:
+        """
+        size: budget of the cache in MB, 0 to disable the cache.
+        """
+        self.database: BaseDatabase = database
+        self.folder: Path = folder or get_folder_path(HISTORY_CACHE_FOLDER)
+        if size is None:
+            size = SETTINGS.get("history_cache.size", 2048)
+        self.size: int = int(size) * 1024 * 1024
+        self.tz: tzinfo = tz
+
+        self.lock: Lock = Lock()
+        self.bar_overviews: Dict[tuple, tuple] = {}
+        self.tick_overviews: Dict[tuple, tuple] = {}
+        self.overview_time: float = 0
+
+        # Bytes of partitions saved, None until the folder is scanned
+        self.used: Optional[int] = None
+
+    def get_database(self) -> BaseDatabase:
+        """"""
+        if not self.database:
+            self.database = get_database()
+        return self.database
+
+    def load_bar_array(
+        self,
+        symbol: str,
+        exchange: Exchange,
+        interval: Interval,
+        start: datetime,
+        end: datetime
+    ) -> np.ndarray:
+        """
+        Load bars within [start, end] as an array of BAR_DTYPE.
+        """
+        def query(query_start: datetime, query_end: datetime) -> np.ndarray:
+            bars: List[BarData] = self.get_database().load_bar_data(
+                symbol, exchange, interval, query_start, query_end
+            )
+            return bars_to_array(bars, self.tz)
+
+        overview: Optional[tuple] = self.get_overview((symbol, exchange, interval))
+        folder: Path = self.folder.joinpath("bar", f"{symbol}.{exchange.value}.{interval.value}")
+        period: str = PARTITION_PERIODS.get(interval.value, "day")
+        return self.load_array(folder, overview, start, end, query, BAR_DTYPE, period)
+
+    def load_tick_array(
+        self,
+        symbol: str,
+        exchange: Exchange,
+        start: datetime,
+        end: datetime
+    ) -> np.ndarray:
+        """
+        Load ticks within [start, end] as an array of TICK_DTYPE.
+        """
+        def query(query_start: datetime, query_end: datetime) -> np.ndarray:
+            return self.get_database().load_tick_array(symbol, exchange, query_start, query_end)
+
+        overview: Optional[tuple] = self.get_overview((symbol, exchange))
+        folder: Path = self.folder.joinpath("tick", f"{symbol}.{exchange.value}")
+        return self.load_array(folder, overview, start, end, query, TICK_DTYPE, "day")
+
+    def load_bar_data(
+        self,
+        symbol: str,
+        exchange: Exchange,
+        interval: Interval,
+        start: datetime,
+        end: datetime
+    ) -> List[BarData]:
+        """"""
+        array: np.ndarray = self.load_bar_array(symbol, exchange, interval, start, end)
+        return array_to_bars(array, symbol, exchange, interval, tz=self.tz)
+
+    def load_tick_data(
+        self,
+        symbol: str,
+        exchange: Exchange,
+        start: datetime,
+        end: datetime
+    ) -> List[TickData]:
+        """"""
+        array: np.ndarray = self.load_tick_array(symbol, exchange, start, end)
+        return array_to_ticks(array, symbol, exchange)
+
+    def get_overview(self, key: tuple) -> Optional[tuple]:
+        """
+        (start, end) of the data in the database, None if no data.
+        """
+        with self.lock:
+            if monotonic() - self.overview_time > OVERVIEW_TTL:
+                database: BaseDatabase = self.get_database()
+
+                self.bar_overviews = {
+                    (o.symbol, o.exchange, o.interval): (o.start, o.end)
+                    for o in database.get_bar_overview()
+                }
+                self.tick_overviews = {
+                    (o.symbol, o.exchange): (o.start, o.end)
+                    for o in database.get_tick_overview()
+                }
+                self.overview_time = monotonic()
+
+            if len(key) == 3:
+                return self.bar_overviews.get(key, None)
+            return self.tick_overviews.get(key, None)
+
+    def load_array(
+        self,
+        folder: Path,
+        overview: Optional[tuple],
+        start: datetime,
+        end: datetime,
+        query: Callable[[datetime, datetime], np.ndarray],
+        dtype: np.dtype,
+        period: str = "day"
+    ) -> np.ndarray:
+        """
+        Load data of [start, end] from cached partitions, periods not
+        cached are queried in continuous ranges and saved.
+        """
+        start = self.convert_tz(start)
+        end = self.convert_tz(end)
+
+        # Data not in overview is not cached
+        if not self.size or not overview:
+            return query(start, end)
+
+        self.check_overview(folder, overview, period)
+
+        periods: List[date] = []
+        begin_date: date = get_period_start(start.date(), period)
+        while begin_date <= end.date():
+            periods.append(begin_date)
+            begin_date = get_next_period(begin_date, period)
+
+        parts: Dict[date, np.ndarray] = {}
+        missing: List[date] = []
+
+        for begin_date in periods:
+            part: Optional[np.ndarray] = self.read_partition(folder, begin_date, period)
+            if part is None:
+                missing.append(begin_date)
+            else:
+                parts[begin_date] = part
+
+        # Query missing periods in continuous ranges
+        ranges: List[List[date]] = []
+        for begin_date in missing:
+            if ranges and get_next_period(ranges[-1][-1], period) == begin_date:
+                ranges[-1].append(begin_date)
+            else:
+                ranges.append([begin_date])
+
+        for range_dates in ranges:
+            ends: List[date] = [get_next_period(d, period) for d in range_dates]
+
+            range_start: datetime = datetime.combine(range_dates[0], datetime.min.time())
+            range_end: datetime = datetime.combine(ends[-1], datetime.min.time())
+            array: np.ndarray = query(range_start, range_end - timedelta(microseconds=1))
+
+            period_ends: np.ndarray = np.searchsorted(
+                array["datetime"],
+                np.array(ends, dtype="datetime64[us]")
+            )
+            begin: int = 0
+            for begin_date, period_end in zip(range_dates, period_ends.tolist()):
+                parts[begin_date] = array[begin:period_end]
+                self.write_partition(folder, begin_date, period, parts[begin_date])
+                begin = period_end
+
+        if ranges:
+            self.evict()
+
+        if not periods:
+            return np.empty(0, dtype=dtype)
+
+        data: np.ndarray = np.concatenate([parts[d] for d in periods]).astype(dtype, copy=False)
+
+        dts: np.ndarray = data["datetime"]
+        begin = np.searchsorted(dts, np.datetime64(start, "us"), side="left")
+        finish: int = np.searchsorted(dts, np.datetime64(end, "us"), side="right")
+        return data[begin:finish]
+
+    def convert_tz(self, dt: datetime) -> datetime:
+        """
+        Wall clock of the database timezone.
+        """
+        return dt.astimezone(self.tz).replace(tzinfo=None)
+
+    def check_overview(self, folder: Path, overview: tuple, period: str) -> None:
+        """
+        Drop partitions no longer valid for the database overview.
+        """
+        start: str = str(overview[0])
+        end: str = str(overview[1])
+
+        path: Path = folder.joinpath(OVERVIEW_FILENAME)
+        try:
+            with open(path) as f:
+                saved: dict = json.load(f)
+        except (OSError, ValueError):
+            saved = {}
+
+        if saved.get("start") == start and saved.get("end") == end:
+            return
+
+        # Data appended after previous end, keep periods before it
+        saved_end: Optional[str] = saved.get("end", None)
+        if saved.get("start") == start and saved_end:
+            keep_before: str = datetime.fromisoformat(saved_end).strftime(PARTITION_FORMATS[period])
+        else:
+            keep_before = ""
+
+        if folder.exists():
+            for file in folder.glob("*.npy"):
+                if file.stem >= keep_before:
+                    self.remove_file(file)
+
+        folder.mkdir(parents=True, exist_ok=True)
+        self.write_file(path, json.dumps({"start": start, "end": end}).encode())
+
+    def get_partition_path(self, folder: Path, begin_date: date, period: str) -> Path:
+        """"""
+        return folder.joinpath(f"{begin_date.strftime(PARTITION_FORMATS[period])}.npy")
+
+    def read_partition(self, folder: Path, begin_date: date, period: str) -> Optional[np.ndarray]:
+        """"""
+        path: Path = self.get_partition_path(folder, begin_date, period)
+        try:
+            try:
+                part: np.ndarray = np.load(path, mmap_mode="r")
+            except ValueError:
+                # Periods without data can not be memory-mapped
+                part = np.load(path)
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+
+        return part
+
+    def write_partition(self, folder: Path, begin_date: date, period: str, part: np.ndarray) -> None:
+        """"""
+        path: Path = self.get_partition_path(folder, begin_date, period)
+        temp_path: Path = path.with_suffix(f".{os.getpid()}.tmp")
+
+        with open(temp_path, "wb") as f:
+            np.save(f, np.ascontiguousarray(part))
+
+        size: int = temp_path.stat().st_size
+        temp_path.replace(path)
+        self.add_used(size)
+
+    def write_file(self, path: Path, data: bytes) -> None:
+        """"""
+        temp_path: Path = path.with_suffix(f".{os.getpid()}.tmp")
+        temp_path.write_bytes(data)
+        temp_path.replace(path)
+
+    def remove_file(self, path: Path) -> None:
+        """"""
+        try:
+            size: int = path.stat().st_size
+            path.unlink()
+        except OSError:
+            return
+        self.add_used(-size)
+
+    def add_used(self, size: int) -> None:
+        """"""
+        with self.lock:
+            if self.used is not None:
+                self.used += size
+
+    def evict(self) -> None:
+        """
+        Remove least recently used partitions when over budget. The
+        folder is only scanned when the size counted is over budget (or
+        not counted yet).
+        """
+        with self.lock:
+            if self.used is not None and self.used <= self.size:
+                return
+
+            files: list = []
+            total: int = 0
+
+            for path in self.folder.glob("*/*/*.npy"):
+                try:
+                    stat: os.stat_result = path.stat()
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+
+            if total > self.size:
+                files.sort()
+                for _, size, path in files:
+                    path.unlink(missing_ok=True)
+                    total -= size
+                    if total <= self.size * EVICT_RATIO:
+                        break
+
+            self.used = total
+
+
+history_cache: HistoryCache = None
+history_cache_lock: Lock = Lock()
+
+
+def get_history_cache() -> HistoryCache:
+    """"""
+    global history_cache
+    if not history_cache:
+        with history_cache_lock:
+            if not history_cache:
+                history_cache = HistoryCache()
+    return history_cache
+
+
+def get_period_start(d: date, period: str) -> date:
+    """
+    First day of the partition period of a day.
+    """
+    if period == "year":
+        return d.replace(month=1, day=1)
+    if period == "month":
+        return d.replace(day=1)
+    return d
+
+
+def get_next_period(d: date, period: str) -> date:
+    """
+    First day of the next partition period.
+    """
+    if period == "year":
+        return date(d.year + 1, 1, 1)
+    if period == "month":
+        if d.month == 12:
+            return date(d.year + 1, 1, 1)
+        return date(d.year, d.month + 1, 1)
+    return d + timedelta(days=1)
@@ -44,14 +44,21 @@ algorithms (GA, GP, ES, PSO, DE, …)
 
 """
 
-from typing import Dict, List, Callable, Tuple
-from itertools import product
-from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Callable, Tuple, Iterator, Optional
+from itertools import product, islice, repeat
+from concurrent.futures import ProcessPoolExecutor, Future, wait, FIRST_COMPLETED
+from math import ceil, prod
+from pathlib import Path
+from heapq import heappush, heappushpop
+import os
+import pickle
+import sqlite3
+import hashlib
 from random import random, choice
 from time import perf_counter
 from multiprocessing import get_context
 from multiprocessing.context import BaseContext
-from _collections_abc import dict_keys, dict_values, Iterable
+from _collections_abc import Iterable
 
 from tqdm import tqdm
 from deap import creator, base, tools, algorithms
@@ -132,30 +139,29 @@ class OptimizationSetting:
         
     def generate_settings(self) -> List[dict]:
         """
-        generate settings by algorithm
+        generate all the settings as a list, the Cartesian product of
+        the values of every parameter. See iter_settings.
         """
-        keys: dict_keys = self.params.keys()
-        # values are list of list. each key mapped to a list of
-        # different values.
-        values: dict_values = self.params.values()
+        return list(self.iter_settings())
+
+    def iter_settings(self) -> Iterator[dict]:
         """
-        itertools.product(*iterables, repeat=1)
-        Cartesian product of input iterables. 
-        In mathematics, specifically set theory, the Cartesian product
-        of two sets A and B, denoted A × B, is the set of all ordered 
-        pairs (a, b) where a is in A and b is in B
-        Roughly equivalent to nested for-loops in a generator 
-        expression. For example, product(A, B) returns the same as 
-        ((x,y) for x in A for y in B).
+        generate settings lazily, one dict at a time. Used for big
+        grids which could not be held in memory as a list.
+        itertools.product is roughly equivalent to nested for-loops,
+        product(A, B) returns the same as ((x,y) for x in A for y in B).
         """
-        products: list = list(product(*values))
-
-        settings: list = []
-        for p in products:
-            setting: dict = dict(zip(keys, p))
-            settings.append(setting)
+        keys: list = list(self.params.keys())
+        for p in product(*self.params.values()):
+            yield dict(zip(keys, p))
 
-        return settings
+    def count_settings(self) -> int:
+        """
+        number of settings without generating them.
+        """
+        if not self.params:
+            return 0
+        return prod(len(values) for values in self.params.values())
 
 
 def check_optimization_setting(
@@ -163,7 +169,7 @@ def check_optimization_setting(
     output: OUTPUT_FUNC = print
 ) -> bool:
     """"""
-    if not optimization_setting.generate_settings():
+    if not optimization_setting.count_settings():
         output(_("优化参数组合为空，请检查"))
         return False
 
@@ -179,7 +185,10 @@ def run_bf_optimization(
     optimization_setting: OptimizationSetting,
     key_func: KEY_FUNC,
     max_workers: int = None,
-    output: OUTPUT_FUNC = print
+    output: OUTPUT_FUNC = print,
+    top_n: int = None,
+    checkpoint_path: str = None,
+    checkpoint_context: tuple = ()
 ) -> List[Tuple]:
     """
     Run brutal force optimization
@@ -187,15 +196,43 @@ def run_bf_optimization(
     asynchronously executing callables. The asynchronous execution can
       be performed with threads, using ThreadPoolExecutor, or separate
         processes, using ProcessPoolExecutor
-    return: (setting, target_value, statistics, settings)
+
+    settings are generated lazily and sent to the workers in chunks.
+    results are streamed back into a collector which keeps only the
+    best top_n results (all when top_n is None).
+    checkpoint_path: every finished result is appended to this file,
+    a sweep restarted with the same file skips settings already done.
+    checkpoint_context: strategy, symbol, backtest window ... of the
+    sweep, only results saved with the same context are resumed.
+    return: (setting, target_value, statistics)
     """
-    settings: List[Dict] = optimization_setting.generate_settings()
+    total_size: int = optimization_setting.count_settings()
 
     output(_("开始执行穷举算法优化"))
-    output(_("参数优化空间：{}").format(len(settings)))
+    output(_("参数优化空间：{}").format(total_size))
 
     start: int = perf_counter()
 
+    collector: ResultCollector = ResultCollector(key_func, top_n)
+
+    checkpoint: Optional[OptimizationCheckpoint] = None
+    done: set = set()
+    if checkpoint_path:
+        checkpoint = OptimizationCheckpoint(checkpoint_path, checkpoint_context)
+        for result in checkpoint.load():
+            done.add(get_setting_key(result[0]))
+            collector.add(result)
+        if done:
+            output(_("从断点恢复，已完成{}个参数组合").format(len(done)))
+
+    settings: Iterator[dict] = (
+        setting for setting in optimization_setting.iter_settings()
+        if get_setting_key(setting) not in done
+    )
+
+    workers: int = max_workers or os.cpu_count() or 1
+    chunksize: int = get_chunksize(total_size - len(done), workers)
+
     """
     executes calls asynchronously using a pool of at most max_workers
     processes. If max_workers is None or not given, it will default to
@@ -239,40 +276,250 @@ def run_bf_optimization(
         Available on POSIX platforms which support passing file 
         descriptors over Unix pipes such as Linux.
 
-    map(fn, *iterables, timeout=None, chunksize=1)
-    Similar to map(fn, *iterables) except:
-    the iterables are collected immediately rather than lazily;
-    fn is executed asynchronously and several calls to fn may be made
-      concurrently.
-
+    executor.map collects the iterables immediately rather than lazily,
+    so the chunks are submitted by hand, keeping only a few of them
+    pending per worker.
     """
+    try:
+        with ProcessPoolExecutor(
+            max_workers,
+            mp_context=get_context("spawn")
+        ) as executor:
+            """
+            Instantly make your loops show a progress meter - just wrap
+              any iterable with “tqdm(iterable)”, and you’re done!
+            """
+            progress: tqdm = tqdm(total=total_size, initial=len(done))
+
+            pending: set = set()
+            while True:
+                while len(pending) < workers * 2:
+                    chunk: list = list(islice(settings, chunksize))
+                    if not chunk:
+                        break
+                    pending.add(executor.submit(evaluate_chunk, evaluate_func, chunk))
+
+                if not pending:
+                    break
+
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    chunk_results: List[Tuple] = future.result()
+                    for result in chunk_results:
+                        if not result:
+                            continue
+                        collector.add(result)
+                        if checkpoint:
+                            checkpoint.save(result)
+                    progress.update(len(chunk_results))
+
+            progress.close()
+    finally:
+        if checkpoint:
+            checkpoint.close()
+
+    results: List[Tuple] = collector.get_results()
+
+    end: int = perf_counter()
+    cost: int = int((end - start))
+    output(_("穷举算法优化完成，耗时{}秒").format(cost))
+    return results
+
+
+def run_sh_optimization(
+    evaluate_func: EVALUATE_FUNC,
+    optimization_setting: OptimizationSetting,
+    key_func: KEY_FUNC,
+    max_workers: int = None,
+    output: OUTPUT_FUNC = print,
+    min_ratio: float = 0.1,
+    eta: int = 3
+) -> List[Tuple]:
+    """
+    Run successive halving optimization.
+    Every setting is first backtested on the first min_ratio of the
+    history only. Only the best 1/eta of them move on to the next round,
+    which backtests eta times more of the history, until the survivors
+    are backtested on the full range.
+    evaluate_func is called as evaluate_func(setting, end_ratio).
+    return: (setting, target_value, statistics) of the last round.
+    """
+    if not 0 < min_ratio <= 1:
+        output(_("最小数据比例必须大于0且不超过1"))
+        return []
+
+    if eta <= 1:
+        output(_("减半系数必须大于1"))
+        return []
+
+    settings: List[Dict] = optimization_setting.generate_settings()
+    ratios: List[float] = get_sh_ratios(min_ratio, eta)
+
+    output(_("开始执行逐次减半算法优化"))
+    output(_("参数优化空间：{}").format(len(settings)))
+    output(_("回测数据比例：{}").format(", ".join(f"{r:.0%}" for r in ratios)))
+
+    start: int = perf_counter()
+
+    results: List[Tuple] = []
+    workers: int = max_workers or os.cpu_count() or 1
+
     with ProcessPoolExecutor(
         max_workers,
         mp_context=get_context("spawn")
     ) as executor:
-        """
-        Instantly make your loops show a progress meter - just wrap
-          any iterable with “tqdm(iterable)”, and you’re done!
-        """
-        it: Iterable = tqdm(
-            executor.map(evaluate_func, settings),
-            total=len(settings)
-        )
-        
-        # results are: (setting, target_value, statistics, settings)
-        results: List[Tuple] = list(it)
-        # print(f"{results=} and {results[0]=}")
-        if results[0]:
+        for ratio in ratios:
+            output(_("数据比例{:.0%}，参数组合数量：{}").format(ratio, len(settings)))
+
+            it: Iterable = tqdm(
+                executor.map(
+                    evaluate_func,
+                    settings,
+                    repeat(ratio),
+                    chunksize=get_chunksize(len(settings), workers)
+                ),
+                total=len(settings)
+            )
+            results = [result for result in it if result]
             results.sort(reverse=True, key=key_func)
+
+            if ratio < 1:
+                keep: int = max(ceil(len(results) / eta), 1)
+                settings = [result[0] for result in results[:keep]]
+
+            if not settings:
+                break
+
+    end: int = perf_counter()
+    cost: int = int((end - start))
+    output(_("逐次减半算法优化完成，耗时{}秒").format(cost))
+    return results
+
+
+def get_sh_ratios(min_ratio: float, eta: float) -> List[float]:
+    """
+    History ratios of the successive halving rounds, growing by eta up
+    to the full history. A last round before the full one which is
+    closer to it than sqrt(eta) (0.9 before 1 with the defaults) is
+    merged into the full round, it would only repeat the same ranking.
+    """
+    ratios: List[float] = []
+    ratio: float = min_ratio
+    while ratio < 1:
+        ratios.append(ratio)
+        ratio *= eta
+
+    if len(ratios) > 1 and ratios[-1] * eta ** 0.5 > 1:
+        ratios.pop()
+
+    ratios.append(1)
+    return ratios
+
+
+def evaluate_chunk(evaluate_func: EVALUATE_FUNC, settings: List[dict]) -> List[Tuple]:
+    """
+    Evaluate a chunk of settings in one worker call, to save the
+    inter process communication cost of every single setting.
+    """
+    return [evaluate_func(setting) for setting in settings]
+
+
+def get_chunksize(total_size: int, workers: int) -> int:
+    """
+    About 4 chunks per worker so that the work stays balanced, but never
+    more than 64 settings per chunk so results keep streaming back.
+    """
+    return max(1, min(64, ceil(total_size / (workers * 4))))
+
+
+def get_setting_key(setting: dict) -> tuple:
+    """
+    Canonical, hashable form of a setting.
+    """
+    return tuple(sorted(setting.items(), key=lambda item: item[0]))
+
+
+class ResultCollector:
+    """
+    Keep the best top_n optimization results while they stream in.
+    keep all of them when top_n is None.
+    """
+
+    def __init__(self, key_func: KEY_FUNC, top_n: int = None) -> None:
+        """"""
+        self.key_func: KEY_FUNC = key_func
+        self.top_n: int = top_n
+
+        # min heap of (target value, sequence, result)
+        self.heap: List[Tuple] = []
+        self.count: int = 0
+
+    def add(self, result: Tuple) -> None:
+        """"""
+        # Later results lose ties, same as a stable sort.
+        self.count += 1
+        item: tuple = (self.key_func(result), -self.count, result)
+
+        if self.top_n is None or len(self.heap) < self.top_n:
+            heappush(self.heap, item)
         else:
-            results = []
+            heappushpop(self.heap, item)
 
-        end: int = perf_counter()
-        cost: int = int((end - start))
-        output(_("穷举算法优化完成，耗时{}秒").format(cost))
-        # print(f"results are: {results}")
+    def get_results(self) -> List[Tuple]:
+        """
+        results sorted from the best to the worst.
+        """
+        items: list = sorted(self.heap, key=lambda item: item[:2], reverse=True)
+        return [item[2] for item in items]
+
+
+class OptimizationCheckpoint:
+    """
+    Append only file of finished optimization results.
+    Every result is saved with the digest of the sweep context (strategy,
+    symbol, backtest window ...), so sweeps of different contexts could
+    share a file without resuming each other's results.
+    """
+
+    def __init__(self, path: str, context: tuple = ()) -> None:
+        """"""
+        self.path: Path = Path(path)
+        self.context: str = hashlib.sha1(pickle.dumps(context)).hexdigest()
+        self.file = None
+
+    def load(self) -> List[Tuple]:
+        """
+        Read results saved by a previous run of the same context. A
+        partly written last record (crash while saving) is ignored.
+        """
+        results: List[Tuple] = []
+        if not self.path.exists():
+            return results
+
+        with open(self.path, "rb") as f:
+            while True:
+                try:
+                    context, result = pickle.load(f)
+                except (EOFError, pickle.UnpicklingError, ValueError, TypeError):
+                    break
+
+                if context == self.context:
+                    results.append(result)
         return results
 
+    def save(self, result: Tuple) -> None:
+        """"""
+        if not self.file:
+            self.file = open(self.path, "ab")
+        pickle.dump((self.context, result), self.file)
+        self.file.flush()
+
+    def close(self) -> None:
+        """"""
+        if self.file:
+            self.file.close()
+            self.file = None
+
 
 def run_ga_optimization(
     evaluate_func: EVALUATE_FUNC,
@@ -281,9 +528,17 @@ def run_ga_optimization(
     max_workers: int = None,
     population_size: int = 100,
     ngen_size: int = 30,
-    output: OUTPUT_FUNC = print
+    output: OUTPUT_FUNC = print,
+    cache_path: str = None,
+    cache_context: tuple = ()
 ) -> List[Tuple]:
-    """Run genetic algorithm optimization"""
+    """
+    Run genetic algorithm optimization
+    cache_path: sqlite file of the persistent fitness cache. Results of
+    settings already evaluated with the same cache_context (backtest
+    window, data fingerprint etc.), in this run or a previous one, are
+    read from it instead of running the backtest again.
+    """
     # Define functions for generate parameter randomly
     buf: List[Dict] = optimization_setting.generate_settings()
     settings: List[Tuple] = [list(d.items()) for d in buf]
@@ -301,9 +556,19 @@ def run_ga_optimization(
                 individual[i] = paramlist[i]
         return individual,
 
-    # Set up multiprocessing Pool and Manager
+    if cache_path:
+        fitness_cache: FitnessCache = FitnessCache(cache_path, cache_context)
+        output(_("遗传算法结果缓存：{}，已有记录{}条").format(cache_path, fitness_cache.count()))
+        fitness_cache.close()
+
+    # Set up multiprocessing Pool and Manager, every worker opens the
+    # fitness cache once when it starts
     ctx: BaseContext = get_context("spawn")
-    with ctx.Manager() as manager, ctx.Pool(max_workers) as pool:
+    with ctx.Manager() as manager, ctx.Pool(
+        max_workers,
+        initializer=init_fitness_cache,
+        initargs=(cache_path, cache_context)
+    ) as pool:
         # Create shared dict for result cache
         cache: Dict[Tuple, Tuple] = manager.dict()
 
@@ -366,6 +631,19 @@ def run_ga_optimization(
         return results
 
 
+# Fitness cache of the worker process, opened by init_fitness_cache.
+worker_fitness_cache: Optional["FitnessCache"] = None
+
+
+def init_fitness_cache(path: Optional[str], context: tuple) -> None:
+    """
+    Pool initializer opening the fitness cache of a worker process.
+    """
+    global worker_fitness_cache
+    if path:
+        worker_fitness_cache = FitnessCache(path, context)
+
+
 def ga_evaluate(
     cache: dict,
     evaluate_func: callable,
@@ -375,13 +653,86 @@ def ga_evaluate(
     """
     Functions to be run in genetic algorithm optimization.
     """
+    fitness_cache: Optional[FitnessCache] = worker_fitness_cache
+
     tp: tuple = tuple(parameters)
     if tp in cache:
         result: tuple = cache[tp]
     else:
         setting: dict = dict(parameters)
-        result: dict = evaluate_func(setting)
+
+        result: tuple = None
+        if fitness_cache:
+            result = fitness_cache.get(setting)
+
+        if result is None:
+            result = evaluate_func(setting)
+            if fitness_cache and result:
+                fitness_cache.put(setting, result)
+
         cache[tp] = result
 
     value: float = key_func(result)
     return (value, )
+
+
+class FitnessCache:
+    """
+    Persistent cache of optimization results in a sqlite file.
+    Keyed on the canonical setting plus a context (backtest window,
+    data fingerprint ...), so it could be shared by all the worker
+    processes and reused by later runs on the same data. Every process
+    opens its own one, see init_fitness_cache.
+    """
+
+    def __init__(self, path: str, context: tuple = ()) -> None:
+        """"""
+        self.path: str = str(path)
+        self.context: bytes = pickle.dumps(context)
+        self.connection: Optional[sqlite3.Connection] = None
+
+        self.get_connection()
+
+    def close(self) -> None:
+        """"""
+        if self.connection:
+            self.connection.close()
+            self.connection = None
+
+    def get_connection(self) -> sqlite3.Connection:
+        """"""
+        if not self.connection:
+            self.connection = sqlite3.connect(self.path, timeout=60)
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS fitness (key TEXT PRIMARY KEY, result BLOB)"
+            )
+            self.connection.commit()
+        return self.connection
+
+    def get_key(self, setting: dict) -> str:
+        """"""
+        data: bytes = self.context + pickle.dumps(get_setting_key(setting))
+        return hashlib.sha1(data).hexdigest()
+
+    def get(self, setting: dict) -> Optional[Tuple]:
+        """"""
+        row: tuple = self.get_connection().execute(
+            "SELECT result FROM fitness WHERE key = ?", (self.get_key(setting),)
+        ).fetchone()
+        if row:
+            return pickle.loads(row[0])
+        return None
+
+    def put(self, setting: dict, result: Tuple) -> None:
+        """"""
+        connection: sqlite3.Connection = self.get_connection()
+        connection.execute(
+            "INSERT OR REPLACE INTO fitness (key, result) VALUES (?, ?)",
+            (self.get_key(setting), pickle.dumps(result))
+        )
+        connection.commit()
+
+    def count(self) -> int:
+        """"""
+        return self.get_connection().execute("SELECT COUNT(*) FROM fitness").fetchone()[0]
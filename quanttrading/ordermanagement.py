@@ -11,6 +11,7 @@ from logging import Logger
 import smtplib
 import os
 from abc import ABC
+from collections import defaultdict
 from pathlib import Path
 from datetime import datetime
 from email.message import EmailMessage
@@ -19,7 +20,7 @@ from threading import Thread
 from pandas import DataFrame
 from typing import Any, Type, Dict, List, Optional
 
-from event.engine import Event, EventEngine
+from event.engine import Event, EventEngine, EVENT_STATS, LOG_LANE
 
 from constant import (
     EVENT_TICK,
@@ -508,7 +509,13 @@ class LogManagement(BaseManagement):
 
     def register_event(self) -> None:
         """"""
-        self.event_engine.register(EVENT_LOG, self.process_log_event)
+        self.event_engine.register(EVENT_LOG, self.process_log_event, LOG_LANE)
+
+        # Seconds between two event engine statistics logs, 0 to disable.
+        stats_interval: int = SETTINGS.get("log.event_stats", 0)
+        if stats_interval:
+            self.event_engine.register(EVENT_STATS, self.process_stats_event, LOG_LANE)
+            self.event_engine.enable_stats(stats_interval)
 
     def process_log_event(self, event: Event) -> None:
         """
@@ -517,6 +524,30 @@ class LogManagement(BaseManagement):
         log: LogData = event.data
         self.logger.log(log.level, log.msg)
 
+    def process_stats_event(self, event: Event) -> None:
+        """
+        Log event engine statistics, one line per lane, event type and
+        handler. Durations are in milliseconds.
+        """
+        for lane_name, data in event.data.items():
+            self.logger.info(
+                f"EventEngine lane {lane_name}: queue {data['queue_size']}, "
+                f"max batch {data.get('max_batch', 0)}"
+            )
+
+            for type, info in data.get("events", {}).items():
+                latency: dict = info["latency"]
+                self.logger.info(
+                    f"  event {type}: {info['rate']:.1f}/s, latency mean {latency['mean']:.3f} "
+                    f"p99 {latency['p99']:.3f} max {latency['max']:.3f}"
+                )
+
+            for name, cost in data.get("handlers", {}).items():
+                self.logger.info(
+                    f"  handler {name}: {cost['count']} calls, mean {cost['mean']:.3f} "
+                    f"p99 {cost['p99']:.3f} max {cost['max']:.3f}"
+                )
+
 
 class OrderManagement(BaseManagement):
     """
@@ -559,6 +590,28 @@ class OrderManagement(BaseManagement):
         self.active_orders: Dict[str, OrderData] = {}
         self.active_quotes: Dict[str, QuoteData] = {}
 
+        # Secondary indexes of active orders and quotes, key: vt_orderid
+        self.symbol_active_orders: Dict[str, Dict[str, OrderData]] = defaultdict(dict)
+        self.gateway_active_orders: Dict[str, Dict[str, OrderData]] = defaultdict(dict)
+        self.reference_active_orders: Dict[str, Dict[str, OrderData]] = defaultdict(dict)
+        self.symbol_active_quotes: Dict[str, Dict[str, QuoteData]] = defaultdict(dict)
+
+        # trade.symbol to trades, key: vt_tradeid
+        self.symbol_trades: Dict[str, Dict[str, TradeData]] = defaultdict(dict)
+
+        # trade.vt_orderid to trades not archived yet, key: vt_tradeid
+        self.order_trades: Dict[str, Dict[str, TradeData]] = defaultdict(dict)
+
+        # Finished orders and their trades moved out of orders/trades
+        # once there are more than archive_limit orders. The limit is
+        # raised after a pass leaving many (active) orders, so it is not
+        # run again on every order update.
+        self.archive_size: int = 10000
+        self.archive_limit: int = self.archive_size
+        self.archived_orders: Dict[str, OrderData] = {}
+        self.archived_trades: Dict[str, TradeData] = {}
+        self.archived_symbol_trades: Dict[str, Dict[str, TradeData]] = defaultdict(dict)
+
         self.offset_converters: Dict[str, OffsetConverter] = {}
 
         self.add_function()
@@ -586,6 +639,7 @@ class OrderManagement(BaseManagement):
         self.main_engine.get_all_quotes = self.get_all_quotes
         self.main_engine.get_all_active_orders = self.get_all_active_orders
         self.main_engine.get_all_active_quotes = self.get_all_active_quotes
+        self.main_engine.get_active_order_count = self.get_active_order_count
 
         self.main_engine.update_order_request = self.update_order_request
         self.main_engine.convert_order_request = self.convert_order_request
@@ -652,16 +706,34 @@ class OrderManagement(BaseManagement):
     def process_order_event(self, event: Event) -> None:
         """"""
         order: OrderData = event.data
+
+        # Repeated update of a finished, archived order stays in archive
+        if order.vt_orderid in self.archived_orders:
+            if not order.is_active():
+                self.archived_orders[order.vt_orderid] = order
+                self.update_order_converter(order)
+                return
+            self.archived_orders.pop(order.vt_orderid)
+
         self.orders[order.vt_orderid] = order
 
         # If order is active, then update data in dict.
         if order.is_active():
             self.active_orders[order.vt_orderid] = order
+            self.update_order_index(order, True)
         # Otherwise, pop inactive order from in dict
         elif order.vt_orderid in self.active_orders:
-            self.active_orders.pop(order.vt_orderid)
+            self.update_order_index(self.active_orders.pop(order.vt_orderid), False)
 
-        # Update to offset converter
+            if len(self.orders) > self.archive_limit:
+                self.archive_orders()
+
+        self.update_order_converter(order)
+
+    def update_order_converter(self, order: OrderData) -> None:
+        """
+        Update order to offset converter of its gateway.
+        """
         converter: OffsetConverter = self.offset_converters.get(order.gateway_name, None)
         if converter:
             converter.update_order(order)
@@ -669,7 +741,15 @@ class OrderManagement(BaseManagement):
     def process_trade_event(self, event: Event) -> None:
         """"""
         trade: TradeData = event.data
-        self.trades[trade.vt_tradeid] = trade
+
+        # Trade of an archived order goes to archive directly
+        if trade.vt_orderid in self.archived_orders:
+            self.archived_trades[trade.vt_tradeid] = trade
+            self.archived_symbol_trades[trade.symbol][trade.vt_tradeid] = trade
+        else:
+            self.trades[trade.vt_tradeid] = trade
+            self.symbol_trades[trade.symbol][trade.vt_tradeid] = trade
+            self.order_trades[trade.vt_orderid][trade.vt_tradeid] = trade
 
         # Update to offset converter
         converter: OffsetConverter = self.offset_converters.get(trade.gateway_name, None)
@@ -711,9 +791,50 @@ class OrderManagement(BaseManagement):
         # If quote is active, then update data in dict.
         if quote.is_active():
             self.active_quotes[quote.vt_quoteid] = quote
+            self.symbol_active_quotes[quote.vt_symbol][quote.vt_quoteid] = quote
         # Otherwise, pop inactive quote from in dict
         elif quote.vt_quoteid in self.active_quotes:
             self.active_quotes.pop(quote.vt_quoteid)
+            remove_index(self.symbol_active_quotes, quote.vt_symbol, quote.vt_quoteid)
+
+    def update_order_index(self, order: OrderData, active: bool) -> None:
+        """
+        Add active order into (or remove from) secondary indexes.
+        """
+        indexes: list = [
+            (self.symbol_active_orders, order.vt_symbol),
+            (self.gateway_active_orders, order.gateway_name),
+            (self.reference_active_orders, order.reference),
+        ]
+        for index, key in indexes:
+            if active:
+                index[key][order.vt_orderid] = order
+            else:
+                remove_index(index, key, order.vt_orderid)
+
+    def archive_orders(self) -> None:
+        """
+        Move the oldest half of finished orders, and their trades, out of
+        orders/trades dicts. They can still be queried by id.
+        """
+        count: int = len(self.orders) // 2
+        archived: set = set()
+
+        for vt_orderid, order in self.orders.items():
+            if len(archived) >= count:
+                break
+            if vt_orderid not in self.active_orders:
+                archived.add(vt_orderid)
+
+        for vt_orderid in archived:
+            self.archived_orders[vt_orderid] = self.orders.pop(vt_orderid)
+
+            for vt_tradeid, trade in self.order_trades.pop(vt_orderid, {}).items():
+                self.archived_trades[vt_tradeid] = self.trades.pop(vt_tradeid)
+                self.archived_symbol_trades[trade.symbol][vt_tradeid] = trade
+                remove_index(self.symbol_trades, trade.symbol, vt_tradeid)
+
+        self.archive_limit = max(self.archive_size, len(self.orders) + self.archive_size // 2)
 
     def getHisData(self, symbol: str) -> Optional[list[CandleData]]:
         """
@@ -741,13 +862,19 @@ class OrderManagement(BaseManagement):
         """
         Get latest order data by vt_orderid.
         """
-        return self.orders.get(vt_orderid, None)
+        order: Optional[OrderData] = self.orders.get(vt_orderid, None)
+        if not order:
+            order = self.archived_orders.get(vt_orderid, None)
+        return order
 
     def get_trade(self, vt_tradeid: str) -> Optional[TradeData]:
         """
         Get trade data by vt_tradeid.
         """
-        return self.trades.get(vt_tradeid, None)
+        trade: Optional[TradeData] = self.trades.get(vt_tradeid, None)
+        if not trade:
+            trade = self.archived_trades.get(vt_tradeid, None)
+        return trade
 
     def get_position(self, vt_positionidOrSymbol: str) -> Optional[PositionData]:
         """
@@ -802,25 +929,22 @@ class OrderManagement(BaseManagement):
 
     def get_all_orders(self) -> List[OrderData]:
         """
-        Get all order data.
+        Get all order data, including archived ones.
         """
-        return list(self.orders.values())
+        return list(self.archived_orders.values()) + list(self.orders.values())
 
     def get_all_trades(self, symbol:str = None) -> List[TradeData]:
         """
         Get all trade data for a specified symbol.
         get all trades data for all if symbol is not specified.
         """
-        trades: list[TradeData] = []
-        if symbol and self.trades:
-            for _ in self.trades.values():
-                if _.symbol == symbol:
-                    trades.append(_)
-
-        else:
-            trades = list(self.trades.values())
+        if symbol:
+            return (
+                list(self.archived_symbol_trades.get(symbol, {}).values())
+                + list(self.symbol_trades.get(symbol, {}).values())
+            )
 
-        return trades
+        return list(self.archived_trades.values()) + list(self.trades.values())
 
     def get_all_positions(self) -> List[PositionData]:
         """
@@ -846,21 +970,64 @@ class OrderManagement(BaseManagement):
         """
         return list(self.quotes.values())
 
-    def get_all_active_orders(self, vt_symbol: str = "") -> List[OrderData]:
+    def get_all_active_orders(
+        self,
+        vt_symbol: str = "",
+        gateway_name: str = "",
+        reference: str = ""
+    ) -> List[OrderData]:
+        """
+        Get all active orders by vt_symbol, gateway_name and/or reference
+        (e.g. CtaStrategy_strategyname).
+        If none is given, return all active orders.
         """
-        Get all active orders by vt_symbol.
+        orders: Dict[str, OrderData] = self.get_active_order_index(vt_symbol, gateway_name, reference)
+        active_orders: List[OrderData] = list(orders.values())
+
+        # Filter the smallest index by other conditions
+        if vt_symbol:
+            active_orders = [order for order in active_orders if order.vt_symbol == vt_symbol]
+        if gateway_name:
+            active_orders = [order for order in active_orders if order.gateway_name == gateway_name]
+        if reference:
+            active_orders = [order for order in active_orders if order.reference == reference]
 
-        If vt_symbol is empty, return all active orders.
+        return active_orders
+
+    def get_active_order_count(
+        self,
+        vt_symbol: str = "",
+        gateway_name: str = "",
+        reference: str = ""
+    ) -> int:
         """
-        if not vt_symbol:
-            return list(self.active_orders.values())
-        else:
-            active_orders: List[OrderData] = [
-                order
-                for order in self.active_orders.values()
-                if order.vt_symbol == vt_symbol
-            ]
-            return active_orders
+        Count of active orders, O(1) when at most one condition is given.
+        """
+        if bool(vt_symbol) + bool(gateway_name) + bool(reference) > 1:
+            return len(self.get_all_active_orders(vt_symbol, gateway_name, reference))
+
+        return len(self.get_active_order_index(vt_symbol, gateway_name, reference))
+
+    def get_active_order_index(
+        self,
+        vt_symbol: str = "",
+        gateway_name: str = "",
+        reference: str = ""
+    ) -> Dict[str, OrderData]:
+        """
+        Smallest index dict of active orders matching any given condition.
+        """
+        indexes: list = []
+        if vt_symbol:
+            indexes.append(self.symbol_active_orders.get(vt_symbol, {}))
+        if gateway_name:
+            indexes.append(self.gateway_active_orders.get(gateway_name, {}))
+        if reference:
+            indexes.append(self.reference_active_orders.get(reference, {}))
+
+        if not indexes:
+            return self.active_orders
+        return min(indexes, key=len)
 
     def get_all_active_quotes(self, vt_symbol: str = "") -> List[QuoteData]:
         """
@@ -870,12 +1037,7 @@ class OrderManagement(BaseManagement):
         if not vt_symbol:
             return list(self.active_quotes.values())
         else:
-            active_quotes: List[QuoteData] = [
-                quote
-                for quote in self.active_quotes.values()
-                if quote.vt_symbol == vt_symbol
-            ]
-            return active_quotes
+            return list(self.symbol_active_quotes.get(vt_symbol, {}).values())
 
     def update_order_request(self, req: OrderRequest, vt_orderid: str, gateway_name: str) -> None:
         """
@@ -908,6 +1070,19 @@ class OrderManagement(BaseManagement):
         """
         return self.offset_converters.get(gateway_name, None)
 
+
+def remove_index(index: Dict[str, dict], key: str, id: str) -> None:
+    """
+    Remove id from index[key], and the key once it has no data left.
+    """
+    data: Optional[dict] = index.get(key, None)
+    if data is None:
+        return
+
+    data.pop(id, None)
+    if not data:
+        index.pop(key)
+
 # class DataManagement(BaseManagement):
 
 class EmailManagement(BaseManagement):
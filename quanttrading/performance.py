@@ -0,0 +1,153 @@
+"""
+Statistics of backtesting balance curves.
+
+All backtesting engines compute their statistics from the daily net pnl
+with calculate_curve_statistics, which works on NumPy arrays only. The
+engines had slightly different definitions of the daily return and of
+the daily risk free rate, which are kept as parameters so that every
+engine gives the same numbers as before.
+"""
+from datetime import date
+from typing import Optional, Sequence
+
+import numpy as np
+
+
+# Time series columns added to the daily result DataFrame.
+CURVE_COLUMNS: tuple = ("balance", "return", "highlevel", "drawdown", "ddpercent")
+
+# Daily return against the previous balance, capital for the first day,
+# 0 once balance falls to or below 0 (CTA engines).
+RETURN_CAPITAL: str = "capital"
+
+# Daily return against the previous balance, 0 for the first day and
+# where the log is not defined (portfolio and spread engines).
+RETURN_PREVIOUS: str = "previous"
+
+
+def calculate_curve_statistics(
+    net_pnl: np.ndarray,
+    capital: float,
+    annual_days: int = 240,
+    risk_free: float = 0,
+    half_life: int = 120,
+    return_mode: str = RETURN_CAPITAL,
+    daily_risk_free: Optional[float] = None
+) -> dict:
+    """
+    Calculate balance curve and statistics of daily net pnl.
+
+    Daily return is the log return of balance, see RETURN_CAPITAL and
+    RETURN_PREVIOUS for return_mode. daily_risk_free defaults to
+    risk_free / sqrt(annual_days). Standard deviations are unbiased, the
+    same as pandas. EWM Sharpe uses the last value of an adjusted
+    exponential moving window with the half life given.
+    """
+    net_pnl = np.asarray(net_pnl, dtype=np.float64)
+    days: int = len(net_pnl)
+
+    if daily_risk_free is None:
+        daily_risk_free = risk_free / np.sqrt(annual_days)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # Balance and drawdown series
+        balance: np.ndarray = np.cumsum(net_pnl) + capital
+
+        if return_mode == RETURN_PREVIOUS:
+            returns: np.ndarray = np.zeros(days)
+            returns[1:] = np.log(balance[1:] / balance[:-1])
+            returns[np.isnan(returns)] = 0
+        else:
+            pre_balance: np.ndarray = np.empty_like(balance)
+            pre_balance[:1] = capital
+            pre_balance[1:] = balance[:-1]
+
+            x: np.ndarray = balance / pre_balance
+            positive: np.ndarray = x > 0
+            returns = np.where(positive, np.log(np.where(positive, x, 1)), 0)
+
+        highlevel: np.ndarray = np.maximum.accumulate(balance)
+        drawdown: np.ndarray = balance - highlevel
+        ddpercent: np.ndarray = drawdown / highlevel * 100
+
+        positive_balance: bool = bool((balance > 0).all())
+
+        # Max drawdown and the balance high before it
+        max_drawdown_end: int = int(np.argmin(drawdown))
+        max_drawdown_start: int = int(np.argmax(balance[:max_drawdown_end + 1]))
+
+        max_drawdown: float = float(drawdown.min())
+        max_ddpercent: float = float(ddpercent.min())
+
+        # Return statistics
+        end_balance: float = float(balance[-1])
+        total_net_pnl: float = float(net_pnl.sum())
+
+        total_return: float = (end_balance / capital - 1) * 100
+        annual_return: float = total_return / days * annual_days
+
+        daily_return: float = float(returns.mean()) * 100
+        return_std: float = float(returns.std(ddof=1)) * 100
+
+        if return_std:
+            sharpe_ratio: float = (daily_return - daily_risk_free) / return_std * np.sqrt(annual_days)
+        else:
+            sharpe_ratio = 0
+
+        # EWM mean and std at the last day, weights decay from the last day backwards
+        alpha: float = 1 - np.exp(-np.log(2) / half_life)
+        weights: np.ndarray = (1 - alpha) ** np.arange(days - 1, -1, -1, dtype=np.float64)
+        weight_sum: float = weights.sum()
+
+        ewm_mean: float = (returns * weights).sum() / weight_sum
+        ewm_var: float = (
+            ((returns - ewm_mean) ** 2 * weights).sum()
+            / (weight_sum - (weights ** 2).sum() / weight_sum)
+        )
+        if return_std:
+            ewm_sharpe: float = (ewm_mean * 100 - daily_risk_free) / (np.sqrt(ewm_var) * 100) * np.sqrt(annual_days)
+        else:
+            ewm_sharpe = 0
+
+        if max_ddpercent:
+            return_drawdown_ratio: float = -total_return / max_ddpercent
+        else:
+            return_drawdown_ratio = 0
+
+    return {
+        "balance": balance,
+        "return": returns,
+        "highlevel": highlevel,
+        "drawdown": drawdown,
+        "ddpercent": ddpercent,
+        "positive_balance": positive_balance,
+        "total_days": days,
+        "profit_days": int((net_pnl > 0).sum()),
+        "loss_days": int((net_pnl < 0).sum()),
+        "end_balance": end_balance,
+        "max_drawdown": max_drawdown,
+        "max_ddpercent": max_ddpercent,
+        "max_drawdown_start": max_drawdown_start,
+        "max_drawdown_end": max_drawdown_end,
+        "total_net_pnl": total_net_pnl,
+        "total_return": total_return,
+        "annual_return": annual_return,
+        "daily_return": daily_return,
+        "return_std": return_std,
+        "sharpe_ratio": float(sharpe_ratio),
+        "ewm_sharpe": float(ewm_sharpe),
+        "return_drawdown_ratio": return_drawdown_ratio,
+    }
+
+
+def get_drawdown_duration(dates: Sequence, start_ix: int, end_ix: int) -> int:
+    """
+    Days between the balance high and the max drawdown, 0 if the curve
+    is not indexed by date.
+    """
+    start: date = dates[start_ix]
+    end: date = dates[end_ix]
+
+    if isinstance(end, date) and isinstance(start, date):
+        return (end - start).days
+    return 0
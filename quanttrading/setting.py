@@ -156,6 +156,7 @@ def initialize_settings_data():
             "log.level": INFO,
             "log.console": True,
             "log.file": True,
+            "log.event_stats": 0,
 
             "email.server": "smtp.eagloo.co.uk",
             "email.port": 465,
@@ -176,11 +177,14 @@ def initialize_settings_data():
             "database.user": "",
             "database.password": "",
 
+            "history_cache.size": 2048,
+
             "exchange_fee": 0.5,
 
             "__version__": "1.0",
             "palette": "dark",
             "MAX_NUM_CANDLE": 300,
+            "MAX_BAR_PICTURES": 5000,
             "DOWN_COLOR": "r",
             "UP_COLOR": "g",
             "PEN_WIDTH": 1,
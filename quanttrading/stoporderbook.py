@@ -0,0 +1,140 @@
+"""
+Active stop orders indexed by trigger price, shared by the CtaStrategy
+app and the backtester.
+"""
+
+from heapq import heappop, heappush
+from typing import Any, Dict, List, Optional, Tuple
+
+from constant import Direction
+
+
+class StopOrderBook:
+    """
+    Active stop orders indexed by vt_symbol and trigger price.
+
+    Long stop orders are kept in a min-heap of price and short stop
+    orders in a max-heap, so checking a new price only touches orders
+    which are actually triggered. Removed orders are dropped from the
+    heaps lazily.
+
+    Stop orders of the CtaStrategy app and of the backtester are both
+    held here, they only need vt_symbol, direction, price and
+    stop_orderid.
+    """
+
+    def __init__(self) -> None:
+        """"""
+        # Active stop orders, stop_orderid: stop_order
+        self.orders: Dict[str, Any] = {}
+
+        # Sequence of every active order, also used to keep insertion order
+        self.seqs: Dict[str, int] = {}
+        self.count: int = 0
+
+        # vt_symbol: (long heap, short heap) of (price, seq, stop_orderid)
+        self.heaps: Dict[str, Tuple[list, list]] = {}
+        self.heap_size: int = 0
+
+        # (seq, stop_orderid) returned by the last get_crossed
+        self.taken: List[Tuple[int, str]] = []
+
+    def __len__(self) -> int:
+        """"""
+        return len(self.orders)
+
+    def __contains__(self, stop_orderid: str) -> bool:
+        """"""
+        return stop_orderid in self.orders
+
+    def add(self, stop_order: Any) -> None:
+        """
+        Add a stop order, or put back an order returned by get_crossed.
+        """
+        self.count += 1
+        self.orders[stop_order.stop_orderid] = stop_order
+        self.seqs[stop_order.stop_orderid] = self.count
+        self.push(stop_order, self.count)
+
+        # Rebuild heaps when most entries are removed orders
+        if self.heap_size > len(self.orders) * 2 + 64:
+            self.rebuild()
+
+    def remove(self, stop_orderid: str) -> Optional[Any]:
+        """"""
+        self.seqs.pop(stop_orderid, None)
+        return self.orders.pop(stop_orderid, None)
+
+    def clear(self) -> None:
+        """"""
+        self.orders.clear()
+        self.seqs.clear()
+        self.heaps.clear()
+        self.heap_size = 0
+        self.taken.clear()
+
+    def push(self, stop_order: Any, seq: int) -> None:
+        """"""
+        heaps: Optional[Tuple[list, list]] = self.heaps.get(stop_order.vt_symbol, None)
+        if not heaps:
+            heaps = ([], [])
+            self.heaps[stop_order.vt_symbol] = heaps
+
+        if stop_order.direction == Direction.LONG:
+            heappush(heaps[0], (stop_order.price, seq, stop_order.stop_orderid))
+        else:
+            heappush(heaps[1], (-stop_order.price, seq, stop_order.stop_orderid))
+        self.heap_size += 1
+
+    def rebuild(self) -> None:
+        """"""
+        self.heaps.clear()
+        self.heap_size = 0
+        self.taken.clear()
+        for stop_orderid, stop_order in self.orders.items():
+            self.push(stop_order, self.seqs[stop_orderid])
+
+    def get_crossed(self, vt_symbol: str, long_price: float, short_price: float) -> List[Any]:
+        """
+        Stop orders triggered by the prices, in the order they were added:
+        long orders with price <= long_price, short orders with price >=
+        short_price.
+
+        Returned orders are taken off the heaps but stay active, call
+        remove once handled, or add to put one back. Orders neither
+        removed nor added back, when a callback raised while handling
+        them, are put back on the heaps by the next call.
+        """
+        self.restore()
+
+        heaps: Optional[Tuple[list, list]] = self.heaps.get(vt_symbol, None)
+        if not heaps:
+            return []
+        long_heap, short_heap = heaps
+
+        crossed: list = []
+
+        while long_heap and long_heap[0][0] <= long_price:
+            _, seq, stop_orderid = heappop(long_heap)
+            self.heap_size -= 1
+            if self.seqs.get(stop_orderid, None) == seq:
+                crossed.append((seq, self.orders[stop_orderid]))
+
+        while short_heap and -short_heap[0][0] >= short_price:
+            _, seq, stop_orderid = heappop(short_heap)
+            self.heap_size -= 1
+            if self.seqs.get(stop_orderid, None) == seq:
+                crossed.append((seq, self.orders[stop_orderid]))
+
+        crossed.sort(key=lambda item: item[0])
+        self.taken = [(seq, stop_order.stop_orderid) for seq, stop_order in crossed]
+        return [stop_order for _, stop_order in crossed]
+
+    def restore(self) -> None:
+        """
+        Push back orders taken by get_crossed which are still active.
+        """
+        for seq, stop_orderid in self.taken:
+            if self.seqs.get(stop_orderid, None) == seq:
+                self.push(self.orders[stop_orderid], seq)
+        self.taken = []
@@ -0,0 +1,210 @@
+"""
+HistoryMultiplexer against a fake IB client which answers history
+requests from a thread, the way EClient calls back EWrapper.
+"""
+import unittest
+from concurrent.futures import Future
+from datetime import datetime, timedelta
+from threading import Lock, Thread
+from time import monotonic, sleep
+from typing import Callable, List, Optional
+
+from constant import Exchange, Interval
+from datatypes import BarData, HistoryRequest
+from data.ibkr.history import (
+    HISTORY_ERROR_CODE,
+    HistoryError,
+    HistoryMultiplexer,
+    SlidingWindowLimiter,
+    split_history_range
+)
+
+
+START: datetime = datetime(2024, 1, 1)
+
+
+class FakeClient:
+    """
+    Fake EClient: every reqHistoricalData is answered with daily bars of
+    the chunk from a thread, through the EWrapper callbacks of the
+    multiplexer.
+    """
+
+    def __init__(self, reply: Optional[Callable] = None) -> None:
+        """
+        reply(client, reqid, req, end, duration) answers a request, the
+        default sends the bars and the end.
+        """
+        self.reply: Callable = reply or FakeClient.send_bars
+        self.multiplexer: HistoryMultiplexer = None
+        self.requests: List[tuple] = []
+        self.lock: Lock = Lock()
+
+    def reqHistoricalData(self, reqid: int, req: HistoryRequest, end: datetime, duration: str) -> None:
+        """"""
+        with self.lock:
+            self.requests.append((monotonic(), reqid, req, end, duration))
+        Thread(target=self.reply, args=(self, reqid, req, end, duration), daemon=True).start()
+
+    def send_bars(self, reqid: int, req: HistoryRequest, end: datetime, duration: str) -> None:
+        """"""
+        count, unit = duration.split()
+        days: int = int(count) * (365 if unit == "Y" else 1)
+        for i in range(days, 0, -1):
+            bar: BarData = BarData(
+                gateway_name="IB",
+                symbol=req.symbol,
+                exchange=req.exchange,
+                datetime=end - timedelta(days=i),
+                interval=req.interval,
+                close_price=float(i)
+            )
+            self.multiplexer.on_bar(reqid, bar)
+        self.multiplexer.on_end(reqid)
+
+
+def create_multiplexer(client: FakeClient, **kwargs) -> HistoryMultiplexer:
+    """"""
+    multiplexer: HistoryMultiplexer = HistoryMultiplexer(client.reqHistoricalData, **kwargs)
+    client.multiplexer = multiplexer
+    multiplexer.start()
+    return multiplexer
+
+
+def create_request(symbol: str, days: int) -> HistoryRequest:
+    """"""
+    return HistoryRequest(
+        symbol=symbol,
+        exchange=Exchange.SMART,
+        start=START,
+        end=START + timedelta(days=days),
+        interval=Interval.DAILY
+    )
+
+
+class HistoryMultiplexerTest(unittest.TestCase):
+
+    def test_split_history_range(self) -> None:
+        req: HistoryRequest = create_request("AAPL", 800)
+        ranges: List[tuple] = split_history_range(req)
+
+        self.assertEqual(len(ranges), 3)
+        self.assertEqual(ranges[0], (req.end, "1 Y"))
+        self.assertEqual(ranges[-1], (START + timedelta(days=70), "70 D"))
+
+    def test_chunks_merged(self) -> None:
+        client: FakeClient = FakeClient()
+        multiplexer: HistoryMultiplexer = create_multiplexer(client)
+
+        bars: List[BarData] = multiplexer.submit(create_request("AAPL", 800)).result(5)
+        multiplexer.stop()
+
+        self.assertEqual(len(client.requests), 3)
+        self.assertEqual(len(bars), 800)
+        self.assertEqual(bars[0].datetime, START)
+        self.assertTrue(all(a.datetime < b.datetime for a, b in zip(bars, bars[1:])))
+
+    def test_reqid_routing(self) -> None:
+        def reply(client: FakeClient, reqid: int, req: HistoryRequest, end: datetime, duration: str) -> None:
+            # Answer the first request last
+            if req.symbol == "AAPL":
+                sleep(0.2)
+            client.send_bars(reqid, req, end, duration)
+
+        client: FakeClient = FakeClient(reply)
+        multiplexer: HistoryMultiplexer = create_multiplexer(client)
+
+        futures: List[Future] = [
+            multiplexer.submit(create_request(symbol, 10)) for symbol in ("AAPL", "MSFT", "IBM")
+        ]
+        results: List[List[BarData]] = [future.result(5) for future in futures]
+        multiplexer.stop()
+
+        for symbol, bars in zip(("AAPL", "MSFT", "IBM"), results):
+            self.assertEqual(len(bars), 10)
+            self.assertTrue(all(bar.symbol == symbol for bar in bars))
+
+        self.assertEqual(len({reqid for _, reqid, _, _, _ in client.requests}), 3)
+        self.assertFalse(multiplexer.on_bar(1, None))
+        self.assertFalse(multiplexer.on_end(1))
+
+    def test_timeout(self) -> None:
+        client: FakeClient = FakeClient(lambda *args: None)
+        multiplexer: HistoryMultiplexer = create_multiplexer(client, timeout=0.2)
+
+        future: Future = multiplexer.submit(create_request("AAPL", 10))
+        with self.assertRaises(TimeoutError):
+            future.result(5)
+        multiplexer.stop()
+
+    def test_pacing_window(self) -> None:
+        client: FakeClient = FakeClient()
+        multiplexer: HistoryMultiplexer = create_multiplexer(client, limit=2, window=0.3)
+
+        futures: List[Future] = [multiplexer.submit(create_request("AAPL", 10)) for _ in range(5)]
+        for future in futures:
+            future.result(5)
+        multiplexer.stop()
+
+        # No more than 2 requests sent within any window
+        times: List[float] = sorted(t for t, _, _, _, _ in client.requests)
+        self.assertEqual(len(times), 5)
+        for a, b in zip(times, times[2:]):
+            self.assertGreaterEqual(b - a, 0.3)
+
+    def test_sliding_window_limiter(self) -> None:
+        limiter: SlidingWindowLimiter = SlidingWindowLimiter(3, 0.2)
+
+        self.assertEqual([limiter.try_acquire() for _ in range(3)], [0, 0, 0])
+        wait: float = limiter.try_acquire()
+        self.assertGreater(wait, 0)
+
+        sleep(wait)
+        self.assertEqual(limiter.try_acquire(), 0)
+
+    def test_pacing_violation_retried(self) -> None:
+        violated: set = set()
+
+        def reply(client: FakeClient, reqid: int, req: HistoryRequest, end: datetime, duration: str) -> None:
+            if end not in violated:
+                violated.add(end)
+                client.multiplexer.on_error(reqid, HISTORY_ERROR_CODE, "Historical data request pacing violation")
+            else:
+                client.send_bars(reqid, req, end, duration)
+
+        client: FakeClient = FakeClient(reply)
+        multiplexer: HistoryMultiplexer = create_multiplexer(client, pacing_pause=0.1)
+
+        bars: List[BarData] = multiplexer.submit(create_request("AAPL", 800)).result(5)
+        multiplexer.stop()
+
+        self.assertEqual(len(bars), 800)
+        self.assertEqual(len(client.requests), 6)
+
+    def test_pacing_violation_failed(self) -> None:
+        def reply(client: FakeClient, reqid: int, req: HistoryRequest, end: datetime, duration: str) -> None:
+            client.multiplexer.on_error(reqid, HISTORY_ERROR_CODE, "Historical data request pacing violation")
+
+        client: FakeClient = FakeClient(reply)
+        multiplexer: HistoryMultiplexer = create_multiplexer(client, pacing_pause=0.01, pacing_retries=2)
+
+        future: Future = multiplexer.submit(create_request("AAPL", 10))
+        with self.assertRaises(HistoryError):
+            future.result(5)
+        multiplexer.stop()
+
+        self.assertEqual(len(client.requests), 3)
+
+    def test_no_data_ends_chunk(self) -> None:
+        def reply(client: FakeClient, reqid: int, req: HistoryRequest, end: datetime, duration: str) -> None:
+            client.multiplexer.on_error(reqid, HISTORY_ERROR_CODE, "HMDS query returned no data")
+
+        client: FakeClient = FakeClient(reply)
+        multiplexer: HistoryMultiplexer = create_multiplexer(client)
+
+        self.assertEqual(multiplexer.submit(create_request("AAPL", 10)).result(5), [])
+        multiplexer.stop()
+
+
+if __name__ == "__main__":
+    unittest.main()
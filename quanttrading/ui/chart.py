@@ -25,6 +25,7 @@ file = Path(__file__).resolve()
 pt.append(str(file.parents[1]))
 from constant import ChartInterval, ChartPeriod, stringToInterval
 from datatypes import BarData
+from barframe import bars_to_dataframe
 from .chartitems import Asset, CandlestickItems, ChartBase, DataManager, DatetimeAxis, Ticker, IntervalBox,VolumeItem
 from setting import Aiconfig
 import data.finlib as fb
@@ -496,17 +497,7 @@ class ChartGraph(pg.PlotWidget):
     def _wrapDataFramebyBar(self, barList: list[BarData]) -> DataFrame:
         """
         """
-        # dates = bar.date.split()
-        df = DataFrame()
-        if barList is not None and isinstance(barList, list) and len(barList) > 0:
-            for bar in barList:
-                data = {'Date':bar.datetime, 'Open':bar.open_price, 'High':bar.high_price,
-                    'Low':bar.low_price, 'Close':bar.close_price, 'Volume':bar.volume, 
-                    'Symbol':bar.symbol, 'Gateway':bar.gateway_name, 'vt_symbol': bar.vt_symbol, 'Interval': bar.interval}
-                
-                dataFrame = DataFrame(data=data,index=[0])
-                df = pd.concat([df, dataFrame], ignore_index=True)
-        return df
+        return bars_to_dataframe(barList)
     
     def update_history(self, barDatas:DataFrame =None) -> None:
         """
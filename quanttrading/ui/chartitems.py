@@ -3,9 +3,13 @@ define all the items used in the chart
 """
 from dataclasses import dataclass
 from abc import abstractmethod
+from bisect import bisect_left
+from collections import OrderedDict
+from math import ceil
 from typing import Tuple, List, Dict
+import numpy as np
 import pyqtgraph as pg
-from pandas import DataFrame, Timestamp, concat
+from pandas import DataFrame, Timestamp
 import pandas as pd
 from .uiapp import QtGui, QtCore, QtWidgets
 from setting import Aiconfig
@@ -21,6 +25,87 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+class RangeTree:
+    """
+    Segment tree over a growable float array, answers min or max of
+    any index range in O(log n).
+    leaves live in tree[capacity:], node i covers nodes 2i and 2i+1.
+    """
+    def __init__(self, func: np.ufunc, identity: float, capacity: int = 1024) -> None:
+        self._func: np.ufunc = func
+        self._identity: float = identity
+        self._capacity: int = capacity
+        self._tree: np.ndarray = np.full(capacity * 2, identity)
+
+    def reset(self, values: np.ndarray = None) -> None:
+        """
+        rebuild the tree with new leaf values.
+        """
+        size: int = 0 if values is None else len(values)
+        capacity: int = self._capacity
+        while capacity < size:
+            capacity *= 2
+
+        self._capacity = capacity
+        self._tree = np.full(capacity * 2, self._identity)
+        if size:
+            self._tree[capacity:capacity + size] = values
+            self._rebuild(capacity, capacity + size)
+
+    def setValues(self, start: int, values: np.ndarray, size: int) -> None:
+        """
+        set leaves from index start. size is the total leaves in use after
+        the update, the tree is regrown if it does not fit anymore.
+        """
+        if size > self._capacity:
+            leaves: np.ndarray = self._tree[self._capacity:self._capacity + start].copy()
+            self.reset(np.concatenate([leaves, values]))
+            return
+
+        begin: int = self._capacity + start
+        self._tree[begin:begin + len(values)] = values
+        self._rebuild(begin, begin + len(values))
+
+    def clear(self, start: int, end: int) -> None:
+        """
+        reset leaves within [start, end) to the identity value.
+        """
+        begin: int = self._capacity + start
+        self._tree[begin:self._capacity + end] = self._identity
+        self._rebuild(begin, self._capacity + end)
+
+    def _rebuild(self, start: int, end: int) -> None:
+        """
+        recalculate the parents of the nodes in [start, end).
+        """
+        tree: np.ndarray = self._tree
+        while start > 1:
+            start //= 2
+            end = (end - 1) // 2 + 1
+            tree[start:end] = self._func(tree[2 * start:2 * end:2], tree[2 * start + 1:2 * end:2])
+
+    def query(self, start: int, end: int) -> float:
+        """
+        min or max of the leaves within [start, end).
+        """
+        tree: np.ndarray = self._tree
+        result: float = self._identity
+        start += self._capacity
+        end += self._capacity
+
+        while start < end:
+            if start & 1:
+                result = self._func(result, tree[start])
+                start += 1
+            if end & 1:
+                end -= 1
+                result = self._func(result, tree[end])
+            start //= 2
+            end //= 2
+
+        return float(result)
+
+
 class DataManager():
     """
     Provides chart data management system function.
@@ -29,12 +114,30 @@ class DataManager():
     those data wrapped in an Event to eventengine.
     ChartDataManagement will retrieve the data from 
     the eventengine, process those data and update the chart
+
+    bars are held in preallocated numpy arrays (one per column) which grow
+    by doubling. a streamed bar is appended or updates the last bar in
+    place, the visible price/volume range comes from segment trees.
     """
     MIN_BAR_COUNT = Aiconfig.get("MIN_BAR_COUNT")
+    INIT_CAPACITY: int = 1024
 
     def __init__(self, assetName: str = None) -> None:
-        self._data: DataFrame = None
-        # self._data.reset_index(inplace=True)
+        self._size: int = 0
+        self._capacity: int = 0
+        self._dates: np.ndarray = None
+        self._open: np.ndarray = None
+        self._high: np.ndarray = None
+        self._low: np.ndarray = None
+        self._close: np.ndarray = None
+        self._volume: np.ndarray = None
+        self._allocate(self.INIT_CAPACITY)
+
+        self._high_tree: RangeTree = RangeTree(np.maximum, -np.inf, self.INIT_CAPACITY)
+        self._low_tree: RangeTree = RangeTree(np.minimum, np.inf, self.INIT_CAPACITY)
+        self._volume_max_tree: RangeTree = RangeTree(np.maximum, -np.inf, self.INIT_CAPACITY)
+        self._volume_min_tree: RangeTree = RangeTree(np.minimum, np.inf, self.INIT_CAPACITY)
+
         # self._mainEngine = mainEngine
         self._initXRange()
         self._assetName: str = assetName
@@ -46,6 +149,23 @@ class DataManager():
 
         # self.register_event()
 
+    def _allocate(self, capacity: int) -> None:
+        """
+        (re)allocate the column arrays, keeping the bars already stored.
+        """
+        size: int = self._size
+        dates: np.ndarray = np.empty(capacity, dtype=object)
+        columns: list = [np.zeros(capacity) for _ in range(5)]
+
+        if size:
+            dates[:size] = self._dates[:size]
+            for column, old in zip(columns, (self._open, self._high, self._low, self._close, self._volume)):
+                column[:size] = old[:size]
+
+        self._capacity = capacity
+        self._dates = dates
+        self._open, self._high, self._low, self._close, self._volume = columns
+
     def _initXRange(self) -> None:
         if self.isEmpty():
             self._xMax = self.MIN_BAR_COUNT  # the max visible data's index x
@@ -53,7 +173,7 @@ class DataManager():
         else:
             self._xMax = self.lastIndex()
             # self._xMin = max(0, self._xMax - self.MIN_BAR_COUNT)
-            self._xMin = self._data.first_valid_index
+            self._xMin = 0
 
     def setAsset(self, assetName: str = None, 
                     chartInterval: ChartInterval = None,
@@ -106,9 +226,7 @@ class DataManager():
                 asset = Asset(assetName)
                 logger.debug(f"DataManager:: setAsset() :: assetName is {assetName}")
 
-                self._data = asset.getMarketData(chartInterval, period)
-                # print(f"self._data is {self._data}")
-                self._formatData()
+                self.setData(asset.getMarketData(chartInterval, period))
                 self._initXRange()
                 
                 return True
@@ -119,15 +237,9 @@ class DataManager():
             return False
 
 
-    def _formatData(self, data:DataFrame = None) -> DataFrame:
-        if data is None:
-            if self.isEmpty():
-                return None
-            self._data.reset_index(inplace=True)
-            self._data.rename(columns={"Datetime":"Date"}, inplace=True)
-        else:
-            data.rename(columns={"Datetime":"Date"}, inplace=True)
-            return data
+    def _formatData(self, data:DataFrame) -> DataFrame:
+        data.rename(columns={"Datetime":"Date"}, inplace=True)
+        return data
         
     def setInterval(self, interval: ChartInterval = None) -> bool:
         """
@@ -142,38 +254,104 @@ class DataManager():
             return True
         return False
 
+
+    def _writeRows(self, start: int, data: DataFrame) -> None:
+        """
+        write the rows of data into the arrays from index start.
+        bars after the written rows are dropped.
+        """
+        count: int = len(data.index)
+        size: int = start + count
+
+        if size > self._capacity:
+            capacity: int = max(self._capacity, self.INIT_CAPACITY)
+            while capacity < size:
+                capacity *= 2
+            self._allocate(capacity)
+
+        if count:
+            high: np.ndarray = data['High'].to_numpy(dtype=float)
+            low: np.ndarray = data['Low'].to_numpy(dtype=float)
+            volume: np.ndarray = data['Volume'].to_numpy(dtype=float)
+
+            self._dates[start:size] = data['Date'].to_numpy(dtype=object)
+            self._open[start:size] = data['Open'].to_numpy(dtype=float)
+            self._high[start:size] = high
+            self._low[start:size] = low
+            self._close[start:size] = data['Close'].to_numpy(dtype=float)
+            self._volume[start:size] = volume
+
+            self._high_tree.setValues(start, high, size)
+            self._low_tree.setValues(start, low, size)
+            self._volume_max_tree.setValues(start, volume, size)
+            self._volume_min_tree.setValues(start, volume, size)
+
+        self._truncate(size)
+
+    def _truncate(self, size: int) -> None:
+        """
+        drop the bars from index size.
+        """
+        if size < self._size:
+            self._dates[size:self._size] = None
+            for tree in (self._high_tree, self._low_tree, self._volume_max_tree, self._volume_min_tree):
+                tree.clear(size, self._size)
+
+        self._size = size
+
+    def _mergeRows(self, data: DataFrame) -> None:
+        """
+        merge bars not following the last bar (older or unsorted ones)
+        by rebuilding all the arrays.
+        """
+        merged: DataFrame = pd.concat([self.getData(), data], ignore_index=True)
+        merged.drop_duplicates(subset='Date', keep= "last", inplace= True)
+        merged.sort_values(by=['Date'], inplace= True)
+        merged.reset_index(inplace=True, drop=True)
+
+        self._writeRows(0, merged)
+
     def getDateTime(self, index: int) -> datetime:
         """
-        get the datetime value for index=index in datas (DataFrame)
+        get the datetime value for index=index in datas
         return a datetime object
         """
         if index is None:
             return None
         index = int(index)
 
-        if self._data is None or self._data.empty or index not in self._data.index:
+        if not 0 <= index < self._size:
             return None
         else:
-            date = self._data.loc[index]['Date']
+            date = self._dates[index]
             if isinstance(date, Timestamp):
                 date = datetime.fromtimestamp(date.timestamp())
-            # date: datetime = datetime.strptime(self._data.loc[index]['Date'], "%Y%m%d %H:%M:%S")
             return date
-        
+
     def getData(self) -> DataFrame:
-        return self._data
+        """
+        all the bars as a DataFrame (built from the arrays).
+        """
+        size: int = self._size
+        return DataFrame({
+            'Date': self._dates[:size],
+            'Open': self._open[:size],
+            'High': self._high[:size],
+            'Low': self._low[:size],
+            'Close': self._close[:size],
+            'Volume': self._volume[:size],
+            'Symbol': self._assetName,
+        })
     
     def setData(self, data: DataFrame = None) -> bool:
         """
         change the data to a new specified DataFrame
         """
         if data is not None and isinstance(data, DataFrame):
-            self._data = data
-            self._formatData()
+            data = self._formatData(data.reset_index())
+            self._writeRows(0, data)
             return True
         return False
-            
-        pass
 
     def update_history(self, data: DataFrame) -> None:
         """
@@ -185,16 +363,27 @@ class DataManager():
     def update_bar(self, data: DataFrame) -> None:
         """
         Update one single bar data.
+        bars newer than the last bar are appended, a bar with the same
+        datetime as the last bar updates it in place.
         """
         logger.debug(f"here in DataManager:: update_bar:: {len(data)}")
         if isinstance(data, DataFrame) and not data.empty:
             data = self._formatData(data)
-            self._data = pd.concat([self._data, data], ignore_index=True)
-            self._data.drop_duplicates(subset='Date', keep= "last", inplace= True)
+            dates: list = data['Date'].tolist()
+
+            start: int = self._size
+            if self._size:
+                last = self._dates[self._size - 1]
+                if dates[0] == last:
+                    start -= 1
+                elif dates[0] < last:
+                    start = None
+
+            if start is not None and all(a < b for a, b in zip(dates, dates[1:])):
+                self._writeRows(start, data)
+            else:
+                self._mergeRows(data)
 
-            logger.debug(f"DataManager:: update_bar ...... \n {self._data['Date']}")
-            self._data.sort_values(by=['Date'], inplace= True)
-            self._data.reset_index(inplace=True, drop=True)
             self._assetName = data.at[data.first_valid_index(),'Symbol']
 
             self._initXRange()
@@ -204,7 +393,7 @@ class DataManager():
 
         if isinstance(data, DataFrame) and not data.empty:
             data = self._formatData(data)
-            self._data = concat([self._data, data], ignore_index=True)
+            self._writeRows(self._size, data)
             return True
         return False
 
@@ -216,9 +405,9 @@ class DataManager():
         """
         if data is None:
             if Head:
-                self._data = self._data.drop([0])
+                self._writeRows(0, self.getData().iloc[1:].reset_index(drop=True))
             else:
-                self._data = self._data.drop([self._data.last_valid_index()])
+                self._truncate(max(self._size - 1, 0))
         else:
             # if self.data.isin(data):
             #     self.data.drop()
@@ -226,12 +415,18 @@ class DataManager():
 
     def get_index(self, bar: DataFrame) -> int|None:
         """ get index by a bar data (Dataframe). get the index by the datetime."""
-        if bar is not None and isinstance(bar, DataFrame) and not bar.empty:
+        if bar is not None and isinstance(bar, DataFrame) and not bar.empty and self._size:
             try:
+                date = bar.at[bar.first_valid_index(), 'Date']
 
-                index = self._data[self._data['Date'] == bar.at[bar.first_valid_index(), 'Date']].first_valid_index()
+                # streamed bars are mostly the last one
+                index: int = self._size - 1
+                if self._dates[index] != date:
+                    index = bisect_left(self._dates, date, 0, self._size)
 
-                return index
+                if index < self._size and self._dates[index] == date:
+                    return index
+                return None
             except Exception as e:
                 return None
             
@@ -239,13 +434,61 @@ class DataManager():
         """
         get a record in the DataFrame by it's index
         """
-        if isinstance(index, int) and self._data is not None and index in self._data.index:
-            data = self._data.iloc[[index]]
-            # data = data.reindex(index=[index])
+        if isinstance(index, int) and 0 <= index < self._size:
+            data = DataFrame({
+                'Date': self._dates[index],
+                'Open': self._open[index],
+                'High': self._high[index],
+                'Low': self._low[index],
+                'Close': self._close[index],
+                'Volume': self._volume[index],
+                'Symbol': self._assetName,
+            }, index=[index])
             return data
         else:
             return None
 
+    def getBar(self, index: int) -> Tuple[float, float, float, float, float]|None:
+        """
+        get open, high, low, close and volume of a bar by it's index
+        """
+        if index is not None and 0 <= index < self._size:
+            return (
+                float(self._open[index]),
+                float(self._high[index]),
+                float(self._low[index]),
+                float(self._close[index]),
+                float(self._volume[index]),
+            )
+        return None
+
+    def getAggregatedBars(self, min_ix: int, max_ix: int, step: int) -> Tuple[np.ndarray, ...]:
+        """
+        aggregate bars within [min_ix, max_ix) by every step bars.
+        groups are aligned to multiples of step so they stay the same while
+        scrolling. return x (center index), open, high, low, close and the
+        max volume of each group.
+        """
+        min_ix = max(int(min_ix), 0)
+        max_ix = min(int(max_ix), self._size)
+        if max_ix <= min_ix:
+            empty: np.ndarray = np.empty(0)
+            return empty, empty, empty, empty, empty, empty
+
+        starts: np.ndarray = np.arange(min_ix - min_ix % step, max_ix, step)
+        starts[0] = min_ix
+        ends: np.ndarray = np.append(starts[1:], max_ix)
+        offsets: np.ndarray = starts - min_ix
+
+        x: np.ndarray = (starts + ends - 1) / 2
+        open_price: np.ndarray = self._open[starts]
+        close_price: np.ndarray = self._close[ends - 1]
+        high_price: np.ndarray = np.maximum.reduceat(self._high[min_ix:max_ix], offsets)
+        low_price: np.ndarray = np.minimum.reduceat(self._low[min_ix:max_ix], offsets)
+        volume: np.ndarray = np.maximum.reduceat(self._volume[min_ix:max_ix], offsets)
+
+        return x, open_price, high_price, low_price, close_price, volume
+
     def getXMax(self) -> int:
         """
         get the max x index in the current visible scope
@@ -254,7 +497,7 @@ class DataManager():
 
     def setXMax(self, max) -> bool:
         
-        if self._data is not None and isinstance(max, int) and max < len(self._data.index):
+        if isinstance(max, int) and max < self._size:
             self._xMax = max
             return True
         else:
@@ -270,47 +513,48 @@ class DataManager():
         """
         the min visible data's index x
         """
-        if self._data is not None and isinstance(min, int) and (0 <= min < len(self._data.index)):
+        if isinstance(min, int) and (0 <= min < self._size):
             self._xMin = min
             return True
         else:
             return False
 
+    def _getRange(self, min_ix: int = None, max_ix: int = None) -> Tuple[int, int]:
+        """
+        index range [min_ix, max_ix) to query, the whole data
+        if none of the min_ix and max_ix provided
+        """
+        if not min_ix or not max_ix:
+            return 0, self._size
+
+        min_ix: int = int(min_ix)
+        max_ix: int = int(max_ix)
+        if min_ix > max_ix:
+            min_ix, max_ix = max_ix, min_ix
+
+        min_ix = min(max(min_ix, 0), self._size - 1)
+        max_ix = min(max(max_ix, min_ix + 1), self._size)
+        return min_ix, max_ix
+
     def getYRange(self, min_ix: int = None, max_ix: int = None) -> Tuple[float, float]:
         """
         get the min and max Y within the index of min_ix to max_ix
         return the whole range of price Y if none of the min_ix and max_ix provided
         return 0,1 if there is no data in the datamanager.
         """
-        # print(f"min_ix is {min_ix} \n")
-        # print(f"max_ix is {max_ix} \n")
         if self.isEmpty():
             return 0, 1
         logger.debug(f"Datamanager:: getYRange:: =====================\n"+
                     f"{min_ix=} and {max_ix=}")
-        if not min_ix or not max_ix:
-            min_ix: int = 0
-            max_ix: int = self.getTotalDataNum() - 1
-        else:
-            min_ix: int = int(min_ix)
-            max_ix: int = int(max_ix)
-            max_ix = min(max_ix, self.getTotalDataNum())
-        if min_ix > max_ix:
-            i = min_ix
-            min_ix = max_ix
-            max_ix = i
-        
-        if min_ix in self._data.index and max_ix in self._data.index:
-            # print(self._data)
-            data = self._data[min_ix:max_ix]
-            miny = data['Low'].min()
+        min_ix, max_ix = self._getRange(min_ix, max_ix)
 
-            maxy = data['High'].max()
-            margin = (maxy - miny) * (self._yMarginPercent)
-            miny -= margin
-            maxy += margin
+        miny = self._low_tree.query(min_ix, max_ix)
+        maxy = self._high_tree.query(min_ix, max_ix)
+        margin = (maxy - miny) * (self._yMarginPercent)
+        miny -= margin
+        maxy += margin
 
-            return (miny, maxy)
+        return (miny, maxy)
 
     def getVolumeRange(self, min_ix: int = None, max_ix: int = None) -> Tuple[float, float]:
         """
@@ -318,38 +562,22 @@ class DataManager():
         return the whole range of volume if none of the min_ix and max_ix provided
         return 0,1 if there is no data in the datamanager.
         """
-        # print(f"min_ix is {min_ix} \n")
-        # print(f"max_ix is {max_ix} \n")
         if self.isEmpty():
             return 0, 1
 
-        if not min_ix or max_ix:
-            min_ix: int = 0
-            max_ix: int = self.getTotalDataNum() - 1
-        else:
-            min_ix: int = int(min_ix)
-            max_ix: int = int(max_ix)
-            max_ix = min(max_ix, self.getTotalDataNum())
+        min_ix, max_ix = self._getRange(min_ix, max_ix)
 
-        if min_ix > max_ix:
-            i = min_ix
-            min_ix = max_ix
-            max_ix = i
+        min = self._volume_min_tree.query(min_ix, max_ix)
+        max = self._volume_max_tree.query(min_ix, max_ix)
 
-        if min_ix in self._data.index and max_ix in self._data.index:
-            data = self._data[min_ix:max_ix]
-            # print(data)
-            min = data['Volume'].min()
-            max = data['Volume'].max() 
-
-            return (min, max)
+        return (min, max)
 
     def lastIndex(self) -> int:
         """
-        return the last element's index in the data list (DataFrame)
+        return the last element's index in the data list
         """
         if not self.isEmpty():
-            return self._data.last_valid_index()
+            return self._size - 1
         
         return None
     
@@ -359,31 +587,24 @@ class DataManager():
 
     def getTotalDataNum(self) -> int:
         """
-        return the total rows (records) in the Dataframe.
+        return the total rows (records) in the data.
         return 0 if the data is empty now.
         """
-        if not self.isEmpty():
-            return len(self._data.index)
-        else:
-            return 0
+        return self._size
 
     def clearAll(self) -> None:
         """
-        drop all _data in the dataframe
+        drop all the data
         """
-        if not self.isEmpty():
-            self._data.drop(self._data.index, inplace=True)
+        self._truncate(0)
         self.setXMax(0)
         self.setXMin(0)
 
     def isEmpty(self) -> bool:
         """
-        return True if the _data is None or is empty
+        return True if there is no data
         """
-        if self._data is None or self._data.empty:
-            return True
-
-        return False
+        return self._size == 0
     
 
 class ChartBase(pg.GraphicsObject):
@@ -397,7 +618,10 @@ class ChartBase(pg.GraphicsObject):
         self._dataManager: DataManager = dataManager
         self.picture = QtGui.QPicture()
 
-        self._bar_picutures: Dict[int, QtGui.QPicture] = {}
+        # pictures of single bars, least recently used ones are dropped
+        self._bar_picutures: OrderedDict[int, QtGui.QPicture] = OrderedDict()
+        self._max_bar_pictures: int = Aiconfig.get("MAX_BAR_PICTURES")
+        self._bar_num: int = 0
         self._initBarPictures()
 
         self._item_picuture: QtGui.QPicture = None
@@ -430,11 +654,10 @@ class ChartBase(pg.GraphicsObject):
         else:
             barNum = max(barNum, self._dataManager.getTotalDataNum())
 
-        if self._bar_picutures is not None and len(self._bar_picutures) > 0:
-            print(f"{self._bar_picutures=} and {len(self._bar_picutures)=}")
-            barNum = max(barNum, len(self._bar_picutures))
+        barNum = max(barNum, self._bar_num)
 
-        self._bar_picutures = {n:None for n in range(barNum)}
+        self._bar_num = barNum
+        self._bar_picutures.clear()
 
     def generate_picture(self):
         """
@@ -452,8 +675,7 @@ class ChartBase(pg.GraphicsObject):
 
         bars = self._dataManager.getTotalDataNum()
         logger.debug(f"in chartbase:: update_history:: {bars=} ......")
-        for ix in range(bars):
-            self._bar_picutures[ix] = None
+        self._bar_num = bars
 
         # min_x = 0
         # max_x = bars-1
@@ -469,8 +691,11 @@ class ChartBase(pg.GraphicsObject):
         """
         if bar is not None and isinstance(bar, DataFrame) and not bar.empty:
             ix: int = self._dataManager.get_index(bar)
+            if ix is None:
+                return
 
-            self._bar_picutures[ix] = None
+            self._bar_picutures.pop(ix, None)
+            self._bar_num = max(self._bar_num, ix + 1)
 
             self.update()
 
@@ -511,6 +736,7 @@ class ChartBase(pg.GraphicsObject):
         """
         self._item_picuture = None
         self._bar_picutures.clear()
+        self._bar_num = 0
         logger.debug(f"chartbase:clearAll:: self.bar_pictures is {self._bar_picutures}")
         self.update()
 
@@ -518,7 +744,7 @@ class ChartBase(pg.GraphicsObject):
             self._dataManager: DataManager = dataManager
             self.picture = QtGui.QPicture()
 
-            self._bar_picutures: Dict[int, QtGui.QPicture] = {}
+            self._bar_num = 0
             self._initBarPictures()
 
             self._item_picuture: QtGui.QPicture = None
@@ -563,9 +789,9 @@ class ChartBase(pg.GraphicsObject):
 
         min_ix: int = int(rect.left())
         max_ix: int = int(rect.right())
-        max_ix: int = min(max_ix, len(self._bar_picutures))
+        max_ix: int = min(max_ix, self._bar_num)
         logger.debug(f"ChartBase::Paint:: min_ix = {min_ix} and max_ix = {max_ix}")
-        rect_area: tuple = (min_ix, max_ix)
+        rect_area: tuple = (min_ix, max_ix, self._getLodStep())
         if (
             self._to_update
             or rect_area != self._rect_area
@@ -586,20 +812,42 @@ class ChartBase(pg.GraphicsObject):
         self._item_picuture = QtGui.QPicture()
         painter: QtGui.QPainter = QtGui.QPainter(self._item_picuture)
 
-        for ix in range(min_ix, max_ix):
-            # logger.info(f"chartbase:: _drawItemPicture:: enter for loop {len(self._bar_picutures)}")
-            bar_picture: QtGui.QPicture = self._bar_picutures[ix]
-            
-            if bar_picture is None:
-                # bar:DataFrame  = self._dataManager.getByIndex(ix)
-                # logger.info(f"chartbase:: _drawItemPicture:: before _drawBarPicture ")
-                bar_picture = self._drawBarPicture(ix)
-                self._bar_picutures[ix] = bar_picture
-
-            bar_picture.play(painter)
+        # more bars than pixels, draw one aggregated bar per pixel column
+        step: int = self._getLodStep()
+        if step > 1:
+            self._drawAggregatedPicture(painter, min_ix, max_ix, step)
+        else:
+            for ix in range(min_ix, max_ix):
+                self._getBarPicture(ix).play(painter)
 
         painter.end()        
 
+    def _getBarPicture(self, ix: int) -> QtGui.QPicture:
+        """
+        get the picture of a bar from the LRU cache, draw it if not cached.
+        """
+        bar_picture: QtGui.QPicture = self._bar_picutures.get(ix, None)
+
+        if bar_picture is None:
+            bar_picture = self._drawBarPicture(ix)
+            self._bar_picutures[ix] = bar_picture
+
+            if len(self._bar_picutures) > self._max_bar_pictures:
+                self._bar_picutures.popitem(last=False)
+        else:
+            self._bar_picutures.move_to_end(ix)
+
+        return bar_picture
+
+    def _getLodStep(self) -> int:
+        """
+        number of bars within one pixel column, 1 if bars are wider than a pixel.
+        """
+        pixel_width: float = self.pixelWidth()
+        if pixel_width <= 1:
+            return 1
+        return int(ceil(pixel_width))
+
     @abstractmethod
     def _drawBarPicture(self, ix: int) -> QtGui.QPicture:
         """
@@ -607,6 +855,13 @@ class ChartBase(pg.GraphicsObject):
         """
         pass
 
+    @abstractmethod
+    def _drawAggregatedPicture(self, painter: QtGui.QPainter, min_ix: int, max_ix: int, step: int) -> None:
+        """
+        Draw bars in range aggregated by every step bars.
+        """
+        pass
+
     @abstractmethod
     def boundingRect(self):
         """ 
@@ -632,13 +887,9 @@ class Candlestick:
         self._dataManager = dataManager
         self._index_x: int = index
         self.dateTime = self._dataManager.getDateTime(index)
-        data = self._dataManager.getByIndex(index)
-        if data is not None:
-            self.open = data.at[index, 'Open']
-            self.close = data.at[index, 'Close']
-            self.high = data.at[index, 'High']
-            self.low = data.at[index, 'Low']
-            self.volume = data.at[index, 'Volume']
+        bar = self._dataManager.getBar(index)
+        if bar is not None:
+            self.open, self.high, self.low, self.close, self.volume = bar
 
 
 class CandlestickItems(ChartBase):
@@ -667,7 +918,8 @@ class CandlestickItems(ChartBase):
         """
         data_len = self._dataManager.getTotalDataNum()
         logger.debug(f"data_len in Candlestickitems is {data_len}")
-        min_x = 0
+        # only the latest bars are visible at first, the rest is drawn when painted.
+        min_x = max(0, data_len - self.max_candle)
         max_x = data_len-1
 
         self._drawItemPicture(min_x, max_x)
@@ -705,7 +957,7 @@ class CandlestickItems(ChartBase):
         rect: QtCore.QRectF = QtCore.QRectF(
             0,
             min_price,
-            len(self._bar_picutures)+10,
+            self._bar_num+10,
             # x_range +10,
             max_price - min_price
         )
@@ -736,26 +988,44 @@ class CandlestickItems(ChartBase):
         candle_picture: QtGui.QPicture = QtGui.QPicture()
         p: QtGui.QPainter = QtGui.QPainter(candle_picture)
 
-        data = self._dataManager.getByIndex(index_x)
-        logger.debug(f"candlestickitems:: _drawBarpictures:: {data=}")
-        if data is not None and not data.empty:
+        bar = self._dataManager.getBar(index_x)
+        logger.debug(f"candlestickitems:: _drawBarpictures:: {bar=}")
+        if bar is not None:
+            open_price, high_price, low_price, close_price, _ = bar
             w = self._candle_width
 
-            if data.at[index_x, 'Open'] > data.at[index_x, 'Close']:
+            if open_price > close_price:
                 p.setBrush(self._down_brush)
                 p.setPen(self._down_pen)
             else:
                 p.setBrush(self._up_brush)
                 p.setPen(self._up_pen)
 
-            p.drawLine(QtCore.QPointF(index_x, data.at[index_x, 'Low']), QtCore.QPointF(index_x, data.at[index_x, 'High']))
-            p.drawRect(QtCore.QRectF(index_x-w, data.at[index_x, 'Open'], w * 2, data.at[index_x, 'Close'] - data.at[index_x, 'Open']))
+            p.drawLine(QtCore.QPointF(index_x, low_price), QtCore.QPointF(index_x, high_price))
+            p.drawRect(QtCore.QRectF(index_x-w, open_price, w * 2, close_price - open_price))
         else:
             logger.debug(f"no data find in the datamanager index is {index_x}")
         
         # Finish
         p.end()
         return candle_picture
+
+    def _drawAggregatedPicture(self, painter: QtGui.QPainter, min_ix: int, max_ix: int, step: int) -> None:
+        """
+        Draw one high-low line per pixel column, the candle body is
+        narrower than a pixel at this scale.
+        """
+        x, open_price, high_price, low_price, close_price, _ = self._dataManager.getAggregatedBars(min_ix, max_ix, step)
+        up = open_price <= close_price
+
+        for mask, pen in ((up, self._up_pen), (~up, self._down_pen)):
+            lines: List[QtCore.QLineF] = [
+                QtCore.QLineF(ix, low, ix, high)
+                for ix, low, high in zip(x[mask].tolist(), low_price[mask].tolist(), high_price[mask].tolist())
+            ]
+            if lines:
+                painter.setPen(pen)
+                painter.drawLines(lines)
     
     def get_info_text(self, ix: int) -> str:
         """
@@ -852,6 +1122,22 @@ class VolumeItem(ChartBase):
         painter.end()
         return volume_picture
 
+    def _drawAggregatedPicture(self, painter: QtGui.QPainter, min_ix: int, max_ix: int, step: int) -> None:
+        """
+        Draw the max volume of every pixel column as a line.
+        """
+        x, open_price, _, _, close_price, volume = self._dataManager.getAggregatedBars(min_ix, max_ix, step)
+        up = close_price >= open_price
+
+        for mask, pen in ((up, self._up_pen), (~up, self._down_pen)):
+            lines: List[QtCore.QLineF] = [
+                QtCore.QLineF(ix, 0, ix, v)
+                for ix, v in zip(x[mask].tolist(), volume[mask].tolist())
+            ]
+            if lines:
+                painter.setPen(pen)
+                painter.drawLines(lines)
+
     def boundingRect(self) -> QtCore.QRectF:
         """
         reimplement the method to return the size of the graph.
@@ -860,7 +1146,7 @@ class VolumeItem(ChartBase):
         rect: QtCore.QRectF = QtCore.QRectF(
             0,
             min_volume,
-            len(self._bar_picutures),
+            self._bar_num,
             max_volume - min_volume
         )
         return rect
@@ -15,6 +15,7 @@ import importlib_metadata
 from .uiapp import QtCore, QtGui, QtWidgets
 from constant import Direction, Exchange, Offset, OrderType, _
 from ordermanagement import MainEngine, Event, EventEngine
+from event import UI_LANE
 from importlib import reload, import_module
 
 from constant import (
@@ -280,7 +281,7 @@ class BaseMonitor(QtWidgets.QTableWidget):
         """
         if self.event_type:
             self.signal.connect(self.process_event)
-            self.event_engine.register(self.event_type, self.signal.emit)
+            self.event_engine.register(self.event_type, self.signal.emit, UI_LANE)
 
     def process_event(self, event: Event) -> None:
         """
@@ -870,7 +871,7 @@ class TradingWidget(QtWidgets.QWidget):
     def register_event(self) -> None:
         """"""
         self.signal_tick.connect(self.process_tick_event)
-        self.event_engine.register(EVENT_TICK, self.signal_tick.emit)
+        self.event_engine.register(EVENT_TICK, self.signal_tick.emit, UI_LANE)
 
     def process_tick_event(self, event: Event) -> None:
         """"""
@@ -1265,7 +1266,7 @@ class WatchlistWidget(QtWidgets.QWidget):
         register to listen events.
         """
         self.signal_tick.connect(self.process_tick_event)
-        self.event_engine.register(EVENT_TICK, self.signal_tick.emit)
+        self.event_engine.register(EVENT_TICK, self.signal_tick.emit, UI_LANE)
 
     def process_tick_event(self, event: Event) -> None:
         """"""
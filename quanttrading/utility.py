@@ -102,51 +102,23 @@ def getDuration(start: datetime, end: datetime) -> str:
 
 import pandas as pd
 from pandas import DataFrame, Timestamp
+from barframe import bars_to_dataframe, dataframe_to_bars
 def _wrapBarbyDataFrame(barList: DataFrame, gateway_name:str = "", symbol:str = "", interval: str = "", exchange: Exchange = Exchange.SMART) -> list[BarData]:
     """
-
+    Convert a bar DataFrame into BarData, see barframe.dataframe_to_bars.
     """
-    # dates = bar.date.split()
-    bars:list[BarData] = []
-    if barList is not None and isinstance(barList, DataFrame) and not barList.empty:
-        dateList = barList['Datetime']
-        openList = barList['Open']
-        highList = barList['High']
-        lowList = barList['Low']
-        closeList = barList['Close']
-        volumeList = barList['Volume']
-        for i in range(len(dateList)):
-            stamp: Timestamp = dateList[i]
-            stamp = stamp.tz_convert(get_localzone_name())
-            stampstr  = Timestamp.strftime(stamp, '%Y-%m-%d %X')
-            date = datetime.strptime(stampstr, '%Y-%m-%d %X')
-            # date  = Timestamp.strftime(stamp, '%Y-%m-%d %X')
-            bar: BarData = BarData(gateway_name, symbol, exchange, datetime=date, interval=interval)
-            bar.open_price = openList[i]
-            bar.close_price = closeList[i]
-            bar.high_price = highList[i]
-            bar.low_price = lowList[i]
-            bar.volume = volumeList[i]
-
-            bars.append(bar)
-
-    return bars
+    if barList is None or not isinstance(barList, DataFrame):
+        return []
+    return dataframe_to_bars(barList, gateway_name, symbol, interval, exchange)
 
 
 def _wrapDataFramebyBar(barList: list[BarData]) -> DataFrame:
     """
+    Convert BarData into the chart DataFrame, see barframe.bars_to_dataframe.
     """
-    # dates = bar.date.split()
-    df = DataFrame()
-    if barList is not None and isinstance(barList, list) and len(barList) > 0:
-        for bar in barList:
-            data = {'Date':bar.datetime, 'Open':bar.open_price, 'High':bar.high_price,
-                'Low':bar.low_price, 'Close':bar.close_price, 'Volume':bar.volume, 
-                'Symbol':bar.symbol, 'Gateway':bar.gateway_name, 'vt_symbol': bar.vt_symbol, 'Interval': bar.interval}
-            
-            dataFrame = DataFrame(data=data,index=[0])
-            df = pd.concat([df, dataFrame], ignore_index=True)
-    return df
+    if barList is None or not isinstance(barList, list):
+        return DataFrame()
+    return bars_to_dataframe(barList)
 
 def dateToLocal(date) -> datetime:
         time_str: str = date
@@ -729,6 +701,15 @@ class ArrayManager(object):
     For:
     1. time series container of bar data
     2. calculating technical indicator value
+
+    Bar data is kept in ring buffers of twice the size: every value is
+    written at both i and i + size, so the last size values are always
+    the contiguous view buffer[pos: pos + size]. Update is O(1) instead
+    of shifting the whole arrays.
+
+    Incremental indicators (SmaIndicator, EmaIndicator ...) added with
+    add_indicator are updated with every bar, their value is then read
+    without recalculating over the whole window.
     """
 
     def __init__(self, size: int = 100) -> None:
@@ -737,13 +718,18 @@ class ArrayManager(object):
         self.size: int = size
         self.inited: bool = False
 
-        self.open_array: np.ndarray = np.zeros(size)
-        self.high_array: np.ndarray = np.zeros(size)
-        self.low_array: np.ndarray = np.zeros(size)
-        self.close_array: np.ndarray = np.zeros(size)
-        self.volume_array: np.ndarray = np.zeros(size)
-        self.turnover_array: np.ndarray = np.zeros(size)
-        self.open_interest_array: np.ndarray = np.zeros(size)
+        # Start of the current window in the ring buffers.
+        self.pos: int = 0
+
+        self.open_buffer: np.ndarray = np.zeros(size * 2)
+        self.high_buffer: np.ndarray = np.zeros(size * 2)
+        self.low_buffer: np.ndarray = np.zeros(size * 2)
+        self.close_buffer: np.ndarray = np.zeros(size * 2)
+        self.volume_buffer: np.ndarray = np.zeros(size * 2)
+        self.turnover_buffer: np.ndarray = np.zeros(size * 2)
+        self.open_interest_buffer: np.ndarray = np.zeros(size * 2)
+
+        self.indicators: list["IncrementalIndicator"] = []
 
     def update_bar(self, bar: BarData) -> None:
         """
@@ -753,21 +739,70 @@ class ArrayManager(object):
         if not self.inited and self.count >= self.size:
             self.inited = True
 
-        self.open_array[:-1] = self.open_array[1:]
-        self.high_array[:-1] = self.high_array[1:]
-        self.low_array[:-1] = self.low_array[1:]
-        self.close_array[:-1] = self.close_array[1:]
-        self.volume_array[:-1] = self.volume_array[1:]
-        self.turnover_array[:-1] = self.turnover_array[1:]
-        self.open_interest_array[:-1] = self.open_interest_array[1:]
-
-        self.open_array[-1] = bar.open_price
-        self.high_array[-1] = bar.high_price
-        self.low_array[-1] = bar.low_price
-        self.close_array[-1] = bar.close_price
-        self.volume_array[-1] = bar.volume
-        self.turnover_array[-1] = bar.turnover
-        self.open_interest_array[-1] = bar.open_interest
+        i: int = self.pos
+        j: int = i + self.size
+
+        self.open_buffer[i] = self.open_buffer[j] = bar.open_price
+        self.high_buffer[i] = self.high_buffer[j] = bar.high_price
+        self.low_buffer[i] = self.low_buffer[j] = bar.low_price
+        self.close_buffer[i] = self.close_buffer[j] = bar.close_price
+        self.volume_buffer[i] = self.volume_buffer[j] = bar.volume
+        self.turnover_buffer[i] = self.turnover_buffer[j] = bar.turnover
+        self.open_interest_buffer[i] = self.open_interest_buffer[j] = bar.open_interest
+
+        self.pos = (i + 1) % self.size
+
+        for indicator in self.indicators:
+            indicator.update_bar(bar)
+
+    def add_indicator(self, indicator: "IncrementalIndicator") -> "IncrementalIndicator":
+        """
+        Add an incremental indicator to be updated with every new bar.
+        example: self.sma20 = am.add_indicator(SmaIndicator(20))
+        """
+        self.indicators.append(indicator)
+        return indicator
+
+    def get_window(self, buffer: np.ndarray) -> np.ndarray:
+        """
+        Contiguous view of the last size values in the ring buffer.
+        """
+        return buffer[self.pos: self.pos + self.size]
+
+    @property
+    def open_array(self) -> np.ndarray:
+        """"""
+        return self.get_window(self.open_buffer)
+
+    @property
+    def high_array(self) -> np.ndarray:
+        """"""
+        return self.get_window(self.high_buffer)
+
+    @property
+    def low_array(self) -> np.ndarray:
+        """"""
+        return self.get_window(self.low_buffer)
+
+    @property
+    def close_array(self) -> np.ndarray:
+        """"""
+        return self.get_window(self.close_buffer)
+
+    @property
+    def volume_array(self) -> np.ndarray:
+        """"""
+        return self.get_window(self.volume_buffer)
+
+    @property
+    def turnover_array(self) -> np.ndarray:
+        """"""
+        return self.get_window(self.turnover_buffer)
+
+    @property
+    def open_interest_array(self) -> np.ndarray:
+        """"""
+        return self.get_window(self.open_interest_buffer)
 
     @property
     def open(self) -> np.ndarray:
@@ -1276,6 +1311,218 @@ class ArrayManager(object):
         return k[-1], d[-1]
 
 
+class IncrementalIndicator:
+    """
+    Indicator updated by every new bar in O(1), instead of being
+    recalculated over the whole window of ArrayManager.
+
+    Smoothed indicators (EMA, ATR, RSI) are seeded the same way as talib
+    on the first n values, and then follow the full bar history rather
+    than the fixed window of ArrayManager.
+    """
+
+    def __init__(self, n: int) -> None:
+        """"""
+        self.n: int = n
+        self.count: int = 0
+        self.value: float = np.nan
+
+    @property
+    def inited(self) -> bool:
+        """"""
+        return not np.isnan(self.value)
+
+    def update_bar(self, bar: BarData) -> None:
+        """"""
+        pass
+
+
+class RollingWindow:
+    """
+    Last n values with running sum and sum of squares.
+    Sums are recalculated from the window once per cycle to avoid
+    accumulating floating point error.
+    """
+
+    def __init__(self, n: int) -> None:
+        """"""
+        self.n: int = n
+        self.count: int = 0
+        self.pos: int = 0
+        self.values: np.ndarray = np.zeros(n)
+        self.sum: float = 0
+        self.square_sum: float = 0
+
+    def update(self, value: float) -> None:
+        """"""
+        old: float = self.values[self.pos]
+        self.values[self.pos] = value
+        self.pos = (self.pos + 1) % self.n
+        self.count += 1
+
+        if not self.pos:
+            self.sum = float(self.values.sum())
+            self.square_sum = float(np.dot(self.values, self.values))
+        else:
+            self.sum += value - old
+            self.square_sum += value * value - old * old
+
+    @property
+    def full(self) -> bool:
+        """"""
+        return self.count >= self.n
+
+    @property
+    def mean(self) -> float:
+        """"""
+        return self.sum / self.n
+
+    @property
+    def std(self) -> float:
+        """
+        Population standard deviation, same as talib.STDDEV.
+        """
+        mean: float = self.mean
+        return max(self.square_sum / self.n - mean * mean, 0) ** 0.5
+
+
+class SmaIndicator(IncrementalIndicator):
+    """
+    Simple moving average of close price.
+    """
+
+    def __init__(self, n: int) -> None:
+        """"""
+        super().__init__(n)
+        self.window: RollingWindow = RollingWindow(n)
+
+    def update_bar(self, bar: BarData) -> None:
+        """"""
+        self.count += 1
+        self.window.update(bar.close_price)
+        if self.window.full:
+            self.value = self.window.mean
+
+
+class EmaIndicator(IncrementalIndicator):
+    """
+    Exponential moving average of close price.
+    """
+
+    def __init__(self, n: int) -> None:
+        """"""
+        super().__init__(n)
+        self.alpha: float = 2 / (n + 1)
+        self.total: float = 0
+
+    def update_bar(self, bar: BarData) -> None:
+        """"""
+        self.count += 1
+        price: float = bar.close_price
+
+        if self.count < self.n:
+            self.total += price
+        elif self.count == self.n:
+            self.value = (self.total + price) / self.n
+        else:
+            self.value += self.alpha * (price - self.value)
+
+
+class AtrIndicator(IncrementalIndicator):
+    """
+    Average true range with Wilder smoothing.
+    """
+
+    def __init__(self, n: int) -> None:
+        """"""
+        super().__init__(n)
+        self.pre_close: float = np.nan
+        self.total: float = 0
+
+    def update_bar(self, bar: BarData) -> None:
+        """"""
+        pre_close: float = self.pre_close
+        self.pre_close = bar.close_price
+
+        # True range needs the previous close
+        if np.isnan(pre_close):
+            return
+
+        self.count += 1
+        tr: float = max(bar.high_price, pre_close) - min(bar.low_price, pre_close)
+
+        if self.count < self.n:
+            self.total += tr
+        elif self.count == self.n:
+            self.value = (self.total + tr) / self.n
+        else:
+            self.value = (self.value * (self.n - 1) + tr) / self.n
+
+
+class RsiIndicator(IncrementalIndicator):
+    """
+    Relative strength index with Wilder smoothing.
+    """
+
+    def __init__(self, n: int) -> None:
+        """"""
+        super().__init__(n)
+        self.pre_close: float = np.nan
+        self.avg_gain: float = 0
+        self.avg_loss: float = 0
+
+    def update_bar(self, bar: BarData) -> None:
+        """"""
+        pre_close: float = self.pre_close
+        self.pre_close = bar.close_price
+
+        if np.isnan(pre_close):
+            return
+
+        self.count += 1
+        change: float = bar.close_price - pre_close
+        gain: float = max(change, 0)
+        loss: float = max(-change, 0)
+
+        if self.count <= self.n:
+            self.avg_gain += gain / self.n
+            self.avg_loss += loss / self.n
+            if self.count < self.n:
+                return
+        else:
+            self.avg_gain = (self.avg_gain * (self.n - 1) + gain) / self.n
+            self.avg_loss = (self.avg_loss * (self.n - 1) + loss) / self.n
+
+        total: float = self.avg_gain + self.avg_loss
+        self.value = 100 * self.avg_gain / total if total else 0
+
+
+class BollIndicator(IncrementalIndicator):
+    """
+    Bollinger channel of close price, value is the middle line.
+    """
+
+    def __init__(self, n: int, dev: float) -> None:
+        """"""
+        super().__init__(n)
+        self.dev: float = dev
+        self.window: RollingWindow = RollingWindow(n)
+        self.up: float = np.nan
+        self.down: float = np.nan
+
+    def update_bar(self, bar: BarData) -> None:
+        """"""
+        self.count += 1
+        self.window.update(bar.close_price)
+        if not self.window.full:
+            return
+
+        self.value = self.window.mean
+        width: float = self.window.std * self.dev
+        self.up = self.value + width
+        self.down = self.value - width
+
+
 def virtual(func: Callable) -> Callable:
     """
     mark a function as "virtual", which means that this function can be override.
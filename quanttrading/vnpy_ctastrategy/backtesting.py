@@ -1,12 +1,11 @@
 from collections import defaultdict
 from datetime import date, datetime, timedelta
 from typing import Callable, List, Dict, Optional, Type
-from functools import lru_cache, partial
+from functools import partial
 import traceback
 
 import numpy as np
-from pandas import DataFrame, Series
-from pandas.core.window import ExponentialMovingWindow
+from pandas import DataFrame
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 
@@ -17,9 +16,10 @@ from constant import (
     Interval,
     Status
 )
-from database import get_database, BaseDatabase
+from historycache import get_history_cache
 from datatypes import OrderData, TradeData, BarData, TickData
 from utility import round_to, extract_vt_symbol
+from performance import CURVE_COLUMNS, calculate_curve_statistics, get_drawdown_duration
 from optimize import (
     OptimizationSetting,
     check_optimization_setting,
@@ -32,6 +32,7 @@ from .base import (
     EngineType,
     STOPORDER_PREFIX,
     StopOrder,
+    StopOrderBook,
     StopOrderStatus,
     INTERVAL_DELTA_MAP
 )
@@ -75,7 +76,8 @@ class BacktestingEngine:
 
         self.stop_order_count: int = 0
         self.stop_orders: Dict[str, StopOrder] = {}
-        self.active_stop_orders: Dict[str, StopOrder] = {}
+        self.stop_order_book: StopOrderBook = StopOrderBook()
+        self.active_stop_orders: Dict[str, StopOrder] = self.stop_order_book.orders
 
         self.limit_order_count: int = 0
         self.limit_orders: Dict[str, OrderData] = {}
@@ -100,7 +102,7 @@ class BacktestingEngine:
 
         self.stop_order_count = 0
         self.stop_orders.clear()
-        self.active_stop_orders.clear()
+        self.stop_order_book.clear()
 
         self.limit_order_count = 0
         self.limit_orders.clear()
@@ -331,21 +333,18 @@ class BacktestingEngine:
 
         if df is not None:
             # Calculate balance related time series data
-            df["balance"] = df["net_pnl"].cumsum() + self.capital
-
-            # When balance falls below 0, set daily return to 0
-            pre_balance: Series = df["balance"].shift(1)
-            pre_balance.iloc[0] = self.capital
-            x = df["balance"] / pre_balance
-            x[x <= 0] = np.nan
-            df["return"] = np.log(x).fillna(0)
-
-            df["highlevel"] = df["balance"].rolling(min_periods=1, window=len(df), center=False).max()
-            df["drawdown"] = df["balance"] - df["highlevel"]
-            df["ddpercent"] = df["drawdown"] / df["highlevel"] * 100
+            result: dict = calculate_curve_statistics(
+                df["net_pnl"].to_numpy(dtype=np.float64),
+                self.capital,
+                self.annual_days,
+                self.risk_free,
+                self.half_life
+            )
+            for name in CURVE_COLUMNS:
+                df[name] = result[name]
 
             # All balance value needs to be positive
-            positive_balance = (df["balance"] > 0).all()
+            positive_balance = result["positive_balance"]
             if not positive_balance:
                 self.output(_("回测中出现爆仓（资金小于等于0），无法计算策略统计指标"))
 
@@ -355,22 +354,18 @@ class BacktestingEngine:
             start_date = df.index[0]
             end_date = df.index[-1]
 
-            total_days: int = len(df)
-            profit_days: int = len(df[df["net_pnl"] > 0])
-            loss_days: int = len(df[df["net_pnl"] < 0])
-
-            end_balance = df["balance"].iloc[-1]
-            max_drawdown = df["drawdown"].min()
-            max_ddpercent = df["ddpercent"].min()
-            max_drawdown_end = df["drawdown"].idxmin()
+            total_days: int = result["total_days"]
+            profit_days: int = result["profit_days"]
+            loss_days: int = result["loss_days"]
 
-            if isinstance(max_drawdown_end, date):
-                max_drawdown_start = df["balance"][:max_drawdown_end].idxmax()
-                max_drawdown_duration: int = (max_drawdown_end - max_drawdown_start).days
-            else:
-                max_drawdown_duration: int = 0
+            end_balance = result["end_balance"]
+            max_drawdown = result["max_drawdown"]
+            max_ddpercent = result["max_ddpercent"]
+            max_drawdown_duration: int = get_drawdown_duration(
+                df.index, result["max_drawdown_start"], result["max_drawdown_end"]
+            )
 
-            total_net_pnl: float = df["net_pnl"].sum()
+            total_net_pnl: float = result["total_net_pnl"]
             daily_net_pnl: float = total_net_pnl / total_days
 
             total_commission: float = df["commission"].sum()
@@ -385,27 +380,13 @@ class BacktestingEngine:
             total_trade_count: int = df["trade_count"].sum()
             daily_trade_count: int = total_trade_count / total_days
 
-            total_return: float = (end_balance / self.capital - 1) * 100
-            annual_return: float = total_return / total_days * self.annual_days
-            daily_return: float = df["return"].mean() * 100
-            return_std: float = df["return"].std() * 100
-
-            if return_std:
-                daily_risk_free: float = self.risk_free / np.sqrt(self.annual_days)
-                sharpe_ratio: float = (daily_return - daily_risk_free) / return_std * np.sqrt(self.annual_days)
-
-                ewm_window: ExponentialMovingWindow = df["return"].ewm(halflife=self.half_life)
-                ewm_mean: Series = ewm_window.mean() * 100
-                ewm_std: Series = ewm_window.std() * 100
-                ewm_sharpe: float = ((ewm_mean - daily_risk_free) / ewm_std)[-1] * np.sqrt(self.annual_days)
-            else:
-                sharpe_ratio: float = 0
-                ewm_sharpe: float = 0
-
-            if max_ddpercent:
-                return_drawdown_ratio: float = -total_return / max_ddpercent
-            else:
-                return_drawdown_ratio = 0
+            total_return: float = result["total_return"]
+            annual_return: float = result["annual_return"]
+            daily_return: float = result["daily_return"]
+            return_std: float = result["return_std"]
+            sharpe_ratio: float = result["sharpe_ratio"]
+            ewm_sharpe: float = result["ewm_sharpe"]
+            return_drawdown_ratio: float = result["return_drawdown_ratio"]
 
         # Output
         if output:
@@ -703,7 +684,11 @@ class BacktestingEngine:
             long_best_price = long_cross_price
             short_best_price = short_cross_price
 
-        for stop_order in list(self.active_stop_orders.values()):
+        crossed: List[StopOrder] = self.stop_order_book.get_crossed(
+            self.vt_symbol, long_cross_price, short_cross_price
+        )
+
+        for stop_order in crossed:
             # Check whether stop order can be triggered.
             long_cross: bool = (
                 stop_order.direction == Direction.LONG
@@ -766,8 +751,7 @@ class BacktestingEngine:
             stop_order.vt_orderids.append(order.vt_orderid)
             stop_order.status = StopOrderStatus.TRIGGERED
 
-            if stop_order.stop_orderid in self.active_stop_orders:
-                self.active_stop_orders.pop(stop_order.stop_orderid)
+            self.stop_order_book.remove(stop_order.stop_orderid)
 
             # Push update to strategy.
             self.strategy.on_stop_order(stop_order)
@@ -860,7 +844,7 @@ class BacktestingEngine:
             strategy_name=self.strategy.strategy_name,
         )
 
-        self.active_stop_orders[stop_order.stop_orderid] = stop_order
+        self.stop_order_book.add(stop_order)
         self.stop_orders[stop_order.stop_orderid] = stop_order
 
         return stop_order.stop_orderid
@@ -906,7 +890,7 @@ class BacktestingEngine:
         """"""
         if vt_orderid not in self.active_stop_orders:
             return
-        stop_order: StopOrder = self.active_stop_orders.pop(vt_orderid)
+        stop_order: StopOrder = self.stop_order_book.remove(vt_orderid)
 
         stop_order.status = StopOrderStatus.CANCELLED
         self.strategy.on_stop_order(stop_order)
@@ -1074,7 +1058,6 @@ class DailyResult:
         self.net_pnl = self.total_pnl - self.commission - self.slippage
 
 
-@lru_cache(maxsize=999)
 def load_bar_data(
     symbol: str,
     exchange: Exchange,
@@ -1083,14 +1066,11 @@ def load_bar_data(
     end: datetime
 ) -> List[BarData]:
     """"""
-    database: BaseDatabase = get_database()
-
-    return database.load_bar_data(
+    return get_history_cache().load_bar_data(
         symbol, exchange, interval, start, end
     )
 
 
-@lru_cache(maxsize=999)
 def load_tick_data(
     symbol: str,
     exchange: Exchange,
@@ -1098,9 +1078,7 @@ def load_tick_data(
     end: datetime
 ) -> List[TickData]:
     """"""
-    database: BaseDatabase = get_database()
-
-    return database.load_tick_data(
+    return get_history_cache().load_tick_data(
         symbol, exchange, start, end
     )
 
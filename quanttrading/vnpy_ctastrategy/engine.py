@@ -48,6 +48,7 @@ from .base import (
     EVENT_CTA_STOPORDER,
     EngineType,
     StopOrder,
+    StopOrderBook,
     StopOrderStatus,
     STOPORDER_PREFIX
 )
@@ -88,7 +89,8 @@ class CtaEngine(BaseEngine):
         self.strategy_orderid_map: defaultdict = defaultdict(set)       # strategy_name: orderid set
 
         self.stop_order_count: int = 0                                  # for generating stop_orderid
-        self.stop_orders: Dict[str, StopOrder] = {}                     # stop_orderid: stop_order
+        self.stop_order_book: StopOrderBook = StopOrderBook()            # stop orders by symbol and price
+        self.stop_orders: Dict[str, StopOrder] = self.stop_order_book.orders    # stop_orderid: stop_order
 
         self.init_executor: ThreadPoolExecutor = ThreadPoolExecutor(max_workers=1)
 
@@ -214,68 +216,71 @@ class CtaEngine(BaseEngine):
         self.put_strategy_event(strategy)
 
     def check_stop_order(self, tick: TickData) -> None:
-        """"""
-        for stop_order in list(self.stop_orders.values()):
-            if stop_order.vt_symbol != tick.vt_symbol:
+        """
+        Only stop orders of the tick symbol crossed by last price are
+        checked, long when last_price >= price, short when last_price <= price.
+        """
+        crossed: List[StopOrder] = self.stop_order_book.get_crossed(
+            tick.vt_symbol, tick.last_price, tick.last_price
+        )
+
+        for stop_order in crossed:
+            # Could be cancelled by callback of previous triggered order
+            if stop_order.stop_orderid not in self.stop_order_book:
                 continue
-            
-            long_triggered = (
-                stop_order.direction == Direction.LONG and tick.last_price >= stop_order.price
-            )
-            short_triggered = (
-                stop_order.direction == Direction.SHORT and tick.last_price <= stop_order.price
-            )
 
-            if long_triggered or short_triggered:
-                strategy: CtaTemplate = self.strategies[stop_order.strategy_name]
-
-                # To get excuted immediately after stop order is
-                # triggered, use limit price if available, otherwise
-                # use ask_price_5 or bid_price_5
-                if stop_order.direction == Direction.LONG:
-                    if tick.limit_up:
-                        price = tick.limit_up
-                    else:
-                        price = tick.ask_price_5
+            strategy: CtaTemplate = self.strategies[stop_order.strategy_name]
+
+            # To get excuted immediately after stop order is
+            # triggered, use limit price if available, otherwise
+            # use ask_price_5 or bid_price_5
+            if stop_order.direction == Direction.LONG:
+                if tick.limit_up:
+                    price = tick.limit_up
                 else:
-                    if tick.limit_down:
-                        price = tick.limit_down
-                    else:
-                        price = tick.bid_price_5
-
-                symbol = stop_order.vt_symbol
-                if "." in symbol:
-                    symbol = symbol.split('.')[0]
-                contract: Optional[ContractData] = self.main_engine.get_contract(symbol)
-
-                vt_orderids: list = self.send_limit_order(
-                    strategy,
-                    contract,
-                    stop_order.direction,
-                    stop_order.offset,
-                    price,
-                    stop_order.volume,
-                    stop_order.lock,
-                    stop_order.net
-                )
+                    price = tick.ask_price_5
+            else:
+                if tick.limit_down:
+                    price = tick.limit_down
+                else:
+                    price = tick.bid_price_5
 
-                # Update stop order status if placed successfully
-                if vt_orderids:
-                    # Remove from relation map.
-                    self.stop_orders.pop(stop_order.stop_orderid)
+            symbol = stop_order.vt_symbol
+            if "." in symbol:
+                symbol = symbol.split('.')[0]
+            contract: Optional[ContractData] = self.main_engine.get_contract(symbol)
 
-                    strategy_vt_orderids: set = self.strategy_orderid_map[strategy.strategy_name]
-                    if stop_order.stop_orderid in strategy_vt_orderids:
-                        strategy_vt_orderids.remove(stop_order.stop_orderid)
+            vt_orderids: list = self.send_limit_order(
+                strategy,
+                contract,
+                stop_order.direction,
+                stop_order.offset,
+                price,
+                stop_order.volume,
+                stop_order.lock,
+                stop_order.net
+            )
 
-                    # Change stop order status to cancelled and update to strategy.
-                    stop_order.status = StopOrderStatus.TRIGGERED
-                    stop_order.vt_orderids = vt_orderids
+            # Keep the stop order waiting if not placed
+            if not vt_orderids:
+                self.stop_order_book.add(stop_order)
+                continue
 
-                    self.call_strategy_func(
-                        strategy, strategy.on_stop_order, stop_order
-                    )
-                    self.put_stop_order_event(stop_order)
+            # Placed successfully, remove from relation map.
+            self.stop_order_book.remove(stop_order.stop_orderid)
+
+            strategy_vt_orderids: set = self.strategy_orderid_map[strategy.strategy_name]
+            if stop_order.stop_orderid in strategy_vt_orderids:
+                strategy_vt_orderids.remove(stop_order.stop_orderid)
+
+            # Change stop order status to cancelled and update to strategy.
+            stop_order.status = StopOrderStatus.TRIGGERED
+            stop_order.vt_orderids = vt_orderids
+
+            self.call_strategy_func(
+                strategy, strategy.on_stop_order, stop_order
+            )
+            self.put_stop_order_event(stop_order)
 
     def send_server_order(
         self,
@@ -416,7 +421,7 @@ class CtaEngine(BaseEngine):
             net=net
         )
 
-        self.stop_orders[stop_orderid] = stop_order
+        self.stop_order_book.add(stop_order)
 
         vt_orderids: set = self.strategy_orderid_map[strategy.strategy_name]
         vt_orderids.add(stop_orderid)
@@ -448,7 +453,7 @@ class CtaEngine(BaseEngine):
         strategy: CtaTemplate = self.strategies[stop_order.strategy_name]
 
         # Remove from relation map.
-        self.stop_orders.pop(stop_orderid)
+        self.stop_order_book.remove(stop_orderid)
 
         vt_orderids: set = self.strategy_orderid_map[strategy.strategy_name]
         if stop_orderid in vt_orderids:
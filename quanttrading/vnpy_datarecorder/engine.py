@@ -89,7 +89,9 @@ class RecorderEngine(BaseEngine):
                 task_type, data = task
 
                 if task_type == "tick":
-                    self.database.save_one_tick_data(data, stream=True)
+                    # Merge tick tasks already waiting into one bulk save
+                    data = data + self.drain_tick_tasks()
+                    self.database.save_tick_data_bulk(data)
                 elif task_type == "bar":
                     self.database.save_bar_data(data, stream=True)
 
@@ -103,6 +105,25 @@ class RecorderEngine(BaseEngine):
                 event: Event = Event(EVENT_RECORDER_EXCEPTION, info)
                 self.event_engine.put(event)
 
+    def drain_tick_tasks(self) -> list:
+        """
+        Take all the tick tasks waiting in the queue. Bar tasks met on
+        the way are saved right away.
+        """
+        ticks: list = []
+        while True:
+            try:
+                task: object = self.queue.get_nowait()
+            except Empty:
+                break
+
+            task_type, data = task
+            if task_type == "tick":
+                ticks.extend(data)
+            else:
+                self.database.save_bar_data(data, stream=True)
+        return ticks
+
     def close(self) -> None:
         """"""
         self.active = False
@@ -196,11 +217,14 @@ class RecorderEngine(BaseEngine):
         self.write_log(f"移除Tick记录成功：{vt_symbol}")
 
     def register_event(self) -> None:
-        """"""
-        self.event_engine.register(EVENT_TIMER, self.process_timer_event)
-        self.event_engine.register(EVENT_TICK, self.process_tick_event)
-        self.event_engine.register(EVENT_CONTRACT, self.process_contract_event)
-        self.event_engine.register(EVENT_SPREAD_DATA, self.process_spread_event)
+        """
+        Recorder handlers run on their own lane, every tick is kept.
+        """
+        self.event_engine.add_lane(APP_NAME, coalesce=False)
+        self.event_engine.register(EVENT_TIMER, self.process_timer_event, APP_NAME)
+        self.event_engine.register(EVENT_TICK, self.process_tick_event, APP_NAME)
+        self.event_engine.register(EVENT_CONTRACT, self.process_contract_event, APP_NAME)
+        self.event_engine.register(EVENT_SPREAD_DATA, self.process_spread_event, APP_NAME)
 
     def update_tick(self, tick: TickData) -> None:
         """"""
@@ -232,7 +256,11 @@ class RecorderEngine(BaseEngine):
             self.queue.put(("bar", bars))
         self.bars.clear()
 
-        for ticks in self.ticks.values():
+        # Ticks of all symbols are saved in one bulk insert
+        ticks: list = []
+        for symbol_ticks in self.ticks.values():
+            ticks.extend(symbol_ticks)
+        if ticks:
             self.queue.put(("tick", ticks))
         self.ticks.clear()
 
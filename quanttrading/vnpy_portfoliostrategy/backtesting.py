@@ -1,7 +1,10 @@
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import date, datetime, timedelta
+from pathlib import Path
+from threading import Lock
 from typing import Optional
-from functools import lru_cache, partial
+from functools import partial
 from copy import copy
 import traceback
 
@@ -11,9 +14,9 @@ from plotly.subplots import make_subplots
 from pandas import DataFrame
 
 from vnpy.trader.constant import Direction, Offset, Interval, Status
-from vnpy.trader.database import get_database, BaseDatabase
+from vnpy.trader.database import get_database, DB_TZ
 from vnpy.trader.object import OrderData, TradeData, BarData
-from vnpy.trader.utility import round_to, extract_vt_symbol
+from vnpy.trader.utility import round_to, extract_vt_symbol, get_folder_path
 from vnpy.trader.optimize import (
     OptimizationSetting,
     check_optimization_setting,
@@ -21,8 +24,17 @@ from vnpy.trader.optimize import (
     run_ga_optimization
 )
 
+from performance import (
+    CURVE_COLUMNS,
+    RETURN_PREVIOUS,
+    calculate_curve_statistics,
+    get_drawdown_duration
+)
+from historycache import HistoryCache
+
 from .base import EngineType
 from .locale import _
+from .panel import BarColumns, BarPanel, get_panel_path, load_panel, save_panel
 from .template import StrategyTemplate
 
 
@@ -54,6 +66,9 @@ class BacktestingEngine:
         self.risk_free: float = 0
         self.annual_days: int = 240
 
+        self.load_workers: int = 8          # 并发加载历史数据的线程数
+        self.panel_cache: bool = False      # 是否使用磁盘缓存的面板数据
+
         self.strategy_class: StrategyTemplate = None
         self.strategy: StrategyTemplate = None
         self.bars: dict[str, BarData] = {}
@@ -61,8 +76,15 @@ class BacktestingEngine:
 
         self.interval: Interval = None
         self.days: int = 0
-        self.history_data: dict[tuple, BarData] = {}
-        self.dts: set[datetime] = set()
+        self.history_data: BarPanel = None
+
+        # 回放状态，ix为当前K线在面板中的行号
+        self.ix: int = 0
+        self.seen: np.ndarray = None             # 已有K线的合约
+        self.filled: np.ndarray = None           # 当前使用填充K线的合约
+        self.last_closes: np.ndarray = None      # 各合约最新收盘价
+        self.seen_order: list[int] = []          # 合约首次出现的顺序
+        self.close_date: date = None             # 待更新收盘价的日期
 
         self.limit_order_count: int = 0
         self.limit_orders: dict[str, OrderData] = {}
@@ -105,7 +127,8 @@ class BacktestingEngine:
         capital: int = 0,
         end: datetime = None,
         risk_free: float = 0,
-        annual_days: int = 240
+        annual_days: int = 240,
+        panel_cache: bool = False
     ) -> None:
         """设置参数"""
         self.vt_symbols = vt_symbols
@@ -121,6 +144,7 @@ class BacktestingEngine:
         self.capital = capital
         self.risk_free = risk_free
         self.annual_days = annual_days
+        self.panel_cache = panel_cache
 
     def add_strategy(self, strategy_class: type, setting: dict) -> None:
         """增加策略"""
@@ -141,69 +165,75 @@ class BacktestingEngine:
             return
 
         # 清理上次加载的历史数据
-        self.history_data.clear()
-        self.dts.clear()
-
-        # 每次加载30天历史数据
-        progress_delta: timedelta = timedelta(days=30)
-        total_delta: timedelta = self.end - self.start
-        interval_delta: timedelta = INTERVAL_DELTA_MAP[self.interval]
-
-        for vt_symbol in self.vt_symbols:
-            if self.interval == Interval.MINUTE:
-                start: datetime = self.start
-                end: datetime = self.start + progress_delta
-                progress = 0
-
-                data_count = 0
-                while start < self.end:
-                    end = min(end, self.end)
-
-                    data: list[BarData] = load_bar_data(
-                        vt_symbol,
-                        self.interval,
-                        start,
-                        end
-                    )
-
-                    for bar in data:
-                        self.dts.add(bar.datetime)
-                        self.history_data[(bar.datetime, vt_symbol)] = bar
-                        data_count += 1
-
-                    progress += progress_delta / total_delta
-                    progress = min(progress, 1)
-                    progress_bar = "#" * int(progress * 10)
-                    self.output(_("{}加载进度：{} [{:.0%}]").format(
-                        vt_symbol, progress_bar, progress
-                    ))
-
-                    start = end + interval_delta
-                    end += (progress_delta + interval_delta)
-            else:
-                data: list[BarData] = load_bar_data(
-                    vt_symbol,
-                    self.interval,
-                    self.start,
-                    self.end
-                )
+        self.history_data = None
+
+        # 优先读取磁盘缓存的面板数据
+        if self.panel_cache:
+            overviews: list = []
+            for vt_symbol in self.vt_symbols:
+                symbol, exchange = extract_vt_symbol(vt_symbol)
+                overviews.append(get_history_cache().get_overview((symbol, exchange, self.interval)))
+
+            panel_path: Path = get_panel_path(self.vt_symbols, self.interval, self.start, self.end, overviews)
+            panel: Optional[BarPanel] = load_panel(panel_path)
+            if panel:
+                self.history_data = panel
+                self.output(_("从缓存加载历史数据，时间点数量：{}").format(len(panel)))
+                return
+
+        # 多线程并发加载各合约数据
+        columns: dict[str, BarColumns] = {}
+        total: int = len(self.vt_symbols)
+
+        with ThreadPoolExecutor(max_workers=max(1, min(self.load_workers, total))) as executor:
+            futures: dict = {
+                executor.submit(self.load_symbol_data, vt_symbol): vt_symbol
+                for vt_symbol in self.vt_symbols
+            }
 
-                for bar in data:
-                    self.dts.add(bar.datetime)
-                    self.history_data[(bar.datetime, vt_symbol)] = bar
+            for count, future in enumerate(as_completed(futures), 1):
+                vt_symbol: str = futures[future]
+                columns[vt_symbol] = future.result()
 
-                data_count = len(data)
+                progress: float = count / total
+                progress_bar: str = "#" * int(progress * 10)
+                self.output(_("{}历史数据加载完成，数据量：{}，总进度：{} [{:.0%}]").format(
+                    vt_symbol, len(columns[vt_symbol]), progress_bar, progress
+                ))
 
-            self.output(_("{}历史数据加载完成，数据量：{}").format(vt_symbol, data_count))
+        # 按统一时间轴生成面板数据
+        self.history_data = BarPanel.from_columns(self.vt_symbols, columns, self.interval)
+
+        if self.panel_cache:
+            save_panel(panel_path, self.history_data)
 
         self.output(_("所有历史数据加载完成"))
 
+    def load_symbol_data(self, vt_symbol: str) -> BarColumns:
+        """加载单个合约的历史数据，已缓存的交易日直接从磁盘缓存读取"""
+        array: np.ndarray = load_bar_array(
+            vt_symbol,
+            self.interval,
+            self.start,
+            self.end
+        )
+        return BarColumns.from_array(array, DB_TZ)
+
     def run_backtesting(self) -> None:
         """开始回测"""
         self.strategy.on_init()
 
-        dts: list = list(self.dts)
-        dts.sort()
+        if not self.history_data:
+            self.history_data = BarPanel(self.vt_symbols, [], self.interval)
+
+        dts: list = self.history_data.dts
+
+        symbol_count: int = len(self.history_data.vt_symbols)
+        self.seen = np.zeros(symbol_count, dtype=bool)
+        self.filled = np.zeros(symbol_count, dtype=bool)
+        self.last_closes = np.zeros(symbol_count)
+        self.seen_order = []
+        self.close_date = None
 
         # 使用指定时间的历史数据初始化策略
         day_count: int = 0
@@ -216,7 +246,7 @@ class BacktestingEngine:
                     break
 
             try:
-                self.new_bars(dt)
+                self.new_bars(ix)
             except Exception:
                 self.output(_("触发异常，回测终止"))
                 self.output(traceback.format_exc())
@@ -230,14 +260,16 @@ class BacktestingEngine:
         self.output(_("开始回放历史数据"))
 
         # 使用剩余历史数据进行策略回测
-        for dt in dts[ix:]:
+        for i in range(ix, len(dts)):
             try:
-                self.new_bars(dt)
+                self.new_bars(i)
             except Exception:
                 self.output(_("触发异常，回测终止"))
                 self.output(traceback.format_exc())
+                self.update_daily_close()
                 return
 
+        self.update_daily_close()
         self.output(_("历史数据回放结束"))
 
     def calculate_result(self) -> DataFrame:
@@ -325,14 +357,18 @@ class BacktestingEngine:
 
         # 计算资金相关指标
         if df is not None:
-            df["balance"] = df["net_pnl"].cumsum() + self.capital
-            df["return"] = np.log(df["balance"] / df["balance"].shift(1)).fillna(0)
-            df["highlevel"] = df["balance"].rolling(min_periods=1, window=len(df), center=False).max()
-            df["drawdown"] = df["balance"] - df["highlevel"]
-            df["ddpercent"] = df["drawdown"] / df["highlevel"] * 100
+            result: dict = calculate_curve_statistics(
+                df["net_pnl"].to_numpy(dtype=np.float64),
+                self.capital,
+                self.annual_days,
+                self.risk_free,
+                return_mode=RETURN_PREVIOUS
+            )
+            for name in CURVE_COLUMNS:
+                df[name] = result[name]
 
             # 检查是否发生过爆仓
-            positive_balance = (df["balance"] > 0).all()
+            positive_balance = result["positive_balance"]
             if not positive_balance:
                 self.output(_("回测中出现爆仓（资金小于等于0），无法计算策略统计指标"))
 
@@ -341,22 +377,18 @@ class BacktestingEngine:
             start_date = df.index[0]
             end_date = df.index[-1]
 
-            total_days: int = len(df)
-            profit_days: int = len(df[df["net_pnl"] > 0])
-            loss_days: int = len(df[df["net_pnl"] < 0])
-
-            end_balance = df["balance"].iloc[-1]
-            max_drawdown = df["drawdown"].min()
-            max_ddpercent = df["ddpercent"].min()
-            max_drawdown_end = df["drawdown"].idxmin()
+            total_days: int = result["total_days"]
+            profit_days: int = result["profit_days"]
+            loss_days: int = result["loss_days"]
 
-            if isinstance(max_drawdown_end, date):
-                max_drawdown_start = df["balance"][:max_drawdown_end].idxmax()
-                max_drawdown_duration: int = (max_drawdown_end - max_drawdown_start).days
-            else:
-                max_drawdown_duration: int = 0
+            end_balance = result["end_balance"]
+            max_drawdown = result["max_drawdown"]
+            max_ddpercent = result["max_ddpercent"]
+            max_drawdown_duration: int = get_drawdown_duration(
+                df.index, result["max_drawdown_start"], result["max_drawdown_end"]
+            )
 
-            total_net_pnl: float = df["net_pnl"].sum()
+            total_net_pnl: float = result["total_net_pnl"]
             daily_net_pnl: float = total_net_pnl / total_days
 
             total_commission: float = df["commission"].sum()
@@ -371,18 +403,16 @@ class BacktestingEngine:
             total_trade_count: int = df["trade_count"].sum()
             daily_trade_count: int = total_trade_count / total_days
 
-            total_return: float = (end_balance / self.capital - 1) * 100
-            annual_return: float = total_return / total_days * self.annual_days
-            daily_return: float = df["return"].mean() * 100
-            return_std: float = df["return"].std() * 100
+            total_return: float = result["total_return"]
+            annual_return: float = result["annual_return"]
+            daily_return: float = result["daily_return"]
+            return_std: float = result["return_std"]
+            sharpe_ratio: float = result["sharpe_ratio"]
 
-            if return_std:
-                daily_risk_free: float = self.risk_free / np.sqrt(self.annual_days)
-                sharpe_ratio: float = (daily_return - daily_risk_free) / return_std * np.sqrt(self.annual_days)
+            if max_drawdown:
+                return_drawdown_ratio: float = -total_net_pnl / max_drawdown
             else:
-                sharpe_ratio: float = 0
-
-            return_drawdown_ratio: float = -total_net_pnl / max_drawdown
+                return_drawdown_ratio = 0
 
         # 输出结果
         if output:
@@ -554,13 +584,17 @@ class BacktestingEngine:
 
         return results
 
-    def update_daily_close(self, bars: dict[str, BarData], dt: datetime) -> None:
-        """更新每日收盘价"""
-        d: date = dt.date()
+    def update_daily_close(self) -> None:
+        """更新每日收盘价，使用当日最后一根K线后的各合约收盘价"""
+        d: date = self.close_date
+        if not d:
+            return
+        self.close_date = None
 
-        close_prices: dict = {}
-        for bar in bars.values():
-            close_prices[bar.vt_symbol] = bar.close_price
+        vt_symbols: list[str] = self.history_data.vt_symbols
+        close_prices: dict = {
+            vt_symbols[j]: float(self.last_closes[j]) for j in self.seen_order
+        }
 
         daily_result: Optional[PortfolioDailyResult] = self.daily_results.get(d, None)
 
@@ -569,41 +603,52 @@ class BacktestingEngine:
         else:
             self.daily_results[d] = PortfolioDailyResult(d, close_prices)
 
-    def new_bars(self, dt: datetime) -> None:
+    def new_bars(self, ix: int) -> None:
         """历史数据推送"""
+        panel: BarPanel = self.history_data
+        dt: datetime = panel.dts[ix]
+
+        # 日期切换时更新上一日收盘价
+        if self.close_date and dt.date() != self.close_date:
+            self.update_daily_close()
+
         self.datetime = dt
+        self.ix = ix
+
+        mask: np.ndarray = panel.mask[ix]
+
+        # 缓存K线数据以供strategy.on_bars更新，并更新K线以供委托撮合
+        bars: dict[str, BarData] = panel.get_bars(ix)
+        self.bars.update(bars)
+
+        # 如果获取不到，但已有合约数据缓存, 使用之前的收盘价填充，缺失期间只需填充一次
+        for j in np.flatnonzero(self.seen & ~mask & ~self.filled).tolist():
+            vt_symbol: str = panel.vt_symbols[j]
+            old_bar: BarData = self.bars[vt_symbol]
+
+            bar: BarData = BarData(
+                symbol=old_bar.symbol,
+                exchange=old_bar.exchange,
+                datetime=dt,
+                open_price=old_bar.close_price,
+                high_price=old_bar.close_price,
+                low_price=old_bar.close_price,
+                close_price=old_bar.close_price,
+                gateway_name=old_bar.gateway_name
+            )
+            self.bars[vt_symbol] = bar
+            self.filled[j] = True
 
-        bars: dict[str, BarData] = {}
-        for vt_symbol in self.vt_symbols:
-            bar: Optional[BarData] = self.history_data.get((dt, vt_symbol), None)
-
-            # 判断是否获取到该合约指定时间的历史数据
-            if bar:
-                # 更新K线以供委托撮合
-                self.bars[vt_symbol] = bar
-                # 缓存K线数据以供strategy.on_bars更新
-                bars[vt_symbol] = bar
-            # 如果获取不到，但self.bars字典中已有合约数据缓存, 使用之前的数据填充
-            elif vt_symbol in self.bars:
-                old_bar: BarData = self.bars[vt_symbol]
-
-                bar: BarData = BarData(
-                    symbol=old_bar.symbol,
-                    exchange=old_bar.exchange,
-                    datetime=dt,
-                    open_price=old_bar.close_price,
-                    high_price=old_bar.close_price,
-                    low_price=old_bar.close_price,
-                    close_price=old_bar.close_price,
-                    gateway_name=old_bar.gateway_name
-                )
-                self.bars[vt_symbol] = bar
+        self.filled[mask] = False
+        self.seen_order.extend(np.flatnonzero(mask & ~self.seen).tolist())
+        self.seen |= mask
+        np.copyto(self.last_closes, panel.close_price[ix], where=mask)
 
         self.cross_limit_order()
         self.strategy.on_bars(bars)
 
         if self.strategy.inited:
-            self.update_daily_close(self.bars, dt)
+            self.close_date = dt.date()
 
     def cross_limit_order(self) -> None:
         """撮合限价委托"""
@@ -917,7 +962,6 @@ class PortfolioDailyResult:
                 self.contract_results[vt_symbol] = ContractDailyResult(self.date, close_price)
 
 
-@lru_cache(maxsize=999)
 def load_bar_data(
     vt_symbol: str,
     interval: Interval,
@@ -927,13 +971,45 @@ def load_bar_data(
     """通过数据库获取历史数据"""
     symbol, exchange = extract_vt_symbol(vt_symbol)
 
-    database: BaseDatabase = get_database()
+    return get_history_cache().load_bar_data(
+        symbol, exchange, interval, start, end
+    )
+
+
+def load_bar_array(
+    vt_symbol: str,
+    interval: Interval,
+    start: datetime,
+    end: datetime
+) -> np.ndarray:
+    """通过数据库获取历史数据数组，不创建BarData"""
+    symbol, exchange = extract_vt_symbol(vt_symbol)
 
-    return database.load_bar_data(
+    return get_history_cache().load_bar_array(
         symbol, exchange, interval, start, end
     )
 
 
+HISTORY_CACHE_FOLDER: str = "portfolio_history"
+
+history_cache: HistoryCache = None
+history_cache_lock: Lock = Lock()
+
+
+def get_history_cache() -> HistoryCache:
+    """获取历史数据磁盘缓存，多线程加载时只创建一次"""
+    global history_cache
+    if not history_cache:
+        with history_cache_lock:
+            if not history_cache:
+                history_cache = HistoryCache(
+                    get_database(),
+                    get_folder_path(HISTORY_CACHE_FOLDER),
+                    tz=DB_TZ
+                )
+    return history_cache
+
+
 def evaluate(
     target_name: str,
     strategy_class: StrategyTemplate,
@@ -946,6 +1022,7 @@ def evaluate(
     priceticks: dict[str, float],
     capital: int,
     end: datetime,
+    panel_cache: bool,
     setting: dict
 ) -> tuple:
     """包装回测相关函数以供进程池内运行"""
@@ -961,6 +1038,7 @@ def evaluate(
         priceticks=priceticks,
         capital=capital,
         end=end,
+        panel_cache=panel_cache
     )
 
     engine.add_strategy(strategy_class, setting)
@@ -987,7 +1065,8 @@ def wrap_evaluate(engine: BacktestingEngine, target_name: str) -> callable:
         engine.sizes,
         engine.priceticks,
         engine.capital,
-        engine.end
+        engine.end,
+        engine.panel_cache
     )
     return func
 
@@ -0,0 +1,253 @@
+import hashlib
+import os
+import pickle
+from datetime import datetime, tzinfo
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from vnpy.trader.constant import Exchange, Interval
+from vnpy.trader.object import BarData
+from vnpy.trader.utility import extract_vt_symbol, get_folder_path
+
+
+PANEL_FIELDS: tuple = (
+    "open_price",
+    "high_price",
+    "low_price",
+    "close_price",
+    "volume",
+    "turnover",
+    "open_interest",
+)
+
+
+class BarColumns:
+    """单合约K线列数据"""
+
+    def __init__(
+        self,
+        dts: list[datetime],
+        values: np.ndarray,
+        gateway_name: str = "DB"
+    ) -> None:
+        """构造函数"""
+        self.dts: list[datetime] = dts
+        self.values: np.ndarray = values          # (bar数量, 字段数量)
+        self.gateway_name: str = gateway_name
+
+    @classmethod
+    def from_bars(cls, bars: list[BarData]) -> "BarColumns":
+        """从K线列表创建"""
+        values: np.ndarray = np.array(
+            [[getattr(bar, name) for name in PANEL_FIELDS] for bar in bars],
+            dtype=np.float64
+        ).reshape(-1, len(PANEL_FIELDS))
+
+        gateway_name: str = bars[0].gateway_name if bars else "DB"
+        return cls([bar.datetime for bar in bars], values, gateway_name)
+
+    @classmethod
+    def from_array(cls, array: np.ndarray, tz: tzinfo, gateway_name: str = "DB") -> "BarColumns":
+        """从数据库K线数组创建，datetime为tz时区的本地时间"""
+        dts: list[datetime] = [dt.replace(tzinfo=tz) for dt in array["datetime"].tolist()]
+        values: np.ndarray = np.column_stack([array[name] for name in PANEL_FIELDS]).reshape(-1, len(PANEL_FIELDS))
+        return cls(dts, values, gateway_name)
+
+    @classmethod
+    def concat(cls, columns: list["BarColumns"]) -> "BarColumns":
+        """合并多段数据"""
+        columns = [c for c in columns if c.dts]
+        if not columns:
+            return cls([], np.empty((0, len(PANEL_FIELDS))))
+
+        dts: list[datetime] = [dt for c in columns for dt in c.dts]
+        values: np.ndarray = np.concatenate([c.values for c in columns])
+        return cls(dts, values, columns[0].gateway_name)
+
+    def __len__(self) -> int:
+        """"""
+        return len(self.dts)
+
+
+class BarPanel:
+    """
+    组合K线面板数据
+
+    所有合约的K线按统一时间轴保存为(时间 x 合约)的二维数组，mask标记
+    合约在该时间点是否有K线。相比每个(datetime, vt_symbol)一个BarData
+    内存占用降低一个数量级，策略也可以直接读取数组视图，例如
+    panel.close_price[:ix + 1, j]。
+    """
+
+    def __init__(
+        self,
+        vt_symbols: list[str],
+        dts: list[datetime],
+        interval: Interval = None
+    ) -> None:
+        """构造函数"""
+        self.vt_symbols: list[str] = list(vt_symbols)
+        self.symbol_index: dict[str, int] = {vt_symbol: j for j, vt_symbol in enumerate(self.vt_symbols)}
+        self.dts: list[datetime] = dts
+        self.interval: Interval = interval
+
+        self.symbols: list[str] = []
+        self.exchanges: list[Exchange] = []
+        for vt_symbol in self.vt_symbols:
+            symbol, exchange = extract_vt_symbol(vt_symbol)
+            self.symbols.append(symbol)
+            self.exchanges.append(exchange)
+        self.gateway_names: list[str] = ["DB"] * len(self.vt_symbols)
+
+        shape: tuple = (len(dts), len(self.vt_symbols))
+        self.mask: np.ndarray = np.zeros(shape, dtype=bool)
+
+        self.open_price: np.ndarray = np.zeros(shape)
+        self.high_price: np.ndarray = np.zeros(shape)
+        self.low_price: np.ndarray = np.zeros(shape)
+        self.close_price: np.ndarray = np.zeros(shape)
+        self.volume: np.ndarray = np.zeros(shape)
+        self.turnover: np.ndarray = np.zeros(shape)
+        self.open_interest: np.ndarray = np.zeros(shape)
+
+    @classmethod
+    def from_columns(
+        cls,
+        vt_symbols: list[str],
+        columns: dict[str, BarColumns],
+        interval: Interval = None
+    ) -> "BarPanel":
+        """用各合约的列数据创建面板"""
+        dts: list[datetime] = sorted({dt for c in columns.values() for dt in c.dts})
+        panel: BarPanel = cls(vt_symbols, dts, interval)
+
+        rows: dict[datetime, int] = {dt: i for i, dt in enumerate(dts)}
+
+        for j, vt_symbol in enumerate(panel.vt_symbols):
+            c: Optional[BarColumns] = columns.get(vt_symbol, None)
+            if not c:
+                continue
+
+            ix: np.ndarray = np.fromiter((rows[dt] for dt in c.dts), dtype=np.int64, count=len(c))
+            panel.mask[ix, j] = True
+            panel.gateway_names[j] = c.gateway_name
+
+            for k, name in enumerate(PANEL_FIELDS):
+                getattr(panel, name)[ix, j] = c.values[:, k]
+
+        return panel
+
+    def __len__(self) -> int:
+        """"""
+        return len(self.dts)
+
+    def create_bar(self, ix: int, j: int) -> BarData:
+        """创建指定时间点和合约的K线"""
+        return BarData(
+            symbol=self.symbols[j],
+            exchange=self.exchanges[j],
+            datetime=self.dts[ix],
+            interval=self.interval,
+            volume=float(self.volume[ix, j]),
+            turnover=float(self.turnover[ix, j]),
+            open_interest=float(self.open_interest[ix, j]),
+            open_price=float(self.open_price[ix, j]),
+            high_price=float(self.high_price[ix, j]),
+            low_price=float(self.low_price[ix, j]),
+            close_price=float(self.close_price[ix, j]),
+            gateway_name=self.gateway_names[j]
+        )
+
+    def get_bars(self, ix: int) -> dict[str, BarData]:
+        """获取时间点上所有合约的K线，按合约顺序"""
+        return {
+            self.vt_symbols[j]: self.create_bar(ix, j)
+            for j in np.flatnonzero(self.mask[ix]).tolist()
+        }
+
+    def get_count(self, vt_symbol: str) -> int:
+        """获取合约的K线数量"""
+        j: Optional[int] = self.symbol_index.get(vt_symbol, None)
+        if j is None:
+            return 0
+        return int(self.mask[:, j].sum())
+
+
+PANEL_CACHE_FOLDER: str = "portfolio_panel"
+
+# 面板缓存目录的容量上限（MB），超出后删除最久未使用的面板
+PANEL_CACHE_SIZE: int = 1024
+
+
+def get_panel_path(
+    vt_symbols: list[str],
+    interval: Interval,
+    start: datetime,
+    end: datetime,
+    overviews: list[Optional[tuple]]
+) -> Path:
+    """
+    获取面板缓存文件路径，由合约、周期、数据区间和各合约数据库汇总的
+    (start, end)决定，数据库中数据变化后自动使用新的缓存文件
+    """
+    key: str = "|".join([
+        ",".join(vt_symbols),
+        interval.value,
+        start.isoformat(),
+        end.isoformat(),
+        ",".join(str(overview) for overview in overviews)
+    ])
+    digest: str = hashlib.sha1(key.encode()).hexdigest()
+    return get_folder_path(PANEL_CACHE_FOLDER).joinpath(f"{digest}.pkl")
+
+
+def load_panel(path: Path) -> Optional[BarPanel]:
+    """读取面板缓存，缓存不存在或损坏时返回None"""
+    if not path.exists():
+        return None
+
+    try:
+        with open(path, "rb") as f:
+            panel: BarPanel = pickle.load(f)
+        os.utime(path)
+    except Exception:
+        return None
+
+    return panel
+
+
+def save_panel(path: Path, panel: BarPanel, size: int = PANEL_CACHE_SIZE) -> None:
+    """保存面板缓存，临时文件名带进程号，避免多进程同时写入冲突"""
+    temp_path: Path = path.with_suffix(f".{os.getpid()}.tmp")
+    with open(temp_path, "wb") as f:
+        pickle.dump(panel, f, protocol=pickle.HIGHEST_PROTOCOL)
+    temp_path.replace(path)
+
+    evict_panels(path.parent, size)
+
+
+def evict_panels(folder: Path, size: int) -> None:
+    """缓存目录超出容量上限时，按最近使用时间删除旧的面板"""
+    files: list = []
+    total: int = 0
+
+    for path in folder.glob("*.pkl"):
+        try:
+            stat: os.stat_result = path.stat()
+        except OSError:
+            continue
+        files.append((stat.st_mtime, stat.st_size, path))
+        total += stat.st_size
+
+    limit: int = size * 1024 * 1024
+    if total <= limit:
+        return
+
+    files.sort()
+    for _, file_size, path in files[:-1]:
+        path.unlink(missing_ok=True)
+        total -= file_size
+        if total <= limit:
+            break
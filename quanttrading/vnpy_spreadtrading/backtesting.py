@@ -17,6 +17,12 @@ from constant import (
     Status
 )
 from datatypes import TradeData, BarData, TickData
+from performance import (
+    CURVE_COLUMNS,
+    RETURN_PREVIOUS,
+    calculate_curve_statistics,
+    get_drawdown_duration
+)
 from optimize import (
     OptimizationSetting,
     check_optimization_setting,
@@ -288,17 +294,19 @@ class BacktestingEngine:
         # Check for init DataFrame
         if df is not None:
             # Calculate balance related time series data
-            df["balance"] = df["net_pnl"].cumsum() + self.capital
-            df["return"] = np.log(df["balance"] / df["balance"].shift(1)).fillna(0)
-            df["highlevel"] = (
-                df["balance"].rolling(
-                    min_periods=1, window=len(df), center=False).max()
+            result: dict = calculate_curve_statistics(
+                df["net_pnl"].to_numpy(dtype=np.float64),
+                self.capital,
+                self.annual_days,
+                self.risk_free,
+                return_mode=RETURN_PREVIOUS,
+                daily_risk_free=self.risk_free / self.annual_days
             )
-            df["drawdown"] = df["balance"] - df["highlevel"]
-            df["ddpercent"] = df["drawdown"] / df["highlevel"] * 100
+            for name in CURVE_COLUMNS:
+                df[name] = result[name]
 
             # All balance value needs to be positive
-            positive_balance = (df["balance"] > 0).all()
+            positive_balance = result["positive_balance"]
             if not positive_balance:
                 self.output("回测中出现爆仓（资金小于等于0），无法计算策略统计指标")
 
@@ -307,18 +315,18 @@ class BacktestingEngine:
             start_date = df.index[0]
             end_date = df.index[-1]
 
-            total_days: int = len(df)
-            profit_days: int = len(df[df["net_pnl"] > 0])
-            loss_days: int = len(df[df["net_pnl"] < 0])
+            total_days: int = result["total_days"]
+            profit_days: int = result["profit_days"]
+            loss_days: int = result["loss_days"]
 
-            end_balance: float = df["balance"].iloc[-1]
-            max_drawdown: float = df["drawdown"].min()
-            max_ddpercent: float = df["ddpercent"].min()
-            max_drawdown_end: float = df["drawdown"].idxmin()
-            max_drawdown_start: float = df["balance"][:max_drawdown_end].idxmax()
-            max_drawdown_duration: int = (max_drawdown_end - max_drawdown_start).days
+            end_balance: float = result["end_balance"]
+            max_drawdown: float = result["max_drawdown"]
+            max_ddpercent: float = result["max_ddpercent"]
+            max_drawdown_duration: int = get_drawdown_duration(
+                df.index, result["max_drawdown_start"], result["max_drawdown_end"]
+            )
 
-            total_net_pnl: float = df["net_pnl"].sum()
+            total_net_pnl: float = result["total_net_pnl"]
             daily_net_pnl: float = total_net_pnl / total_days
 
             total_commission: float = df["commission"].sum()
@@ -333,18 +341,12 @@ class BacktestingEngine:
             total_trade_count: int = df["trade_count"].sum()
             daily_trade_count: int = total_trade_count / total_days
 
-            total_return: float = (end_balance / self.capital - 1) * 100
-            annual_return: float = total_return / total_days * self.annual_days
-            daily_return: float = df["return"].mean() * 100
-            return_std: float = df["return"].std() * 100
-
-            if return_std:
-                daily_risk_free: float = self.risk_free / self.annual_days
-                sharpe_ratio: float = (daily_return - daily_risk_free) / return_std * np.sqrt(self.annual_days)
-            else:
-                sharpe_ratio: float = 0
-
-            return_drawdown_ratio: float = -total_return / max_ddpercent
+            total_return: float = result["total_return"]
+            annual_return: float = result["annual_return"]
+            daily_return: float = result["daily_return"]
+            return_std: float = result["return_std"]
+            sharpe_ratio: float = result["sharpe_ratio"]
+            return_drawdown_ratio: float = result["return_drawdown_ratio"]
 
         # Output
         if output:
@@ -1,10 +1,15 @@
-from collections import defaultdict
+import ast
+import sys
+from collections import defaultdict, OrderedDict
+from functools import reduce
 from typing import Any, Dict, List, Optional, Callable
 from datetime import datetime
 from enum import Enum
 from tzlocal import get_localzone_name
 from dataclasses import dataclass
 
+import numpy as np
+
 from datatypes import (
     HistoryRequest, TickData, PositionData, TradeData, ContractData, BarData
 )
@@ -131,6 +136,56 @@ class LegData:
             self.net_pos = self.long_pos - self.short_pos
 
 
+class SpreadFormula:
+    """
+    价差公式，只编译一次为以腿变量为参数的函数。
+
+    Arguments are prices of the legs in the order of variables, either
+    floats or NumPy arrays of the same length (vectorized calculation of
+    historical spread data). Formulas not working on arrays, like those
+    using max/min, are evaluated element by element instead.
+
+    Only the formula text is pickled and the function is rebuilt after
+    unpickling, so spread data can be sent to optimization processes.
+    """
+
+    def __init__(self, formula: str, variables: List[str]) -> None:
+        """"""
+        self.formula: str = formula
+        self.variables: List[str] = list(variables)
+        self.function: Callable = self.compile()
+
+    def compile(self) -> Callable:
+        """"""
+        source: str = f"lambda {', '.join(self.variables)}: {self.formula}"
+        return eval(compile(source, "<spread formula>", "eval"), {})
+
+    def calculate(self, data: Dict[str, Any]) -> Any:
+        """
+        Calculate with a dict of leg price (or price array) by variable.
+        """
+        try:
+            return self.function(**data)
+        except (ValueError, TypeError):
+            if not any(isinstance(v, np.ndarray) for v in data.values()):
+                raise
+
+        # Fall back to scalar calculation for each row of the arrays
+        columns: List[np.ndarray] = [np.asarray(data[v]) for v in self.variables]
+        rows: zip = zip(*[column.tolist() for column in columns])
+        return np.array([self.function(*row) for row in rows], dtype=np.float64)
+
+    def __getstate__(self) -> dict:
+        """"""
+        return {"formula": self.formula, "variables": self.variables}
+
+    def __setstate__(self, state: dict) -> None:
+        """"""
+        self.formula = state["formula"]
+        self.variables = state["variables"]
+        self.function = self.compile()
+
+
 class SpreadData:
     """"""
 
@@ -143,12 +198,10 @@ class SpreadData:
         price_formula: str,
         trading_multipliers: Dict[str, int],
         active_symbol: str,
-        min_volume: float,
-        compile_formula: bool = True
+        min_volume: float
     ) -> None:
         """"""
         self.name: str = name
-        self.compile_formula: bool = compile_formula
 
         self.legs: Dict[str, LegData] = {}
         self.active_leg: LegData = None
@@ -200,18 +253,24 @@ class SpreadData:
         self.variable_directions: dict = variable_directions
         self.price_formula = price_formula
 
-        # 实盘时编译公式，加速计算
-        if compile_formula:
-            self.price_code: str = compile(price_formula, __name__, "eval")
-        # 回测时不编译公式，从而支持多进程优化
-        else:
-            self.price_code: str = price_formula
-
         self.variable_legs: Dict[str, LegData] = {}
+        value_terms: Dict[str, str] = {}
         for variable, vt_symbol in variable_symbols.items():
             leg: LegData = self.legs[vt_symbol]
             self.variable_legs[variable] = leg
 
+            # 交易公式以各腿首个变量表示
+            if vt_symbol not in value_terms:
+                trading_multiplier: int = self.trading_multipliers[vt_symbol]
+                value_terms[vt_symbol] = f"{trading_multiplier}*{variable}"
+
+        # 编译为函数，行情推送时按变量顺序传入腿价格
+        self.formula: SpreadFormula = SpreadFormula(price_formula, list(self.variable_legs))
+        self.trading_function: SpreadFormula = SpreadFormula(
+            " + ".join(value_terms.values()) or "0",
+            list(self.variable_legs)
+        )
+
     def calculate_price(self) -> bool:
         """
         计算价差盘口
@@ -221,9 +280,9 @@ class SpreadData:
         """
         self.clear_price()
 
-        # Go through all legs to calculate price
-        bid_data: dict = {}
-        ask_data: dict = {}
+        # Go through all legs to calculate price, in the order of variables
+        bid_prices: list = []
+        ask_prices: list = []
         volume_inited: bool = False
 
         for variable, leg in self.variable_legs.items():
@@ -232,14 +291,14 @@ class SpreadData:
                 self.clear_price()
                 return False
 
-            # Generate price dict for calculating spread bid/ask
+            # Generate price list for calculating spread bid/ask
             variable_direction: int = self.variable_directions[variable]
             if variable_direction > 0:
-                bid_data[variable] = leg.bid_price
-                ask_data[variable] = leg.ask_price
+                bid_prices.append(leg.bid_price)
+                ask_prices.append(leg.ask_price)
             else:
-                bid_data[variable] = leg.ask_price
-                ask_data[variable] = leg.bid_price
+                bid_prices.append(leg.ask_price)
+                ask_prices.append(leg.bid_price)
 
             # Calculate volume
             trading_multiplier: int = self.trading_multipliers[leg.vt_symbol]
@@ -279,8 +338,8 @@ class SpreadData:
                 self.ask_volume = min(self.ask_volume, adjusted_ask_volume)
 
         # Calculate spread price
-        self.bid_price = self.parse_formula(self.price_code, bid_data)
-        self.ask_price = self.parse_formula(self.price_code, ask_data)
+        self.bid_price = self.formula.function(*bid_prices)
+        self.ask_price = self.formula.function(*ask_prices)
 
         # Round price to pricetick
         if self.pricetick:
@@ -382,10 +441,11 @@ class SpreadData:
         return leg.size
 
     def parse_formula(self, formula: str, data: Dict[str, float]) -> Any:
-        """"""
-        locals().update(data)
-        value = eval(formula)
-        return value
+        """
+        Evaluate a formula (text or code) with variables in data. The
+        spread price formula should use the precompiled self.formula.
+        """
+        return eval(formula, {}, data)
 
     def get_item(self) -> "SpreadItem":
         """获取数据对象"""
@@ -413,6 +473,16 @@ class BacktestingMode(Enum):
     TICK = 2
 
 
+# Spread bar arrays of backtesting loads, by spread definition, interval
+# and window. Least recently used ones are dropped above the size (MB).
+spread_bar_cache: OrderedDict = OrderedDict()
+spread_bar_cache_used: int = 0
+SPREAD_BAR_CACHE_SIZE: int = 256
+
+# Bytes of a datetime object referenced by the datetime array
+DATETIME_SIZE: int = sys.getsizeof(datetime(2000, 1, 1))
+
+
 def load_bar_data(
     spread: SpreadData,
     interval: Interval,
@@ -420,15 +490,30 @@ def load_bar_data(
     end: datetime,
     pricetick: float = 0,
     output: Callable = print,
-    backtesting: bool = False
+    backtesting: bool = False,
+    asof: bool = False
 ) -> List[BarData]:
-    """"""
+    """
+    Load bar data of legs and build spread bars.
+
+    asof=False keeps only timestamps where every leg has a bar, asof=True
+    uses every timestamp of any leg with the latest bar of other legs.
+
+    Only backtesting loads (from database) are cached, as column arrays.
+    """
+    key: tuple = (get_spread_key(spread), interval, start, end, pricetick, asof)
+    if backtesting:
+        arrays: Optional[tuple] = spread_bar_cache.get(key, None)
+        if arrays is not None:
+            spread_bar_cache.move_to_end(key)
+            return create_spread_bars(spread, arrays, interval)
+
     database: BaseDatabase = get_database()
 
     # Load bar data of each spread leg
-    leg_bars: Dict[str, Dict] = {}
+    leg_bars: Dict[str, List[BarData]] = {}
 
-    for vt_symbol in spread.legs.keys():
+    for vt_symbol in spread.variable_symbols.values():
         symbol, exchange = extract_vt_symbol(vt_symbol)
 
         # 初始化K线列表
@@ -446,53 +531,292 @@ def load_bar_data(
                 symbol, exchange, interval, start, end
             )
 
-        bars: Dict[datetime, BarData] = {bar.datetime: bar for bar in bar_data}
-        leg_bars[vt_symbol] = bars
+        leg_bars[vt_symbol] = bar_data
 
-    # Calculate spread bar data
-    spread_bars: List[BarData] = []
+    arrays = build_spread_arrays(spread, leg_bars, pricetick, asof)
+    if backtesting:
+        cache_spread_arrays(key, arrays)
 
-    for dt in bars.keys():
-        spread_price = 0
-        spread_value = 0
-        spread_available: bool = True
+    return create_spread_bars(spread, arrays, interval)
 
-        leg_data: dict = {}
-        for variable, leg in spread.variable_legs.items():
-            leg_bar: Optional[BarData] = leg_bars[leg.vt_symbol].get(dt, None)
 
-            if leg_bar:
-                # 缓存该腿当前的价格
-                leg_data[variable] = leg_bar.close_price
+def cache_spread_arrays(key: tuple, arrays: tuple) -> None:
+    """
+    Add spread bar arrays into cache, and drop least recently used ones
+    above SPREAD_BAR_CACHE_SIZE.
+    """
+    global spread_bar_cache_used
 
-                # 基于交易乘数累计价值
-                trading_multiplier: int = spread.trading_multipliers[leg.vt_symbol]
-                spread_value += trading_multiplier * leg_bar.close_price
-            else:
-                spread_available = False
-
-        if spread_available:
-            spread_price = spread.parse_formula(spread.price_code, leg_data)
-            if pricetick:
-                spread_price: float = round_to(spread_price, pricetick)
-
-            spread_bar: BarData = BarData(
-                symbol=spread.name,
-                exchange=exchange.LOCAL,
-                datetime=dt,
-                interval=interval,
-                open_price=spread_price,
-                high_price=spread_price,
-                low_price=spread_price,
-                close_price=spread_price,
-                gateway_name="SPREAD",
-            )
-            spread_bar.value = spread_value
-            spread_bars.append(spread_bar)
+    size: int = get_arrays_size(arrays)
+    limit: int = SPREAD_BAR_CACHE_SIZE * 1024 * 1024
+    if size > limit:
+        return
+
+    old_arrays: Optional[tuple] = spread_bar_cache.pop(key, None)
+    if old_arrays is not None:
+        spread_bar_cache_used -= get_arrays_size(old_arrays)
+
+    spread_bar_cache[key] = arrays
+    spread_bar_cache_used += size
+
+    while spread_bar_cache_used > limit:
+        _, old_arrays = spread_bar_cache.popitem(last=False)
+        spread_bar_cache_used -= get_arrays_size(old_arrays)
+
+
+def get_arrays_size(arrays: tuple) -> int:
+    """
+    Bytes of spread bar arrays, including datetime objects.
+    """
+    if not arrays:
+        return 0
+
+    dts: np.ndarray = arrays[0]
+    return sum(array.nbytes for array in arrays) + len(dts) * DATETIME_SIZE
+
+
+def get_spread_key(spread: SpreadData) -> tuple:
+    """
+    Definition of spread used as cache key of spread bars.
+    """
+    return (
+        spread.name,
+        spread.formula.formula,
+        tuple(spread.variable_symbols.items()),
+        tuple(sorted(spread.trading_multipliers.items()))
+    )
+
+
+def build_spread_bars(
+    spread: SpreadData,
+    leg_bars: Dict[str, List[BarData]],
+    interval: Interval,
+    pricetick: float = 0,
+    asof: bool = False
+) -> List[BarData]:
+    """
+    Build spread bars from bars of each leg, calculated column-wise.
+
+    Open/close price is the formula on leg open/close prices. Value is
+    the sum of leg close price weighted by trading multiplier.
+
+    For linear formulas high/low is the formula on leg high/low prices
+    (low/high for legs with negative sign), an outer bound since leg
+    extremes may not happen at the same time. Other formulas only have
+    the max/min of open and close price as high/low.
+    """
+    arrays: tuple = build_spread_arrays(spread, leg_bars, pricetick, asof)
+    return create_spread_bars(spread, arrays, interval)
+
+
+def build_spread_arrays(
+    spread: SpreadData,
+    leg_bars: Dict[str, List[BarData]],
+    pricetick: float = 0,
+    asof: bool = False
+) -> tuple:
+    """
+    Datetime, open, high, low, close and value arrays of spread bars,
+    empty tuple if there is no timestamp with data of every leg.
+    """
+    # Timestamp, datetime and price arrays of every leg, sorted and unique
+    leg_arrays: Dict[str, tuple] = {}
+    for vt_symbol, bars in leg_bars.items():
+        if not bars:
+            return ()
+        leg_arrays[vt_symbol] = get_leg_arrays(bars)
+
+    # Align legs on a common timeline
+    all_ts: List[np.ndarray] = [arrays[0] for arrays in leg_arrays.values()]
+    all_dts: List[np.ndarray] = [arrays[1] for arrays in leg_arrays.values()]
+
+    if asof:
+        timeline, ix = np.unique(np.concatenate(all_ts), return_index=True)
+        dts: np.ndarray = np.concatenate(all_dts)[ix]
+
+        # Start when every leg has data
+        first: int = max(ts[0] for ts in all_ts)
+        mask: np.ndarray = timeline >= first
+    else:
+        timeline = reduce(np.intersect1d, all_ts)
+        dts = all_dts[0][np.searchsorted(all_ts[0], timeline)]
+        mask = np.ones(len(timeline), dtype=bool)
+
+    timeline, dts = timeline[mask], dts[mask]
+    if not len(timeline):
+        return ()
+
+    signs: Optional[Dict[str, int]] = get_formula_signs(spread.formula)
+
+    opens: Dict[str, np.ndarray] = {}
+    closes: Dict[str, np.ndarray] = {}
+    highs: Dict[str, np.ndarray] = {}
+    lows: Dict[str, np.ndarray] = {}
+
+    for variable, vt_symbol in spread.variable_symbols.items():
+        ts, _, open_array, high_array, low_array, close_array = leg_arrays[vt_symbol]
+
+        # Index of the latest leg bar at or before each timestamp
+        ix: np.ndarray = np.searchsorted(ts, timeline, side="right") - 1
+        opens[variable] = open_array[ix]
+        closes[variable] = close_array[ix]
+
+        if signs is None:
+            continue
+
+        # Leg price stays at close when carried forward from an older bar
+        current: np.ndarray = ts[ix] == timeline
+        leg_high: np.ndarray = np.where(current, high_array[ix], closes[variable])
+        leg_low: np.ndarray = np.where(current, low_array[ix], closes[variable])
+
+        sign: int = signs.get(variable, 0)
+        if sign > 0:
+            highs[variable], lows[variable] = leg_high, leg_low
+        elif sign < 0:
+            highs[variable], lows[variable] = leg_low, leg_high
+        else:
+            highs[variable] = lows[variable] = closes[variable]
+
+    size: int = len(timeline)
+    open_price: np.ndarray = np.full(size, spread.formula.calculate(opens), dtype=np.float64)
+    close_price: np.ndarray = np.full(size, spread.formula.calculate(closes), dtype=np.float64)
+
+    # 基于交易乘数计算价值
+    spread_value: np.ndarray = np.full(
+        size, spread.trading_function.calculate(closes), dtype=np.float64
+    )
+
+    if pricetick:
+        open_price = round_array(open_price, pricetick)
+        close_price = round_array(close_price, pricetick)
+
+    high_price: np.ndarray = np.maximum(open_price, close_price)
+    low_price: np.ndarray = np.minimum(open_price, close_price)
+
+    if signs is not None:
+        leg_high_price: np.ndarray = np.full(size, spread.formula.calculate(highs), dtype=np.float64)
+        leg_low_price: np.ndarray = np.full(size, spread.formula.calculate(lows), dtype=np.float64)
+
+        if pricetick:
+            leg_high_price = round_array(leg_high_price, pricetick)
+            leg_low_price = round_array(leg_low_price, pricetick)
+
+        high_price = np.maximum(high_price, leg_high_price)
+        low_price = np.minimum(low_price, leg_low_price)
+
+    return dts, open_price, high_price, low_price, close_price, spread_value
+
+
+def create_spread_bars(spread: SpreadData, arrays: tuple, interval: Interval) -> List[BarData]:
+    """
+    Create new spread BarData objects from spread bar arrays.
+    """
+    if not arrays:
+        return []
+
+    spread_bars: List[BarData] = []
+    for dt, o, h, l, c, v in zip(*[array.tolist() for array in arrays]):
+        spread_bar: BarData = BarData(
+            symbol=spread.name,
+            exchange=Exchange.LOCAL,
+            datetime=dt,
+            interval=interval,
+            open_price=o,
+            high_price=h,
+            low_price=l,
+            close_price=c,
+            gateway_name="SPREAD",
+        )
+        spread_bar.value = v
+        spread_bars.append(spread_bar)
 
     return spread_bars
 
 
+def get_leg_arrays(bars: List[BarData]) -> tuple:
+    """
+    Timestamp (us), datetime, open, high, low and close arrays of leg
+    bars, sorted by time. The last bar is kept for duplicated timestamps.
+    """
+    ts: np.ndarray = np.array(
+        [round(bar.datetime.timestamp() * 1_000_000) for bar in bars], dtype=np.int64
+    )
+    dts: np.ndarray = np.array([bar.datetime for bar in bars], dtype=object)
+    open_array: np.ndarray = np.array([bar.open_price for bar in bars], dtype=np.float64)
+    high_array: np.ndarray = np.array([bar.high_price for bar in bars], dtype=np.float64)
+    low_array: np.ndarray = np.array([bar.low_price for bar in bars], dtype=np.float64)
+    close_array: np.ndarray = np.array([bar.close_price for bar in bars], dtype=np.float64)
+
+    order: np.ndarray = np.argsort(ts, kind="stable")
+    ts = ts[order]
+    keep: np.ndarray = np.append(ts[1:] != ts[:-1], True)
+    last: np.ndarray = order[keep]
+
+    return (
+        ts[keep], dts[last], open_array[last],
+        high_array[last], low_array[last], close_array[last]
+    )
+
+
+def get_formula_signs(formula: SpreadFormula) -> Optional[Dict[str, int]]:
+    """
+    Sign of each variable if the formula is linear in leg prices (sums
+    and differences of variables times constants), otherwise None.
+    """
+    try:
+        tree: ast.Expression = ast.parse(formula.formula, mode="eval")
+    except SyntaxError:
+        return None
+
+    signs: Dict[str, int] = {}
+
+    def is_constant(node: ast.AST) -> bool:
+        return not any(isinstance(n, ast.Name) for n in ast.walk(node))
+
+    def get_constant(node: ast.AST) -> float:
+        return eval(compile(ast.Expression(node), "<spread formula>", "eval"), {})
+
+    def visit(node: ast.AST, sign: int) -> bool:
+        if is_constant(node):
+            return True
+
+        if isinstance(node, ast.Name):
+            if signs.setdefault(node.id, sign) != sign:
+                return False
+            return True
+
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.UAdd, ast.USub)):
+            return visit(node.operand, -sign if isinstance(node.op, ast.USub) else sign)
+
+        if isinstance(node, ast.BinOp):
+            if isinstance(node.op, ast.Add):
+                return visit(node.left, sign) and visit(node.right, sign)
+            if isinstance(node.op, ast.Sub):
+                return visit(node.left, sign) and visit(node.right, -sign)
+            if isinstance(node.op, (ast.Mult, ast.Div)) and is_constant(node.right):
+                return visit(node.left, sign * int(np.sign(get_constant(node.right))))
+            if isinstance(node.op, ast.Mult) and is_constant(node.left):
+                return visit(node.right, sign * int(np.sign(get_constant(node.left))))
+
+        return False
+
+    try:
+        linear: bool = visit(tree.body, 1)
+    except Exception:
+        return None
+
+    return signs if linear else None
+
+
+def round_array(values: np.ndarray, pricetick: float) -> np.ndarray:
+    """
+    round_to of every value, calculated once per distinct value.
+    """
+    unique, inverse = np.unique(values, return_inverse=True)
+    rounded: np.ndarray = np.array([round_to(value, pricetick) for value in unique.tolist()])
+    return rounded[inverse]
+
+
 def load_tick_data(
     spread: SpreadData,
     start: datetime,
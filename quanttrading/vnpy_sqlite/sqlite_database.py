@@ -2,6 +2,7 @@ from datetime import datetime, timedelta
 from typing import List
 import logging
 
+import numpy as np
 from peewee import (
     AutoField,
     CharField,
@@ -24,6 +25,8 @@ from database import (
     BarOverview,
     DB_TZ,
     TickOverview,
+    TICK_ARRAY_FIELDS,
+    TICK_DTYPE,
     convert_tz
 )
 
@@ -166,6 +169,9 @@ class SqliteDatabase(BaseDatabase):
         self.db.connect()
         self.db.create_tables([DbBarData, DbTickData, DbBarOverview, DbTickOverview, DbDailyProfit])
 
+        self.bulk_size: int = 5000
+        self.bulk_inited: bool = False
+
     def save_bar_data(self, bars: List[BarData], stream: bool = False) -> bool:
         """保存K线数据"""
         # 读取主键参数
@@ -243,45 +249,133 @@ class SqliteDatabase(BaseDatabase):
             d["exchange"] = d["exchange"].value
             d.pop("gateway_name")
             d.pop("vt_symbol")
-            d.pop("extra")
+            d.pop("extra", None)
             data.append(d)
 
+        # 新数据的数量由写入前后时间范围内的行数得出，不再全表计数
+        start: datetime = min(d["datetime"] for d in data)
+        end: datetime = max(d["datetime"] for d in data)
+
         # 使用upsert操作将数据更新到数据库中
         with self.db.atomic():
+            existing: int = self.count_tick_data(symbol, exchange.value, start, end)
+
             for c in chunked(data, 10):
-                # print(f"{c=} ")
                 DbTickData.insert_many(c).on_conflict_replace().execute()
 
-        # 更新Tick汇总数据
+            count: int = self.count_tick_data(symbol, exchange.value, start, end) - existing
+
+            # 更新Tick汇总数据
+            self.update_tick_overview(symbol, exchange.value, start, end, count)
+
+        return True
+
+    def count_tick_data(self, symbol: str, exchange: str, start: datetime, end: datetime) -> int:
+        """
+        Number of ticks saved within [start, end], served by the index.
+        """
+        s: ModelSelect = DbTickData.select().where(
+            (DbTickData.symbol == symbol)
+            & (DbTickData.exchange == exchange)
+            & (DbTickData.datetime >= start)
+            & (DbTickData.datetime <= end)
+        )
+        return s.count()
+
+    def save_tick_data_bulk(self, ticks: List[TickData]) -> int:
+        """
+        Bulk save TICK data of any number of symbols.
+        One prepared INSERT OR IGNORE statement run by executemany in big
+        batches inside one transaction, with WAL journal and normal
+        synchronous mode. Ticks already saved are kept, so the number of
+        new rows is exact and the overview is updated incrementally
+        instead of being recounted.
+        Return number of new ticks.
+        """
+        if not ticks:
+            return 0
+
+        self.init_bulk_mode()
+
+        columns: list = ["symbol", "exchange", "datetime", "name"]
+        columns.extend(TICK_ARRAY_FIELDS)
+        columns.append("localtime")
+
+        sql: str = "INSERT OR IGNORE INTO {} ({}) VALUES ({})".format(
+            DbTickData._meta.table_name,
+            ", ".join(f'"{c}"' for c in columns),
+            ", ".join("?" * len(columns))
+        )
+
+        # Group rows by symbol for the overview update
+        groups: dict = {}
+        for tick in ticks:
+            dt: datetime = convert_tz(tick.datetime)
+            localtime: datetime = tick.localtime
+
+            row: list = [tick.symbol, tick.exchange.value, str(dt), tick.name]
+            row.extend(getattr(tick, name) for name in TICK_ARRAY_FIELDS)
+            row.append(str(localtime) if localtime else None)
+
+            groups.setdefault((tick.symbol, tick.exchange.value), []).append((dt, row))
+
+        total: int = 0
+        with self.db.atomic():
+            cursor = self.db.cursor()
+
+            for (symbol, exchange), group in groups.items():
+                count: int = 0
+                for c in chunked(group, self.bulk_size):
+                    cursor.executemany(sql, [row for _, row in c])
+                    count += cursor.rowcount
+
+                dts: list = [dt for dt, _ in group]
+                self.update_tick_overview(symbol, exchange, min(dts), max(dts), count)
+                total += count
+
+        return total
+
+    def init_bulk_mode(self) -> None:
+        """
+        WAL lets readers (backtests, charts) work while recording, and
+        normal synchronous mode avoids a fsync on every commit.
+        """
+        if self.bulk_inited:
+            return
+        self.db.execute_sql("PRAGMA journal_mode=WAL")
+        self.db.execute_sql("PRAGMA synchronous=NORMAL")
+        self.bulk_inited = True
+
+    def update_tick_overview(
+        self,
+        symbol: str,
+        exchange: str,
+        start: datetime,
+        end: datetime,
+        count: int
+    ) -> None:
+        """
+        Update tick overview incrementally with count new ticks.
+        """
         overview: DbTickOverview = DbTickOverview.get_or_none(
             DbTickOverview.symbol == symbol,
-            DbTickOverview.exchange == exchange.value,
+            DbTickOverview.exchange == exchange,
         )
 
         if not overview:
-            overview: DbTickOverview = DbTickOverview()
+            overview = DbTickOverview()
             overview.symbol = symbol
-            overview.exchange = exchange.value
-            overview.start = ticks[0].datetime
-            overview.end = ticks[-1].datetime
-            overview.count = len(ticks)
-        elif stream:
-            overview.end = ticks[-1].datetime
-            overview.count += len(ticks)
+            overview.exchange = exchange
+            overview.start = start
+            overview.end = end
+            overview.count = count
         else:
-            overview.start = min(ticks[0].datetime, overview.start)
-            overview.end = max(ticks[-1].datetime, overview.end)
-
-            s: ModelSelect = DbTickData.select().where(
-                (DbTickData.symbol == symbol)
-                & (DbTickData.exchange == exchange.value)
-            )
-            overview.count = s.count()
+            overview.start = min(start, overview.start)
+            overview.end = max(end, overview.end)
+            overview.count += count
 
         overview.save()
 
-        return True
-
     def save_daily_pnl(self,
                        date:datetime,
                        totalPnL:float,
@@ -426,6 +520,50 @@ class SqliteDatabase(BaseDatabase):
         return ticks
 
 
+    def load_tick_array(
+        self,
+        symbol: str,
+        exchange: Exchange,
+        start: datetime = None,
+        end: datetime = None
+    ) -> np.ndarray:
+        """
+        Bulk load TICK data into a numpy structured array (TICK_DTYPE).
+        One raw cursor query, no DbTickData/TickData object per row.
+        All ticks of the symbol when start and end are not given.
+        Use database.array_to_ticks for TickData when really needed,
+        or DataFrame(array) for a DataFrame.
+        """
+        columns: list = [DbTickData.datetime] + [
+            getattr(DbTickData, name) for name in TICK_ARRAY_FIELDS
+        ]
+
+        condition = (DbTickData.symbol == symbol) & (DbTickData.exchange == exchange.value)
+        if start is not None:
+            condition &= (DbTickData.datetime >= start)
+        if end is not None:
+            condition &= (DbTickData.datetime <= end)
+
+        s: ModelSelect = (
+            DbTickData.select(*columns)
+            .where(condition)
+            .order_by(DbTickData.datetime)
+        )
+        sql, params = s.sql()
+        rows: list = self.db.execute_sql(sql, params).fetchall()
+
+        array: np.ndarray = np.empty(len(rows), dtype=TICK_DTYPE)
+        if not rows:
+            return array
+
+        values: list = list(zip(*rows))
+        array["datetime"] = np.array(values[0], dtype="datetime64[us]")
+        for name, column in zip(TICK_ARRAY_FIELDS, values[1:]):
+            # Null level 2-5 prices/volumes are loaded as 0
+            array[name] = np.nan_to_num(np.array(column, dtype=np.float64))
+
+        return array
+
     def load_all_tick_data(
         self,
         symbol: str,